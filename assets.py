@@ -0,0 +1,217 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optioneel: zonder Pillow serveren we het origineel
+    Image = None
+
+DATA_DIR = Path(__file__).with_name("data")
+
+# ---------------------------
+# Configuratie
+# ---------------------------
+
+# Content-addressed cache: <sha256 van het origineel>-<variant>.<ext>. Een
+# gewijzigde afbeelding krijgt zo vanzelf nieuwe varianten; oude bestanden
+# zijn onschadelijk en mogen altijd weggegooid worden.
+ASSET_CACHE_DIR = Path(os.getenv("ASSET_CACHE_DIR", Path(__file__).with_name(".assets")))
+
+# Variant -> maximale breedte in pixels (hoogte schaalt mee)
+VARIANTS = {
+    "display": int(os.getenv("ASSET_DISPLAY_WIDTH", "900")),
+    "thumb": int(os.getenv("ASSET_THUMB_WIDTH", "320")),
+}
+ASSET_QUALITY = int(os.getenv("ASSET_QUALITY", "80"))
+
+# Bovengrens voor de in-memory cache van afbeeldingsbytes (alle sessies samen)
+ASSET_MEMORY_BYTES = int(os.getenv("ASSET_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+# ---------------------------
+# Bron-afbeeldingen en digests
+# ---------------------------
+
+_index_lock = threading.Lock()
+_index: Dict[str, str] | None = None  # "pad|size|mtime_ns" -> sha256
+
+
+def _index_path() -> Path:
+    return ASSET_CACHE_DIR / "index.json"
+
+
+def _load_index() -> Dict[str, str]:
+    global _index
+    if _index is None:
+        try:
+            _index = json.loads(_index_path().read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+
+def _save_index():
+    ASSET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _index_path().with_suffix(".tmp")
+    tmp.write_text(json.dumps(_index, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, _index_path())
+
+
+def resolve_image(name: str) -> Path | None:
+    """Zoek het bronbestand bij een afbeeldingsnaam uit de vragenbank.
+
+    Vragen verwijzen zowel naar ``vraag1.png`` (relatief t.o.v. data/) als naar
+    ``data/vraag1.png``; beide leveren hetzelfde bestand op."""
+    if not name:
+        return None
+    for path in (DATA_DIR / name, Path(name), Path(__file__).parent / name):
+        if path.is_file():
+            return path
+    return None
+
+
+def _digest(path: Path) -> str:
+    """sha256 van het bronbestand, gecachet op (pad, grootte, mtime) zodat een
+    herstart niet elke afbeelding opnieuw hoeft in te lezen."""
+    st = path.stat()
+    key = f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+    with _index_lock:
+        index = _load_index()
+        digest = index.get(key)
+        if digest is None:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            index[key] = digest
+            try:
+                _save_index()
+            except OSError:
+                pass  # alleen een optimalisatie; volgende keer opnieuw hashen
+    return digest
+
+
+# ---------------------------
+# Varianten genereren
+# ---------------------------
+
+
+def _variant_path(digest: str, variant: str) -> Path:
+    return ASSET_CACHE_DIR / f"{digest}-{variant}.webp"
+
+
+def _render_variant(source: Path, target: Path, width: int):
+    with Image.open(source) as img:
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=ASSET_QUALITY, method=4)
+    data = buf.getvalue()
+    # Nooit groter serveren dan het origineel (bv. kleine, al goed gecomprimeerde PNG's)
+    if len(data) >= source.stat().st_size:
+        data = source.read_bytes()
+    ASSET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)  # atomair: parallelle lezers zien nooit een half bestand
+
+
+def prepare_image(name: str) -> bool:
+    """Genereer alle varianten van één afbeelding (idempotent).
+
+    Geeft False als het bronbestand ontbreekt. Zonder Pillow is er niets te
+    genereren; ``image_bytes`` valt dan terug op het origineel."""
+    source = resolve_image(name)
+    if source is None:
+        return False
+    if Image is None:
+        return True
+    digest = _digest(source)
+    for variant, width in VARIANTS.items():
+        target = _variant_path(digest, variant)
+        if not target.exists():
+            try:
+                _render_variant(source, target, width)
+            except (OSError, ValueError) as e:
+                print(f"Kon variant '{variant}' van {name} niet maken: {e}")
+                return False
+    return True
+
+
+def prepare_images(names: Iterable[str]) -> int:
+    """Bereid een reeks afbeeldingen voor (aangeroepen door de importer)."""
+    done = 0
+    for name in set(n for n in names if n):
+        done += prepare_image(name)
+    return done
+
+
+# ---------------------------
+# Serveren (met in-memory LRU)
+# ---------------------------
+
+_mem_lock = threading.Lock()
+_mem: "OrderedDict[tuple, bytes]" = OrderedDict()
+_mem_size = 0
+_mem_stats = {"hits": 0, "misses": 0}
+
+
+def _load_bytes(name: str, variant: str) -> bytes | None:
+    source = resolve_image(name)
+    if source is None:
+        return None
+    if Image is not None and variant in VARIANTS:
+        target = _variant_path(_digest(source), variant)
+        if not target.exists():
+            prepare_image(name)  # nieuwe afbeelding sinds de laatste import
+        if target.exists():
+            return target.read_bytes()
+    return source.read_bytes()
+
+
+def image_bytes(name: str, variant: str = "display") -> bytes | None:
+    """Bytes van de gevraagde variant (``display``/``thumb``/``original``).
+
+    Hete afbeeldingen komen uit een begrensde LRU-cache die over alle sessies
+    gedeeld wordt; alleen een miss leest van schijf. Geeft None als de
+    afbeelding niet bestaat."""
+    global _mem_size
+    key = (name, variant)
+    with _mem_lock:
+        data = _mem.get(key)
+        if data is not None:
+            _mem.move_to_end(key)
+            _mem_stats["hits"] += 1
+            return data
+        _mem_stats["misses"] += 1
+
+    data = _load_bytes(name, variant)
+    if data is None or len(data) > ASSET_MEMORY_BYTES:
+        return data
+
+    with _mem_lock:
+        if key not in _mem:
+            _mem[key] = data
+            _mem_size += len(data)
+            while _mem_size > ASSET_MEMORY_BYTES:
+                _, evicted = _mem.popitem(last=False)
+                _mem_size -= len(evicted)
+    return data
+
+
+def invalidate_image_cache():
+    """Leeg de in-memory cache (bv. na een import die afbeeldingen verving)."""
+    global _mem_size
+    with _mem_lock:
+        _mem.clear()
+        _mem_size = 0
+
+
+def image_cache_stats() -> Dict[str, int]:
+    with _mem_lock:
+        return {**_mem_stats, "entries": len(_mem), "bytes": _mem_size}
@@ -0,0 +1,89 @@
+"""Benchmark: antwoorden opslaan, commit per antwoord (oud) vs. write-behind buffer.
+
+Elke thread is een leerling die een examen maakt en per vraag een antwoord
+opslaat. Print inserts/sec per modus.
+
+    python benchmarks/bench_answers.py --threads 16 --sessions 200 --questions 20
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+INSERT_SQL = "INSERT INTO answers(session_id, question_id, user_answer, is_correct, feedback) VALUES (?, ?, ?, ?, ?)"
+
+
+def legacy_save(session_id: int, question_id: int):
+    # Zoals save_answer_db vroeger: nieuwe connectie + commit per antwoord
+    conn = sqlite3.connect(db.DB_PATH, timeout=30)
+    conn.execute(INSERT_SQL, (session_id, question_id, "antwoord", 0, None))
+    conn.commit()
+    conn.close()
+
+
+def per_answer_save(session_id: int, question_id: int):
+    # Gepoolde connectie, maar nog steeds één transactie per antwoord
+    with db.transaction() as conn:
+        conn.execute(INSERT_SQL, (session_id, question_id, "antwoord", 0, None))
+
+
+def buffered_save(session_id: int, question_id: int):
+    db.save_answer_db(session_id, question_id, "antwoord", False)
+
+
+def run(save, finish, threads: int, sessions: int, questions: int) -> dict:
+    def worker(t: int):
+        for s in range(t, sessions, threads):
+            sid = s + 1
+            for q in range(questions):
+                save(sid, q + 1)
+            finish(sid)
+
+    ts = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    db.flush_answers()
+    elapsed = time.perf_counter() - start
+    (rows,) = db.get_connection().execute("SELECT COUNT(*) FROM answers").fetchone()
+    db.close_connections()
+    return {"rows": rows, "inserts_per_sec": rows / elapsed, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = (
+            ("per-answer commit (legacy)", legacy_save, lambda sid: None, "DELETE"),
+            ("per-answer commit (pooled)", per_answer_save, lambda sid: None, "WAL"),
+            ("write-behind", buffered_save, db.flush_answers, "WAL"),
+        )
+        for i, (name, save, finish, journal) in enumerate(modes):
+            db.DB_PATH = Path(tmp) / f"bench{i}.db"
+            db.init_db(force=True)
+            db.get_connection().execute(f"PRAGMA journal_mode={journal}")
+            results[name] = run(save, finish, args.threads, args.sessions, args.questions)
+
+    print(f"threads={args.threads} sessions={args.sessions} questions={args.questions}")
+    for name, res in results.items():
+        print(f"{name:>27}: {res['inserts_per_sec']:10.0f} inserts/sec  ({res['rows']} rows in {res['seconds']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
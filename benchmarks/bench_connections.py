@@ -0,0 +1,145 @@
+"""Benchmark: nieuwe connectie per call (oud) vs. gepoolde WAL-connecties (nieuw).
+
+Simuleert veel leerlingen tegelijk: elke leerling haalt vragen op (lezen) en slaat
+af en toe een antwoord op (schrijven). Zoals in Streamlit (nieuwe thread per
+rerun) draait elke request in een eigen, kortlevende thread. Naast de oude
+situatie meet het ook een connectie per thread zonder pool. Print ops/sec per modus.
+
+    python benchmarks/bench_connections.py --threads 32 --seconds 5
+"""
+
+import argparse
+import itertools
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+READ_SQL = "SELECT id, question, options, correct_answer, image, context FROM questions WHERE subject = ? AND level = ? ORDER BY id"
+WRITE_SQL = "INSERT INTO answers(session_id, question_id, user_answer, is_correct, feedback) VALUES (?, ?, ?, ?, ?)"
+
+# Eigen vraag-ID per write: answers heeft een UNIQUE-index op (session_id, question_id)
+_question_ids = itertools.count(1)
+
+
+def legacy_read():
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(READ_SQL, ("Economie", "vwo")).fetchall()
+    conn.close()
+
+
+def legacy_write(session_id: int):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(WRITE_SQL, (session_id, next(_question_ids), "antwoord", 0, None))
+    conn.commit()
+    conn.close()
+
+
+def per_thread_read():
+    # Connectie per thread: in Streamlit dus per request, inclusief PRAGMA's en UDF
+    conn = db._connect(str(db.DB_PATH))
+    conn.execute(READ_SQL, ("Economie", "vwo")).fetchall()
+    conn.close()
+
+
+def per_thread_write(session_id: int):
+    conn = db._connect(str(db.DB_PATH))
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(WRITE_SQL, (session_id, next(_question_ids), "antwoord", 0, None))
+    conn.commit()
+    conn.close()
+
+
+def pooled_read():
+    db.get_connection().execute(READ_SQL, ("Economie", "vwo")).fetchall()
+
+
+def pooled_write(session_id: int):
+    with db.transaction() as conn:
+        conn.execute(WRITE_SQL, (session_id, next(_question_ids), "antwoord", 0, None))
+
+
+def run(read, write, threads: int, seconds: float, write_ratio: float) -> dict:
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+    errors = [0] * threads
+    failures = [0] * threads
+
+    def request(i: int, is_write: bool):
+        try:
+            if is_write:
+                write(i + 1)
+            else:
+                read()
+            counts[i] += 1
+        except sqlite3.OperationalError:
+            errors[i] += 1  # 'database is locked'
+        except sqlite3.Error:
+            failures[i] += 1  # bv. IntegrityError: de meting klopt dan niet
+
+    def worker(i: int):
+        rnd = random.Random(i)
+        while time.perf_counter() < stop:
+            # Eén thread per request, zoals een Streamlit-rerun
+            t = threading.Thread(target=request, args=(i, rnd.random() < write_ratio))
+            t.start()
+            t.join()
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    elapsed = time.perf_counter() - start
+    db.close_connections()
+    return {"ops": sum(counts), "errors": sum(errors), "failures": sum(failures), "ops_per_sec": sum(counts) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Oud: rollback-journal, nieuwe connectie per operatie
+        db.DB_PATH = Path(tmp) / "legacy.db"
+        db.init_db(force=True)
+        db.get_connection().execute("PRAGMA journal_mode=DELETE")
+        db.close_connections()
+        before = run(legacy_read, legacy_write, args.threads, args.seconds, args.write_ratio)
+
+        # Getunede WAL-connectie per thread, zonder pool
+        db.DB_PATH = Path(tmp) / "per_thread.db"
+        db.init_db(force=True)
+        db.close_connections()
+        per_thread = run(per_thread_read, per_thread_write, args.threads, args.seconds, args.write_ratio)
+
+        # Nieuw: procesbrede pool via db.get_connection()
+        db.DB_PATH = Path(tmp) / "pooled.db"
+        db.init_db(force=True)
+        after = run(pooled_read, pooled_write, args.threads, args.seconds, args.write_ratio)
+
+    results = (("per-call connect", before), ("per-thread WAL", per_thread), ("pooled WAL", after))
+    for name, res in results:
+        if res["failures"]:
+            raise SystemExit(f"{name}: {res['failures']} onverwachte databasefouten; resultaten ongeldig.")
+
+    print(f"threads={args.threads} seconds={args.seconds} write_ratio={args.write_ratio} (thread per request)")
+    for name, res in results:
+        print(f"{name:>17}: {res['ops_per_sec']:10.0f} ops/sec  ({res['ops']} ops, {res['errors']} lock errors)")
+    print(f"{'speedup':>17}: {after['ops_per_sec'] / before['ops_per_sec']:10.1f}x "
+          f"(t.o.v. per-thread: {after['ops_per_sec'] / per_thread['ops_per_sec']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: JSON-import van een grote item bank, json.load + execute per item
+(oud) vs. streaming parser + executemany in batches.
+
+Genereert één synthetisch bestand en importeert het per modus in een apart
+proces, zodat de piek-RSS (ru_maxrss) per modus klopt. Print items/sec en
+piekgeheugen.
+
+    python benchmarks/bench_import.py --items 200000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+FILE_NAME = "economie_vwo.json"
+
+
+def generate(path: Path, items: int):
+    # Schrijf item voor item, zodat ook het genereren weinig geheugen kost
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(items):
+            item = {
+                "context": f"Bron {i % 500}: een tekst over de marktwerking in sector {i % 37}.",
+                "question": f"Vraag {i}: leg uit wat het effect is van maatregel {i % 911} op de prijs.",
+                "options": [f"Optie {j}" for j in range(4)] if i % 3 == 0 else [],
+                "correct_answer": f"Het antwoord op vraag {i} is dat de prijs stijgt door een lager aanbod.",
+                "level": "vwo",
+                "topic": f"Onderwerp {i % 25}",
+            }
+            f.write(json.dumps(item, ensure_ascii=False))
+            f.write(",\n" if i < items - 1 else "\n")
+        f.write("]\n")
+
+
+def legacy_import(cur) -> int:
+    # Zoals import_json_questions vroeger: json.load van het hele bestand en
+    # één execute per item
+    path = db.DATA_DIR / FILE_NAME
+    items = json.loads(path.read_bytes().decode("utf-8"))
+    rows = 0
+    for row in db._question_rows(FILE_NAME, "Economie", "vwo", items):
+        cur.execute(db._UPSERT_QUESTION_SQL, row)
+        rows += 1
+    return rows
+
+
+def run_mode(mode: str, data_dir: Path, db_path: Path):
+    db.DATA_DIR = data_dir
+    db.DB_PATH = db_path
+    db.migrate()
+    start = time.perf_counter()
+    with db.transaction() as conn:
+        if mode == "legacy":
+            rows = legacy_import(conn.cursor())
+        else:
+            rows = db.import_json_questions(conn.cursor())
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB op Linux, in bytes op macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mib = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    print(json.dumps({"rows": rows, "seconds": elapsed, "peak_rss_mib": peak_mib}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--db", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:  # subproces
+        run_mode(args.mode, args.data_dir, args.db)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        data_dir.mkdir()
+        generate(data_dir / FILE_NAME, args.items)
+        size_mib = (data_dir / FILE_NAME).stat().st_size / (1024 * 1024)
+        print(f"items={args.items} bestand={size_mib:.1f} MiB batch={db.IMPORT_BATCH_SIZE}")
+
+        for mode in ("legacy", "streaming"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--data-dir", str(data_dir), "--db", str(Path(tmp) / f"{mode}.db")],
+                check=True,
+                capture_output=True,
+                text=True,
+                env=os.environ,
+            ).stdout
+            res = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"{mode:>10}: {res['rows'] / res['seconds']:10.0f} items/sec  "
+                f"({res['rows']} rows in {res['seconds']:.2f}s, piek-RSS {res['peak_rss_mib']:.0f} MiB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
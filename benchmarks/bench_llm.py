@@ -0,0 +1,224 @@
+"""Benchmark: doorvoer en staartlatency van de LLM-paden, offline.
+
+Gebruikt de nep-provider uit llm_backends.py (of ``--replay`` met eerder
+opgenomen echte antwoorden) en meet get_feedback, iter_feedback (feedback voor
+een heel examen), generate_followup en ask_tutor (plus tijd tot het eerste
+token van ask_tutor_stream) met ``--concurrency`` gelijktijdige gebruikers.
+Retries, backoff en de circuit breaker van llm.py doen gewoon mee, dus met
+``--rate-429``/``--rate-500`` zie je hun effect op p95/p99.
+
+    python benchmarks/bench_llm.py --calls 200 --concurrency 16
+    python benchmarks/bench_llm.py --latency lognormal:0.8,0.6 --rate-429 0.05 --json out.json
+    LLM_BACKEND=record streamlit run main.py      # echte antwoorden opnemen
+    python benchmarks/bench_llm.py --replay llm_recordings.jsonl
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+import llm  # noqa: E402
+import llm_backends  # noqa: E402
+
+SUBJECT, LEVEL = "Economie", "vwo"
+ERROR_MARKERS = ("(Fout", "niet beschikbaar")
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def _is_error(result) -> bool:
+    texts = result if isinstance(result, list) else [result]
+    return any(isinstance(t, str) and any(m in t for m in ERROR_MARKERS) for t in texts) or not texts
+
+
+def _questions() -> List[Dict]:
+    questions = db.fetch_questions(SUBJECT, LEVEL)
+    if not questions:
+        raise SystemExit(f"Geen vragen voor {SUBJECT} {LEVEL} in {db.DATA_DIR}")
+    return questions
+
+
+# Elke case krijgt een volgnummer en geeft (resultaat, tijd tot eerste token of None)
+def _case_get_feedback(questions: List[Dict], n: int):
+    q = questions[n % len(questions)]
+    # Uniek antwoord per call: geen cache-hits
+    return llm.get_feedback(q["question"], q["correct_answer"], f"Antwoord {n}", subject=SUBJECT, level=LEVEL), None
+
+
+def _case_iter_feedback(questions: List[Dict], n: int, exam_size: int = 20):
+    answers = [
+        {"question": q["question"], "correct_answer": q["correct_answer"], "user_answer": f"Antwoord {n}.{i}"}
+        for i, q in enumerate(questions[(n + j) % len(questions)] for j in range(exam_size))
+    ]
+    results = {i: feedback for i, feedback, _ in llm.iter_feedback(answers, subject=SUBJECT, level=LEVEL)}
+    return [results[i] for i in sorted(results)], None
+
+
+def _case_generate_followup(questions: List[Dict], n: int):
+    mistakes = [questions[(n + j) % len(questions)]["question"] + f" ({n})" for j in range(3)]
+    return llm.generate_followup(SUBJECT, LEVEL, mistakes), None
+
+
+def _case_ask_tutor(questions: List[Dict], n: int):
+    started = time.perf_counter()
+    ttft = None
+    parts = []
+    question = f"Kun je uitleggen hoe een heffing de evenwichtsprijs beïnvloedt? ({n})"
+    for part in llm.ask_tutor_stream(SUBJECT, LEVEL, question):
+        if ttft is None:
+            ttft = time.perf_counter() - started
+        parts.append(part)
+    return "".join(parts), ttft
+
+
+CASES = [
+    ("get_feedback", _case_get_feedback),
+    ("iter_feedback (20 antwoorden)", _case_iter_feedback),
+    ("generate_followup", _case_generate_followup),
+    ("ask_tutor", _case_ask_tutor),
+]
+
+
+def run_case(case: Callable, questions: List[Dict], calls: int, concurrency: int) -> Dict:
+    counter = iter(range(calls))
+    counter_lock = threading.Lock()
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            try:
+                result, ttft = case(questions, n)
+                failed = _is_error(result)
+            except Exception:
+                result, ttft, failed = None, None, True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if ttft is not None:
+                    ttfts.append(ttft)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ttfts.sort()
+    res = {
+        "calls": len(latencies),
+        "errors": errors[0],
+        "seconds": round(elapsed, 3),
+        "calls_per_sec": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(1000 * _percentile(latencies, 50), 1),
+        "p95_ms": round(1000 * _percentile(latencies, 95), 1),
+        "p99_ms": round(1000 * _percentile(latencies, 99), 1),
+    }
+    if ttfts:
+        res["ttft_p50_ms"] = round(1000 * _percentile(ttfts, 50), 1)
+        res["ttft_p95_ms"] = round(1000 * _percentile(ttfts, 95), 1)
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="calls per functie")
+    parser.add_argument("--concurrency", type=int, default=16, help="gelijktijdige gebruikers")
+    parser.add_argument("--latency", default=llm_backends.LLM_FAKE_LATENCY, help="bv. lognormal:0.6,0.5 of fixed:0.2")
+    parser.add_argument("--token-delay", type=float, default=llm_backends.LLM_FAKE_TOKEN_DELAY)
+    parser.add_argument("--tokens", type=int, default=llm_backends.LLM_FAKE_TOKENS)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", type=Path, help="JSONL-opname i.p.v. de nep-provider")
+    parser.add_argument("--feedback-mode", choices=["concurrent", "batch"], default=llm.FEEDBACK_MODE)
+    parser.add_argument("--only", action="append", help="alleen cases waarvan de naam dit bevat")
+    parser.add_argument("--json", type=Path, help="schrijf de resultaten ook als JSON weg")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Scratch-database met de echte vragenbank (voor retrieval/grounding)
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.SNAPSHOT_PATH = Path(tmp) / "geen.snapshot"
+        db.init_db(force=True)
+        questions = _questions()
+        # Geen cache-hits: elke call moet echt naar de (nep-)provider
+        llm.FEEDBACK_CACHE_ENABLED = False
+        llm.FEEDBACK_MODE = args.feedback_mode
+
+        if args.replay:
+            client = llm_backends.ReplayClient(str(args.replay))
+            llm.use_backend("replay", client)
+            setup = {"backend": "replay", "recordings": len(client)}
+        else:
+            client = llm_backends.FakeChatClient(
+                latency=args.latency,
+                token_delay=args.token_delay,
+                tokens=args.tokens,
+                rate_429=args.rate_429,
+                rate_500=args.rate_500,
+                seed=args.seed,
+            )
+            llm.use_backend("fake", client)
+            setup = {
+                "backend": "fake",
+                "latency": args.latency,
+                "token_delay": args.token_delay,
+                "rate_429": args.rate_429,
+                "rate_500": args.rate_500,
+            }
+        setup.update(calls=args.calls, concurrency=args.concurrency, feedback_mode=args.feedback_mode)
+        print(" ".join(f"{k}={v}" for k, v in setup.items()))
+
+        results = {}
+        for name, case in CASES:
+            if args.only and not any(o in name for o in args.only):
+                continue
+            before = client.stats() if hasattr(client, "stats") else None
+            res = run_case(case, questions, args.calls, args.concurrency)
+            if before is not None:
+                after = client.stats()
+                res["provider"] = {k: after[k] - before[k] for k in after}
+            results[name] = res
+            line = (
+                f"{name:>30}: {res['calls_per_sec']:8.1f} calls/sec  p50 {res['p50_ms']:7.0f} ms  "
+                f"p95 {res['p95_ms']:7.0f} ms  p99 {res['p99_ms']:7.0f} ms  fouten {res['errors']}"
+            )
+            if "ttft_p50_ms" in res:
+                line += f"  eerste token p50 {res['ttft_p50_ms']:.0f} ms"
+            if "provider" in res:
+                p = res["provider"]
+                line += f"  (requests {p['requests']}, 429: {p['errors_429']}, 500: {p['errors_500']})"
+            print(line)
+        db.close_connections()
+
+    if args.json:
+        args.json.write_text(json.dumps({"setup": setup, "results": results}, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark: geheugen per examensessie in ``st.session_state``.
+
+Vergelijkt drie manieren om de antwoorden van één examen te bewaren:
+
+- ``dicts (kopie)``: lijst van dicts met vraagtekst, modelantwoord, context en
+  feedback per antwoord, met eigen kopieën van de strings (zoals toen elke
+  sessie de vragen zelf uit SQLite las);
+- ``dicts (gedeeld)``: dezelfde dicts, maar de strings verwijzen naar de
+  gedeelde vragenbank;
+- ``ExamRecord``: alleen vraag-ID's, antwoorden en bits.
+
+Gemeten met tracemalloc over ``--sessions`` sessies van ``--size`` vragen.
+
+    python benchmarks/bench_session_memory.py --sessions 200 --size 20
+"""
+
+import argparse
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exam_record import ExamRecord  # noqa: E402
+from grader import grade_answer, local_feedback  # noqa: E402
+
+
+def make_bank(n: int):
+    bank = []
+    for i in range(n):
+        open_question = i % 3 == 0
+        bank.append(
+            {
+                "id": 10_000_000 + i,
+                "question": f"Vraag {i}: leg uit wat het effect is van maatregel {i % 911} op de evenwichtsprijs en de afzet.",
+                "options": None if open_question else [f"Optie {j}" for j in range(4)],
+                "correct_answer": (
+                    f"Door maatregel {i % 911} daalt het aanbod, waardoor de evenwichtsprijs stijgt en de afzet daalt."
+                    if open_question
+                    else "Optie 1"
+                ),
+                "image": f"grafiek_{i % 40}.png" if i % 5 == 0 else None,
+                "context": f"Bron {i % 500}: een tekst over de marktwerking in sector {i % 37}. " * 4,
+            }
+        )
+    return bank
+
+
+def answer_for(q, rng):
+    if q["options"]:
+        return rng.choice(q["options"])
+    return rng.choice(["", "De prijs stijgt omdat het aanbod daalt.", "Geen idee, iets met de prijs."])
+
+
+def session_dicts(bank, size, rng, copy_strings):
+    def own(s):
+        # Nieuwe string-objecten, zoals een eigen SQLite-read die oplevert
+        return None if s is None else (s + ".")[:-1]
+
+    answers, mistakes = [], []
+    for q in rng.sample(bank, size):
+        user_answer = answer_for(q, rng)
+        grade = grade_answer(q, user_answer)
+        text = own(q["question"]) if copy_strings else q["question"]
+        answers.append(
+            {
+                "question": text,
+                "question_id": q["id"],
+                "correct_answer": own(q["correct_answer"]) if copy_strings else q["correct_answer"],
+                "user_answer": user_answer,
+                "is_correct": grade["correct"],
+                "score": grade["score"],
+                "feedback": None if grade["escalate"] else local_feedback(grade, q["correct_answer"]),
+                "image": own(q["image"]) if copy_strings else q["image"],
+                "context": own(q["context"]) if copy_strings else q["context"],
+            }
+        )
+        if not grade["correct"]:
+            mistakes.append(text)
+    return answers, mistakes
+
+
+def session_record(bank, size, rng):
+    record = ExamRecord()
+    for q in rng.sample(bank, size):
+        user_answer = answer_for(q, rng)
+        grade = grade_answer(q, user_answer)
+        record.add(
+            q["id"],
+            user_answer,
+            grade["correct"],
+            score=None if q["options"] else grade["score"],
+            escalate=grade["escalate"],
+        )
+    return record
+
+
+def measure(build, sessions: int) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(s) for s in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) // sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--bank", type=int, default=2000)
+    args = parser.parse_args()
+
+    bank = make_bank(args.bank)
+    # Grader-caches vooraf vullen, zodat die niet aan de eerste modus worden toegerekend
+    for s in range(args.sessions):
+        session_record(bank, args.size, random.Random(s))
+
+    layouts = [
+        ("dicts (kopie)", lambda s: session_dicts(bank, args.size, random.Random(s), True)),
+        ("dicts (gedeeld)", lambda s: session_dicts(bank, args.size, random.Random(s), False)),
+        ("ExamRecord", lambda s: session_record(bank, args.size, random.Random(s))),
+    ]
+    print(f"sessies={args.sessions} vragen/examen={args.size}")
+    baseline = None
+    for name, build in layouts:
+        per_session = measure(build, args.sessions)
+        baseline = baseline or per_session
+        print(f"{name:>16}: {per_session:8d} bytes/sessie  ({per_session / baseline:5.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Query-plan regressiecheck voor db.py.
+
+Bouwt een grote synthetische database, roept elke publieke functie van db.py
+aan en legt via de trace-callback alle uitgevoerde SQL vast. Voor elke query
+wordt ``EXPLAIN QUERY PLAN`` uitgevoerd; valt er één terug op een table scan
+(``SCAN <tabel>``) die niet bewust is toegestaan, of wijkt een query met een
+vastgelegd plan (``PLAN_RULES``) daarvan af, dan eindigt het script met
+exitcode 1.
+
+    python benchmarks/check_query_plans.py --users 2000 --sessions 20000 --answers 200000
+"""
+
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+# Bewuste full scans: (regex op de SQL, reden)
+ALLOWED_SCANS = [
+    (r"FROM sqlite_master", "schema-check bij opstarten"),
+    (r"SELECT DISTINCT image FROM questions", "beeldvarianten na een import die vragen wijzigde"),
+    (r"^SELECT k, v FROM \?\.\?$", "interne FTS5-configuratie (questions_fts_config, enkele rijen)"),
+    (r"FROM import_manifest$", "manifest: één rij per bronbestand"),
+    (r"SELECT COUNT\(\*\) FROM feedback_cache", "cache-omvang voor eviction (elke 100 inserts)"),
+    (r"FROM sessions s JOIN answers a ON s.id = a.session_id (JOIN questions q ON a.question_id = q.id )?(WHERE s.user_id IS NOT NULL )?GROUP BY",
+     "rebuild/verify van de rollups: herberekening over alle antwoorden (onderhoud)"),
+    (r"^DELETE FROM (session_scores|user_topic_progress)$", "rebuild van de rollups (onderhoud)"),
+    (r"FROM (session_scores|user_topic_progress) WHERE total_questions > \?$", "verify van de rollups (onderhoud)"),
+    (r"ORDER BY last_used_at LIMIT", "LRU-eviction loopt de index op last_used_at af tot LIMIT"),
+    (r"GROUP BY session_id, question_id\)", "eenmalige ontdubbeling bij aanmaken unieke index"),
+    (r"WHERE feedback IS NULL$", "eenmalige ontdubbeling bij aanmaken unieke index"),
+]
+
+# Queries met een vast plan: (regex op de SQL, toegestane SCAN-stappen, verplichte
+# stappen, reden). Alleen de genoemde scans mogen; elke verplichte stap moet er staan.
+PLAN_RULES = [
+    (
+        r"^WITH ranked AS \(",
+        (r"^SCAN ranked$", r"^SCAN \(subquery-\d+\)$"),
+        ("SEARCH questions USING INDEX idx_questions_subject_level (subject=? AND level=?)",),
+        "examensteekproef: vragen van één vak/niveau via de index, daarna alleen CTE's en temp B-trees",
+    ),
+]
+
+SCAN_RE = re.compile(r"\bSCAN (\w+)")
+ANY_SCAN_RE = re.compile(r"\bSCAN\b")
+VTAB_MATCH_RE = re.compile(r"VIRTUAL TABLE INDEX \d+:\w*M")
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+ANALYZED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def populate(users: int, sessions: int, answers: int, questions: int):
+    """Vul de (al geïnitialiseerde) database met synthetische vragen/gebruikers/sessies/antwoorden."""
+    rnd = random.Random(42)
+    with db.transaction() as conn:
+        conn.executemany(
+            """INSERT INTO questions(subject, level, year, question, correct_answer, topic, source)
+               VALUES ('Economie', 'vwo', 2024, ?, 'antwoord', ?, 'synthetic')""",
+            ((f"Synthetische vraag {i}", f"Onderwerp {i % 25}") for i in range(questions)),
+        )
+    qids = [q for (q,) in db.get_connection().execute("SELECT id FROM questions")]
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users(username, password, level) VALUES (?, ?, 'vwo')",
+            ((f"user{i}", "x") for i in range(users)),
+        )
+        conn.executemany(
+            "INSERT INTO sessions(user_id, subject, started_at) VALUES (?, 'Economie', datetime('now', ?))",
+            ((rnd.randint(1, users), f"-{i} minutes") for i in range(sessions)),
+        )
+        per_session = max(1, answers // sessions)
+        conn.executemany(
+            "INSERT OR IGNORE INTO answers(session_id, question_id, user_answer, is_correct) VALUES (?, ?, 'a', ?)",
+            (
+                (s, qids[(s * 7 + k) % len(qids)], rnd.random() < 0.5)
+                for s in range(1, sessions + 1)
+                for k in range(per_session)
+            ),
+        )
+
+
+def exercise():
+    """Roep elke publieke db-functie minstens één keer aan."""
+    db.fetch_questions("Economie", "vwo")
+    qid = db.fetch_questions("Economie", "vwo")[0]["id"]
+    db.get_question(qid)
+    db.assemble_exam("Economie", "vwo", 20, seed=1)
+    db.question_bank_stats()
+    db.search_questions("synthetische vraag")
+    db.search_questions("onderwerp", subject="Economie", level="vwo", limit=10, offset=10)
+    db.create_user("plan_check", "pw", "vwo")
+    user = db.authenticate_user("plan_check", "pw")
+    db.authenticate_user("user1", "fout")
+    sid = db.start_session_db(user["id"], "Economie")
+    db.save_answer_db(sid, qid, "antwoord", False)
+    db.flush_answers(sid)
+    db.save_answer_db(sid, qid, "antwoord", True)  # upsert: UPDATE-pad (en trigger)
+    db.flush_answers(sid)
+    db.save_feedback_db(sid, qid, "feedback")
+    db.finish_session_db(sid)
+    db.get_user_sessions_with_scores(1)
+    db.get_user_progress(1)
+    db.verify_rollups()
+    db.rebuild_rollups()
+    key = ("q", "a", "model", "1", "nl")
+    db._FEEDBACK_CACHE_EVICT_EVERY = 1  # eviction-pad ook raken
+    db.put_cached_feedback(("q", "oud", "model", "1", "nl"), "feedback", 0)
+    db.put_cached_feedback(key, "feedback", 1000)
+    db.get_cached_feedback(key, 3600)
+    db.feedback_cache_size()
+
+
+def check(statements):
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.create_function("seeded_rank", 2, db._seeded_rank, deterministic=True)
+    failures, seen = [], set()
+    for sql in statements:
+        normalized = " ".join(sql.split())
+        # Trace geeft SQL met ingevulde waarden; dedupliceren op het sjabloon
+        template = LITERAL_RE.sub("?", normalized)
+        if template in seen or not normalized.upper().startswith(ANALYZED):
+            continue
+        seen.add(template)
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + normalized)]
+        rule = next((rule for rule in PLAN_RULES if re.search(rule[0], template)), None)
+        if rule is not None:
+            _, allowed_scans, required, reason = rule
+            unexpected = [d for d in plan if ANY_SCAN_RE.search(d) and not any(re.search(p, d) for p in allowed_scans)]
+            missing = [step for step in required if step not in plan]
+            print(f"[{'PLAN WIJKT AF' if unexpected or missing else 'ok: ' + reason}] {template[:120]}")
+            if unexpected or missing:
+                for d in plan:
+                    print(f"      {d}")
+                for step in missing:
+                    print(f"      ontbreekt: {step}")
+                failures.append(template)
+            continue
+        # "VIRTUAL TABLE INDEX n:M..." is een FTS5-MATCH (indexlookup), geen scan
+        scans = [d for d in plan if SCAN_RE.search(d) and "CONSTANT ROW" not in d and not VTAB_MATCH_RE.search(d)]
+        allowed = next((reason for pattern, reason in ALLOWED_SCANS if re.search(pattern, template)), None)
+        status = "ok" if not scans else ("allowed: " + allowed if allowed else "TABLE SCAN")
+        print(f"[{status}] {template[:120]}")
+        if scans:
+            for d in plan:
+                print(f"      {d}")
+        if scans and not allowed:
+            failures.append(template)
+    conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--answers", type=int, default=200000)
+    parser.add_argument("--questions", type=int, default=5000)
+    args = parser.parse_args()
+
+    statements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "plans.db"
+        db.SNAPSHOT_PATH = Path(tmp) / "geen.snapshot"  # altijd via de database zelf
+        conn = db.get_connection()
+        conn.set_trace_callback(statements.append)
+        db.init_db(force=True)
+        conn.set_trace_callback(None)
+        populate(args.users, args.sessions, args.answers, args.questions)
+        db.invalidate_question_bank()
+        conn.set_trace_callback(statements.append)
+        exercise()
+        db.flush_answers()
+        conn.set_trace_callback(None)
+        failures = check(statements)
+        db.close_connections()
+
+    if failures:
+        print(f"\n{len(failures)} query/queries vallen terug op een table scan of wijken af van hun vastgelegde plan:")
+        for sql in failures:
+            print(f"  - {sql}")
+        sys.exit(1)
+    print("\nAlle queries gebruiken een index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Consistentiecheck van de snapshot tegenover de database.
+
+Bouwt in een tijdelijke map een snapshot van ./data, maakt hem verouderd door een
+vraag in de JSON te wijzigen (de app valt dan terug op de JSON-import), zet de
+JSON terug en start opnieuw. Na elke start moet de vraagtekst in de database
+(o.a. zoeken) gelijk zijn aan die in de vragenbank (snapshot of database);
+anders eindigt het script met exitcode 1.
+
+    python benchmarks/check_snapshot.py
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+import snapshot  # noqa: E402
+
+EDIT_MARKER = " (gewijzigd)"
+
+
+def mismatches() -> list:
+    """Vragen waarvan de tekst in de database afwijkt van die in de vragenbank."""
+    problems = []
+    for qid, text in db.get_connection().execute("SELECT id, question FROM questions"):
+        q = db.get_question(qid)
+        bank_text = q["question"] if q else None
+        if bank_text != text:
+            problems.append((qid, text, bank_text))
+    return problems
+
+
+def step(name: str, expect_snapshot: bool) -> bool:
+    db.init_db(force=True)
+    problems = mismatches()
+    active = db._snapshot_active is not None
+    ok = not problems and active == expect_snapshot
+    print(f"[{'ok' if ok else 'FOUT'}] {name}: snapshot {'actief' if active else 'niet actief'}, {len(problems)} verschil(len)")
+    for qid, text, bank_text in problems[:5]:
+        print(f"      vraag {qid}: database {text[:60]!r}, bank {str(bank_text)[:60]!r}")
+    return ok
+
+
+def main():
+    source_dir = db.DATA_DIR
+    files = sorted(source_dir.glob("*_*.json"))
+    if not files:
+        raise SystemExit(f"Geen vragenbestanden in {source_dir}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db.DATA_DIR = tmp / "data"
+        db.DATA_DIR.mkdir()
+        for path in files:
+            shutil.copy2(path, db.DATA_DIR / path.name)
+        db.DB_PATH = tmp / "check.db"
+        db.SNAPSHOT_PATH = tmp / "questions.snapshot"
+        snapshot.build_snapshot(db.SNAPSHOT_PATH)
+
+        target = db.DATA_DIR / files[0].name
+        original = target.read_bytes()
+        items = json.loads(original)
+        items[0]["question"] += EDIT_MARKER
+
+        results = [step("verse snapshot", True)]
+        target.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+        results.append(step("JSON gewijzigd (snapshot verouderd)", False))
+        target.write_bytes(original)
+        results.append(step("JSON teruggezet (snapshot weer geldig)", True))
+        db.close_connections()
+
+    if not all(results):
+        sys.exit(1)
+    print("\nDatabase en vragenbank zijn consistent.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Synthetische dataset op schaal voor de benchmarks.
+
+Schrijft vragenbestanden naar ``<dir>/data/<vak>_<niveau>.json`` en vult
+``<dir>/bench.db`` (gewone import + gebruikers, sessies en antwoorden). De
+rollups worden na het laden in één keer berekend i.p.v. per antwoord via de
+triggers. Deterministisch per ``--seed``.
+
+    python benchmarks/datagen.py /tmp/bench --scale small
+    python benchmarks/datagen.py /tmp/bench --scale large          # 100k/1M/20M/100k
+    python benchmarks/datagen.py /tmp/bench --users 5000 --answers 1000000
+
+Wachtwoord van gebruiker ``user000042`` is ``pw42`` (voor authenticate_user).
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+PRESETS = {
+    "tiny": {"users": 100, "sessions": 1_000, "answers": 20_000, "questions": 2_000},
+    "small": {"users": 1_000, "sessions": 10_000, "answers": 200_000, "questions": 5_000},
+    "medium": {"users": 10_000, "sessions": 100_000, "answers": 2_000_000, "questions": 20_000},
+    "large": {"users": 100_000, "sessions": 1_000_000, "answers": 20_000_000, "questions": 100_000},
+}
+
+SUBJECTS = ["economie", "geschiedenis", "nederlands", "engels"]
+LEVELS = ["havo", "vwo"]
+TOPICS_PER_FILE = 25
+BATCH_SIZE = 50_000
+
+_ROLLUP_TRIGGERS = ("trg_answers_rollup_insert", "trg_answers_rollup_delete", "trg_answers_rollup_update")
+
+_WORDS = (
+    "marktwerking prijs aanbod vraag overheid heffing subsidie inflatie rente export import welvaart "
+    "revolutie verdrag oorlog republiek handel koloniën industrialisatie verzuiling grondwet "
+    "argumentatie tekstverband signaalwoord hoofdgedachte alinea standpunt conclusie "
+    "grammar vocabulary reading argument author purpose paragraph evidence"
+).split()
+
+
+def password_for(user_index: int) -> str:
+    return f"pw{user_index}"
+
+
+def username_for(user_index: int) -> str:
+    return f"user{user_index:06d}"
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+
+def write_questions(data_dir: Path, questions: int, rng: random.Random) -> Dict[str, int]:
+    """Verdeel ``questions`` vragen over alle vak/niveau-bestanden; return aantal per bestand."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    files = [f"{s}_{lvl}.json" for s in SUBJECTS for lvl in LEVELS]
+    counts = {}
+    for n_file, name in enumerate(files):
+        count = questions // len(files) + (n_file < questions % len(files))
+        level = name[:-5].split("_")[1]
+        with open(data_dir / name, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            for i in range(count):
+                open_question = i % 3 == 0
+                item = {
+                    "context": f"Bron {i % 500}: {_sentence(rng, 30)}.",
+                    "question": f"Vraag {i}: {_sentence(rng, 14)}?",
+                    "options": [] if open_question else [_sentence(rng, 4) for _ in range(4)],
+                    "correct_answer": _sentence(rng, 20),
+                    "level": level,
+                    "topic": f"Onderwerp {i % TOPICS_PER_FILE}",
+                    "year": 2015 + i % 8,
+                }
+                if not open_question:
+                    item["correct_answer"] = item["options"][rng.randrange(4)]
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write(",\n" if i < count - 1 else "\n")
+            f.write("]\n")
+        counts[name] = count
+    return counts
+
+
+def _insert_users(users: int, rng: random.Random) -> List[str]:
+    levels = [rng.choice(LEVELS) for _ in range(users)]
+    for start in range(0, users, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(users, start + BATCH_SIZE)):
+            salt = f"{rng.getrandbits(64):016x}"
+            rows.append((username_for(i), db._hash_salted(password_for(i), salt), salt, levels[i]))
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO users(username, password, salt, level) VALUES (?, ?, ?, ?)", rows)
+    return levels
+
+
+def _insert_sessions_and_answers(user_levels: List[str], sessions: int, answers: int, rng: random.Random) -> int:
+    conn = db.get_connection()
+    bank: Dict[tuple, List[int]] = {}
+    for qid, subject, level in conn.execute("SELECT id, subject, level FROM questions"):
+        bank.setdefault((subject, level), []).append(qid)
+    subjects = sorted({subject for subject, _ in bank})
+    (first_user,) = conn.execute("SELECT MIN(id) FROM users").fetchone()
+    (next_session,) = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sessions").fetchone()
+    now = time.time()
+
+    written = 0
+    session_rows, answer_rows = [], []
+
+    def flush():
+        with db.transaction() as c:
+            c.executemany(
+                "INSERT INTO sessions(id, user_id, subject, started_at, finished_at) VALUES (?, ?, ?, ?, ?)",
+                session_rows,
+            )
+            c.executemany(
+                "INSERT INTO answers(session_id, question_id, user_answer, is_correct, feedback) VALUES (?, ?, ?, ?, ?)",
+                answer_rows,
+            )
+        session_rows.clear()
+        answer_rows.clear()
+
+    for n in range(sessions):
+        user = rng.randrange(len(user_levels))
+        subject = rng.choice(subjects)
+        pool = bank.get((subject, user_levels[user])) or bank[(subject, LEVELS[0])]
+        # Antwoorden zo gelijk mogelijk over de sessies verdeeld (max. één per vraag per sessie)
+        size = min(len(pool), answers // sessions + (n < answers % sessions))
+        started = now - rng.uniform(0, 365 * 86400)
+        sid = next_session + n
+        session_rows.append((
+            sid,
+            first_user + user,
+            subject,
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(started)),
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(started + 60 * size)),
+        ))
+        skill = rng.uniform(0.3, 0.9)
+        for qid in rng.sample(pool, size):
+            correct = rng.random() < skill
+            feedback = None if correct or rng.random() < 0.7 else "Bekijk het modelantwoord nog eens."
+            answer_rows.append((sid, qid, "antwoord", int(correct), feedback))
+        written += size
+        if len(answer_rows) >= BATCH_SIZE:
+            flush()
+    flush()
+    return written
+
+
+def generate(target: Path, users: int, sessions: int, answers: int, questions: int, seed: int = 0, log=print) -> Dict:
+    """Bouw een nieuwe benchmark-database in ``target``; return een samenvatting."""
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    db_path = target / "bench.db"
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(db_path) + suffix).unlink(missing_ok=True)
+
+    use_dataset(target)
+    timings = {}
+
+    started = time.perf_counter()
+    write_questions(db.DATA_DIR, questions, rng)
+    timings["write_json"] = time.perf_counter() - started
+    log(f"vragenbestanden: {timings['write_json']:.1f}s")
+
+    started = time.perf_counter()
+    db.init_db(force=True)  # migraties + import van ./data
+    timings["import"] = time.perf_counter() - started
+    log(f"import: {timings['import']:.1f}s")
+
+    # Rollup-triggers uit tijdens het bulkladen; daarna in één keer herberekenen
+    conn = db.get_connection()
+    for name in _ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        started = time.perf_counter()
+        levels = _insert_users(users, rng)
+        timings["users"] = time.perf_counter() - started
+        log(f"gebruikers: {timings['users']:.1f}s")
+
+        started = time.perf_counter()
+        written = _insert_sessions_and_answers(levels, sessions, answers, rng)
+        timings["sessions_answers"] = time.perf_counter() - started
+        log(f"sessies + antwoorden: {timings['sessions_answers']:.1f}s")
+    finally:
+        started = time.perf_counter()
+        with db.transaction() as c:
+            cur = c.cursor()
+            for statement in db._ROLLUP_SCHEMA:
+                cur.execute(statement)
+            db._rebuild_rollups(cur)
+        conn.execute("ANALYZE")
+        timings["rollups"] = time.perf_counter() - started
+        log(f"rollups + ANALYZE: {timings['rollups']:.1f}s")
+
+    db.close_connections()
+    return {
+        "db": str(db_path),
+        "seed": seed,
+        "users": users,
+        "sessions": sessions,
+        "answers": written,
+        "questions": questions,
+        "db_bytes": db_path.stat().st_size,
+        "timings": timings,
+    }
+
+
+def use_dataset(target: Path):
+    """Laat db.py de dataset in ``target`` gebruiken (en nooit de snapshot naast db.py)."""
+    target = Path(target)
+    db.close_connections()
+    db.DB_PATH = target / "bench.db"
+    db.DATA_DIR = target / "data"
+    db.SNAPSHOT_PATH = target / "geen.snapshot"
+    db.invalidate_question_bank()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", type=Path, help="map voor bench.db en data/")
+    parser.add_argument("--scale", choices=sorted(PRESETS), default="small")
+    for key in ("users", "sessions", "answers", "questions"):
+        parser.add_argument(f"--{key}", type=int, help="overschrijft --scale")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = dict(PRESETS[args.scale])
+    sizes.update({k: getattr(args, k) for k in sizes if getattr(args, k) is not None})
+    started = time.perf_counter()
+    summary = generate(args.target, seed=args.seed, **sizes)
+    summary["seconds"] = time.perf_counter() - started
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
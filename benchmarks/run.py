@@ -0,0 +1,327 @@
+"""Benchmark-suite: time de publieke functies van db.py op een synthetische dataset.
+
+Elke functie wordt een vaste tijd aangeroepen, single-threaded en met meerdere
+threads tegelijk (elke thread een eigen connectie, zoals Streamlit-sessies).
+Per (functie, threads) worden calls/sec en latency-percentielen gemeten. De
+resultaten gaan als JSON naar ``--output``, met commit, Python-, SQLite- en
+datasetversie erbij, zodat releases te vergelijken zijn (``--baseline``).
+
+    python benchmarks/run.py --scale small --output bench.json
+    python benchmarks/datagen.py /tmp/bench --scale large
+    python benchmarks/run.py --dataset /tmp/bench --threads 1,8,32 --output v2.json --baseline v1.json
+
+Let op: schrijvende functies (create_user, start_session_db, save_answer_db)
+voegen rijen toe aan de dataset; genereer hem opnieuw voor een zuivere vergelijking.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+import datagen  # noqa: E402
+
+RESULT_FORMAT = 1
+
+
+# ---------------------------
+# Dataset
+# ---------------------------
+
+
+class Dataset:
+    """Wat de cases nodig hebben om realistische argumenten te kiezen."""
+
+    def __init__(self, target: Path):
+        self.target = Path(target)
+        conn = db.get_connection()
+        self.banks = conn.execute("SELECT DISTINCT subject, level FROM questions ORDER BY 1, 2").fetchall()
+        self.question_ids = [row[0] for row in conn.execute("SELECT id FROM questions ORDER BY random() LIMIT 10000")]
+        # Alleen gebruikers uit datagen (met sessies), niet die van create_user-runs
+        self.users, self.first_user = conn.execute(
+            "SELECT COUNT(*), MIN(id) FROM users WHERE username GLOB 'user[0-9]*'"
+        ).fetchone()
+        (self.max_session,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sessions").fetchone()
+        self.counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "sessions", "answers", "questions")
+        }
+
+    def user_index(self, rng: random.Random) -> int:
+        return rng.randrange(self.users)
+
+
+# ---------------------------
+# Cases
+# ---------------------------
+
+# Per case: functie die (dataset, rng) krijgt en één aanroep doet. ``threaded``:
+# ook met meerdere threads meten. ``after``: wordt binnen de meettijd na de
+# laatste aanroep uitgevoerd (bv. de write-behind buffer leegschrijven).
+_unique = itertools.count()
+
+
+def _fetch_questions(ds: Dataset, rng: random.Random):
+    db.fetch_questions(*rng.choice(ds.banks))
+
+
+def _fetch_questions_cold(ds: Dataset, rng: random.Random):
+    db.invalidate_question_bank()
+    db.fetch_questions(*rng.choice(ds.banks))
+
+
+def _get_question(ds: Dataset, rng: random.Random):
+    db.get_question(rng.choice(ds.question_ids))
+
+
+def _assemble_exam(ds: Dataset, rng: random.Random):
+    subject, level = rng.choice(ds.banks)
+    db.assemble_exam(subject, level, seed=rng.randrange(2**31))
+
+
+def _search_questions(ds: Dataset, rng: random.Random):
+    subject, level = rng.choice(ds.banks)
+    db.search_questions(rng.choice(datagen._WORDS), subject=subject, level=level)
+
+
+def _authenticate_user(ds: Dataset, rng: random.Random):
+    i = ds.user_index(rng)
+    # 1 op de 10 pogingen met een fout wachtwoord
+    password = datagen.password_for(i) if rng.random() < 0.9 else "fout"
+    db.authenticate_user(datagen.username_for(i), password)
+
+
+def _create_user(ds: Dataset, rng: random.Random):
+    db.create_user(f"bench{next(_unique)}_{rng.getrandbits(32):08x}", "wachtwoord", rng.choice(datagen.LEVELS))
+
+
+def _start_session_db(ds: Dataset, rng: random.Random):
+    db.start_session_db(ds.first_user + ds.user_index(rng), rng.choice(ds.banks)[0])
+
+
+def _save_answer_db(ds: Dataset, rng: random.Random):
+    db.save_answer_db(rng.randint(1, ds.max_session), rng.choice(ds.question_ids), "antwoord", rng.random() < 0.6)
+
+
+def _get_user_sessions_with_scores(ds: Dataset, rng: random.Random):
+    db.get_user_sessions_with_scores(ds.first_user + ds.user_index(rng))
+
+
+def _get_user_progress(ds: Dataset, rng: random.Random):
+    db.get_user_progress(ds.first_user + ds.user_index(rng))
+
+
+def _import_unchanged(ds: Dataset, rng: random.Random):
+    # Manifest ongewijzigd: alleen stat + hash per bestand
+    with db.transaction() as conn:
+        db.import_json_questions(conn.cursor())
+
+
+def _import_full(ds: Dataset, rng: random.Random):
+    # Volledige import van ./data in een lege database
+    main_path = db.DB_PATH
+    scratch = ds.target / "import.db"
+    db.DB_PATH = scratch
+    try:
+        db.migrate()
+        with db.transaction() as conn:
+            db.import_json_questions(conn.cursor())
+    finally:
+        db.get_connection().close()
+        db._local.__dict__.clear()
+        db.DB_PATH = main_path
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(scratch) + suffix).unlink(missing_ok=True)
+
+
+CASES = [
+    # naam, functie, threaded, after
+    ("fetch_questions", _fetch_questions, True, None),
+    ("fetch_questions (koud)", _fetch_questions_cold, False, None),
+    ("get_question", _get_question, True, None),
+    ("assemble_exam", _assemble_exam, True, None),
+    ("search_questions", _search_questions, True, None),
+    ("authenticate_user", _authenticate_user, True, None),
+    ("create_user", _create_user, True, None),
+    ("start_session_db", _start_session_db, True, None),
+    ("save_answer_db", _save_answer_db, True, db.flush_answers),
+    ("get_user_sessions_with_scores", _get_user_sessions_with_scores, True, None),
+    ("get_user_progress", _get_user_progress, True, None),
+    ("import_json_questions (ongewijzigd)", _import_unchanged, False, None),
+    ("import_json_questions (volledig)", _import_full, False, None),
+]
+
+
+# ---------------------------
+# Meten
+# ---------------------------
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_case(ds: Dataset, call: Callable, threads: int, seconds: float, min_calls: int, after=None) -> Dict:
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    errors = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(t: int):
+        rng = random.Random(t)
+        own = latencies[t]
+        barrier.wait()
+        while time.perf_counter() < deadline[0] or len(own) < min_calls:
+            started = time.perf_counter()
+            try:
+                call(ds, rng)
+            except (sqlite3.Error, RuntimeError):
+                errors[t] += 1
+            own.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    deadline[0] = time.perf_counter() + seconds
+    started = time.perf_counter()
+    barrier.wait()
+    for w in workers:
+        w.join()
+    if after is not None:
+        after()
+    elapsed = time.perf_counter() - started
+
+    values = sorted(v for own in latencies for v in own)
+    return {
+        "threads": threads,
+        "calls": len(values),
+        "errors": sum(errors),
+        "seconds": round(elapsed, 4),
+        "calls_per_sec": round(len(values) / elapsed, 2),
+        "mean_ms": round(1000 * sum(values) / len(values), 4),
+        "p50_ms": round(1000 * _percentile(values, 50), 4),
+        "p95_ms": round(1000 * _percentile(values, 95), 4),
+        "p99_ms": round(1000 * _percentile(values, 99), 4),
+        "max_ms": round(1000 * values[-1], 4),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(ds: Dataset, thread_counts: List[int], seconds: float, min_calls: int, only: List[str] | None = None) -> List[Dict]:
+    results = []
+    for name, call, threaded, after in CASES:
+        if only and not any(o in name for o in only):
+            continue
+        for threads in thread_counts:
+            if threads > 1 and not threaded:
+                continue
+            res = run_case(ds, call, threads, seconds, min_calls if threads == 1 else 1, after)
+            res["name"] = name
+            results.append(res)
+            print(
+                f"{name:>36} x{threads:<3} {res['calls_per_sec']:10.0f}/s  "
+                f"p50 {res['p50_ms']:8.3f} ms  p95 {res['p95_ms']:8.3f} ms  p99 {res['p99_ms']:8.3f} ms"
+                + (f"  ({res['errors']} fouten)" if res["errors"] else ""),
+                file=sys.stderr,
+            )
+    return results
+
+
+def compare(baseline: Dict, current: Dict):
+    """Print per (functie, threads) de verhouding t.o.v. een eerder resultaat."""
+    old = {(r["name"], r["threads"]): r for r in baseline["results"]}
+    print(f"\nt.o.v. {baseline['meta'].get('git') or '?'} ({baseline['meta']['created_at']}):", file=sys.stderr)
+    for r in current["results"]:
+        prev = old.get((r["name"], r["threads"]))
+        if prev is None or not prev["calls_per_sec"] or not prev["p95_ms"]:
+            continue
+        print(
+            f"{r['name']:>36} x{r['threads']:<3} calls/s {r['calls_per_sec'] / prev['calls_per_sec']:6.2f}x  "
+            f"p95 {r['p95_ms'] / prev['p95_ms']:6.2f}x",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", type=Path, help="map van datagen.py (wordt gegenereerd als bench.db ontbreekt)")
+    parser.add_argument("--scale", choices=sorted(datagen.PRESETS), default="small", help="bij genereren")
+    parser.add_argument("--threads", default="1,8", help="komma-gescheiden, bv. 1,8,32")
+    parser.add_argument("--seconds", type=float, default=2.0, help="meettijd per (functie, threads)")
+    parser.add_argument("--min-calls", type=int, default=3, help="minimaal aantal calls single-threaded")
+    parser.add_argument("--only", action="append", help="alleen cases waarvan de naam dit bevat")
+    parser.add_argument("--output", type=Path, help="JSON-resultaat (standaard: stdout)")
+    parser.add_argument("--baseline", type=Path, help="eerder JSON-resultaat om mee te vergelijken")
+    args = parser.parse_args()
+
+    tmp = None
+    target = args.dataset
+    if target is None:
+        tmp = tempfile.mkdtemp(prefix="bench-")
+        target = Path(tmp)
+    try:
+        if not (target / "bench.db").exists():
+            sizes = datagen.PRESETS[args.scale]
+            datagen.generate(target, log=lambda msg: print(msg, file=sys.stderr), **sizes)
+        datagen.use_dataset(target)
+        db.init_db(force=True)
+        ds = Dataset(target)
+
+        result = {
+            "format": RESULT_FORMAT,
+            "meta": {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "git": _git_revision(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "dataset": ds.counts,
+                "seconds": args.seconds,
+            },
+            "results": run_suite(ds, [int(t) for t in args.threads.split(",")], args.seconds, args.min_calls, args.only),
+        }
+        db.close_connections()
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline:
+        compare(json.loads(args.baseline.read_text(encoding="utf-8")), result)
+
+
+if __name__ == "__main__":
+    main()
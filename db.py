@@ -1,28 +1,277 @@
 import sqlite3
+import codecs
 import json
 import os
+import queue
+import re
+import atexit
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict
 import hashlib
 
+import metrics
+
 DB_PATH = Path(__file__).with_suffix(".db")
+DATA_DIR = Path(__file__).with_name("data")
+# Vooraf gecompileerde vragenbank (zie snapshot.py); zonder dit bestand wordt
+# ./data/*.json bij het opstarten geïmporteerd
+SNAPSHOT_PATH = Path(os.getenv("QUESTION_SNAPSHOT", Path(__file__).with_name("questions.snapshot")))
+SNAPSHOT_FORMAT = 2
+
+# init_db() draait één keer per proces (Streamlit voert main.py bij elke rerun opnieuw uit)
+_init_lock = threading.Lock()
+_initialized = False
+
+# Versie van de vragenbank; opgehoogd zodra de importer vragen wijzigt
+_data_version = 0
+# Pad van de snapshot waaruit de vragenbank leest (None: uit de database zelf)
+_snapshot_active = None
 
 # ---------------------------
 # Database helpers
 # ---------------------------
 
 
-def get_connection():
-    """Return a SQLite connection (auto-connects to DB_PATH)."""
-    return sqlite3.connect(DB_PATH)
+# Connectie-instellingen (te overschrijven via omgevingsvariabelen)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "16384"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # max. aantal vrije connecties in de pool
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection met weakref-ondersteuning (voor de registry hieronder)."""
+
+
+# Procesbrede pool: Streamlit draait elke rerun in een nieuwe thread (en llm.py
+# gebruikt kortlevende threadpools), dus een connectie per thread zou na elke
+# interactie verdwijnen. Een thread leent bij de eerste db-call een connectie uit
+# de pool en geeft hem terug zodra de thread eindigt; de volgende thread krijgt
+# hem terug met PRAGMA's, UDF en statement-cache intact.
+_pool: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+_pool_generation = 0  # opgehoogd door close_connections(): oudere leases niet teruggeven
+_local = threading.local()
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+
+
+class _Lease:
+    """Connectie die één thread uit de pool leent; terug naar de pool als de thread eindigt."""
+
+    __slots__ = ("conn", "path", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, path: str):
+        self.conn = conn
+        self.path = path
+        self.generation = _pool_generation
+        # threading.local ruimt de lease op als de thread eindigt
+        weakref.finalize(self, _release, conn, path, self.generation).atexit = False
+
+
+def _acquire(path: str) -> sqlite3.Connection:
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        if conn.db_path == path:
+            return conn
+        conn.close()  # DB_PATH is intussen gewijzigd
+    conn = _connect(path)
+    conn.db_path = path
+    with _connections_lock:
+        _connections.add(conn)
+    return conn
+
+
+def _release(conn: sqlite3.Connection, path: str, generation: int):
+    try:
+        if conn.in_transaction:
+            conn.rollback()  # thread stierf midden in een transactie
+    except sqlite3.ProgrammingError:
+        return  # al gesloten
+    if generation == _pool_generation and path == str(DB_PATH) and _pool.qsize() < DB_POOL_SIZE:
+        _pool.put(conn)
+    else:
+        conn.close()
 
 
-def init_db():
-    """Initialiseer de database en importeer (externe) JSON-vragen indien aanwezig."""
+def _connect(path: str) -> sqlite3.Connection:
+    """Open een nieuwe, getunede connectie.
+
+    - WAL: lezers blokkeren niet op een schrijver (en andersom);
+    - synchronous=NORMAL: veilig in WAL-modus, geen fsync per commit;
+    - busy_timeout: wacht op een lock i.p.v. direct 'database is locked';
+    - autocommit (isolation_level=None): transacties expliciet via ``transaction()``.
+    Python cachet prepared statements per connectie (``cached_statements``), wat
+    met gepoolde, langlevende connecties ook echt iets oplevert. Een connectie
+    wordt door één thread tegelijk gebruikt, maar kan tussen threads wisselen
+    (``check_same_thread=False``)."""
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=False,
+        factory=_PooledConnection,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.create_function("seeded_rank", 2, _seeded_rank, deterministic=True)
+    return conn
+
+
+def _seeded_rank(seed, value) -> int:
+    """Pseudo-willekeurige maar reproduceerbare volgorde voor (seed, waarde), voor SQL."""
+    digest = hashlib.blake2b(f"{seed}:{value}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1  # past in een signed 64-bit integer
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return de SQLite-connectie van deze thread (auto-connects to DB_PATH).
+
+    Bij de eerste aanroep in een thread komt de connectie uit de procesbrede pool
+    (of wordt er een geopend); zolang de thread leeft gebruiken alle db-functies
+    dezelfde connectie, daarna gaat hij terug naar de pool. Sluit hem dus niet
+    zelf. Verandert ``DB_PATH`` (bv. in benchmarks), dan wordt automatisch een
+    nieuwe connectie geopend."""
+    path = str(DB_PATH)
+    lease = getattr(_local, "lease", None)
+    if lease is None or lease.path != path or lease.generation != _pool_generation:
+        _local.lease = None  # oude lease eerst teruggeven
+        lease = _local.lease = _Lease(_acquire(path), path)
+    return lease.conn
+
+
+@contextmanager
+def transaction():
+    """Schrijftransactie op de connectie van deze thread.
+
+    ``BEGIN IMMEDIATE`` neemt de schrijf-lock meteen (en wacht maximaal
+    busy_timeout), zodat een lees-transactie nooit halverwege hoeft te upgraden.
+    Commit bij succes, rollback bij een exceptie."""
     conn = get_connection()
-    cur = conn.cursor()
+    if metrics.ENABLED:
+        # Wachttijd op de schrijf-lock (busy_timeout) en 'database is locked' meten
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            metrics.record_lock_error(e)
+            raise
+        finally:
+            metrics.record_lock_wait(time.perf_counter() - started)
+    else:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
 
-    # Tabellen aanmaken
+
+def close_connections():
+    """Sluit alle open connecties (pool en alle threads), bv. bij afsluiten of in benchmarks."""
+    global _pool_generation
+    with _connections_lock:
+        _pool_generation += 1
+        conns = list(_connections)
+        _connections.clear()
+    while True:
+        try:
+            _pool.get_nowait()
+        except queue.Empty:
+            break
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # connectie van een andere thread die nog bezig is
+    _local.__dict__.clear()
+    _close_snapshot_connection()
+
+
+@metrics.instrument()
+def init_db(force: bool = False):
+    """Initialiseer de database en importeer (externe) JSON-vragen indien aanwezig.
+
+    Wordt maar één keer per proces uitgevoerd; volgende aanroepen zijn een no-op
+    (tenzij ``force=True``)."""
+    global _initialized
+    if _initialized and not force:
+        return
+    with _init_lock:
+        if _initialized and not force:
+            return
+        _init_db()
+        _initialized = True
+
+
+def _init_db():
+    global _snapshot_active
+    migrate()
+
+    _close_snapshot_connection()
+    snapshot = _open_snapshot()
+    if snapshot is not None:
+        # Vooraf gecompileerde bank: alleen synchroniseren als de versie wijzigt
+        changed = _sync_from_snapshot(snapshot)
+        _snapshot_active = str(SNAPSHOT_PATH)
+    else:
+        # Importeer externe vragenbestanden (./data/*.json) in één transactie
+        with transaction() as conn:
+            cur = conn.cursor()
+            # questions volgt nu ./data i.p.v. de snapshot: een later weer geldige
+            # snapshot moet dan opnieuw gesynchroniseerd worden
+            cur.execute("DELETE FROM app_meta WHERE key = 'snapshot_version'")
+            changed = import_json_questions(cur)
+        _snapshot_active = None
+
+    if changed:
+        invalidate_question_bank()
+        _prepare_question_images()
+
+
+def _prepare_question_images():
+    """Genereer beeldvarianten (display/thumb) voor alle vraagafbeeldingen.
+
+    Draait buiten de importtransactie: beeldbewerking houdt zo geen write-lock
+    vast. Bestaande varianten worden overgeslagen (content-addressed cache)."""
+    import assets
+
+    cur = get_connection().cursor()
+    cur.execute("SELECT DISTINCT image FROM questions WHERE image IS NOT NULL AND image != ''")
+    assets.prepare_images(row[0] for row in cur.fetchall())
+    assets.invalidate_image_cache()
+
+
+# ---------------------------
+# Schema-migraties
+# ---------------------------
+
+# Elke migratie brengt het schema van versie i naar i+1 (PRAGMA user_version).
+# Databases van vóór de migratie-engine staan op versie 0 en kunnen zowel het
+# oude db.py-schema als het schema van (het oude) init_db.py hebben; de eerste
+# migraties zijn daarom idempotent (IF NOT EXISTS / kolommen alleen toevoegen
+# als ze ontbreken). Nieuwe migraties alleen onderaan toevoegen.
+
+
+def _columns(cur, table: str) -> set:
+    cur.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cur.fetchall()}
+
+
+def _migration_1_baseline(cur):
+    """Basistabellen, plus ontbrekende kolommen in oudere schema's."""
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS questions (
@@ -34,7 +283,22 @@ def init_db():
             options TEXT,              -- JSON-array van opties (of NULL voor open vraag)
             correct_answer TEXT NOT NULL,
             image TEXT,                -- Pad naar afbeelding (of NULL)
-            context TEXT               -- Inleidende tekst (of NULL)
+            context TEXT,              -- Inleidende tekst (of NULL)
+            topic TEXT,                -- Onderwerp (of NULL)
+            source TEXT,               -- Bronbestand in ./data (of NULL)
+            content_hash TEXT          -- Hash van de vraaginhoud (voor incrementele import)
+        );
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            path TEXT PRIMARY KEY,     -- Bestandsnaam in ./data
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """
     )
@@ -45,6 +309,7 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
             password TEXT NOT NULL,
+            salt TEXT,                 -- NULL = oude, ongezouten hash
             level TEXT NOT NULL DEFAULT 'havo'
         );
         """
@@ -78,111 +343,903 @@ def init_db():
         """
     )
 
-    conn.commit()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feedback_cache (
+            question_key TEXT NOT NULL,    -- Hash van vraag + correct antwoord + vak + niveau
+            user_answer TEXT NOT NULL,     -- Genormaliseerd antwoord leerling
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            language TEXT NOT NULL,
+            feedback TEXT NOT NULL,
+            created_at REAL NOT NULL,      -- Unix-tijd (voor TTL)
+            last_used_at REAL NOT NULL,    -- Unix-tijd (voor LRU-eviction)
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (question_key, user_answer, model, prompt_version, language)
+        );
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_feedback_cache_last_used ON feedback_cache(last_used_at)")
 
-    # --- schema upgrades ---
-    # questions.level
-    cur.execute("PRAGMA table_info(questions)")
-    cols = [row[1] for row in cur.fetchall()]
+    # Kolommen die in oudere schema's ontbreken
+    cols = _columns(cur, "questions")
     if "level" not in cols:
         cur.execute("ALTER TABLE questions ADD COLUMN level TEXT DEFAULT 'havo'")
+    for col in ("topic", "source", "content_hash"):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE questions ADD COLUMN {col} TEXT")
 
-    # sessions.user_id
-    cur.execute("PRAGMA table_info(sessions)")
-    s_cols = [row[1] for row in cur.fetchall()]
-    if "user_id" not in s_cols:
+    if "user_id" not in _columns(cur, "sessions"):
         cur.execute("ALTER TABLE sessions ADD COLUMN user_id INTEGER")
 
-    # users.level
-    cur.execute("PRAGMA table_info(users)")
-    u_cols = [row[1] for row in cur.fetchall()]
+    u_cols = _columns(cur, "users")
     if "level" not in u_cols:
         cur.execute("ALTER TABLE users ADD COLUMN level TEXT NOT NULL DEFAULT 'havo'")
+    if "salt" not in u_cols:
+        cur.execute("ALTER TABLE users ADD COLUMN salt TEXT")
+
+    # Tabel uit het oude init_db.py die nergens gebruikt werd
+    cur.execute("DROP TABLE IF EXISTS question_options")
+
+
+def _migration_2_unique_answers(cur):
+    """answers: één rij per (sessie, vraag) zodat opslaan een idempotente upsert is."""
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_answers_session_question'")
+    if cur.fetchone() is not None:
+        return
+    # Oude versies schreven bij het toevoegen van feedback een tweede rij weg:
+    # feedback naar de nieuwste rij overzetten en de dubbele rijen verwijderen
+    cur.execute(
+        """UPDATE answers SET feedback = (
+               SELECT d.feedback FROM answers d
+               WHERE d.session_id = answers.session_id AND d.question_id = answers.question_id
+                     AND d.feedback IS NOT NULL
+               ORDER BY d.id DESC LIMIT 1)
+           WHERE feedback IS NULL"""
+    )
+    cur.execute(
+        """DELETE FROM answers WHERE id NOT IN (
+               SELECT MAX(id) FROM answers GROUP BY session_id, question_id)"""
+    )
+    cur.execute("CREATE UNIQUE INDEX idx_answers_session_question ON answers(session_id, question_id)")
+
+
+def _migration_3_rollups(cur):
+    """Rollups per sessie en per gebruiker/vak/onderwerp, bijgehouden door triggers."""
+    for statement in _ROLLUP_SCHEMA:
+        cur.execute(statement)
+    _rebuild_rollups(cur)
+
+
+def _migration_4_indexes(cur):
+    # Dashboard: sessies van één gebruiker, nieuwste eerst
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_started ON sessions(user_id, started_at)")
+    # Dashboard: scores per sessie/onderwerp zonder de answers-tabel zelf te lezen (covering)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_answers_session_cover ON answers(session_id, question_id, is_correct)")
+    # Importer: bestaande vragen van één bronbestand
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_source ON questions(source)")
+    # Overbodig naast idx_questions_source / de vragenbank (uit het oude init_db.py)
+    cur.execute("DROP INDEX IF EXISTS idx_questions_subject")
+    cur.execute("DROP INDEX IF EXISTS idx_questions_level")
+
+
+def _migration_5_snapshot(cur):
+    # Kleine key/value-tabel, o.a. voor de versie van de gesynchroniseerde snapshot
+    cur.execute("CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value TEXT)")
+    # Vragenbank laadt per (vak, niveau) i.p.v. de hele tabel
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_subject_level ON questions(subject, level)")
+
+
+def _migration_6_fts(cur):
+    """FTS5-index over vraag, context, modelantwoord en onderwerp (external content)."""
+    try:
+        cur.execute(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                   question, context, correct_answer, topic,
+                   content='questions', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2'
+               )"""
+        )
+    except sqlite3.OperationalError as e:
+        # SQLite zonder FTS5: search_questions valt terug op LIKE
+        print(f"FTS5 niet beschikbaar ({e}); zoeken gebruikt LIKE.")
+        return
+    for statement in _FTS_TRIGGERS:
+        cur.execute(statement)
+    cur.execute("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')")
+
+
+def _migration_7_rubric(cur):
+    # Beoordelingsmodel per open vraag (JSON, zie grader.py); NULL = automatisch uit het modelantwoord
+    if "rubric" not in _columns(cur, "questions"):
+        cur.execute("ALTER TABLE questions ADD COLUMN rubric TEXT")
+
+
+def _migration_8_question_rollups(cur):
+    """Rollups ook bijwerken als vragen verdwijnen, terugkomen of van onderwerp wisselen."""
+    # Triggers zoeken de antwoorden van één vraag op
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_answers_question ON answers(question_id)")
+    for statement in _QUESTION_ROLLUP_TRIGGERS:
+        cur.execute(statement)
+    # Eerdere imports kunnen de rollups al uit de pas hebben gebracht
+    _rebuild_rollups(cur)
+
+
+MIGRATIONS = [
+    _migration_1_baseline,
+    _migration_2_unique_answers,
+    _migration_3_rollups,
+    _migration_4_indexes,
+    _migration_5_snapshot,
+    _migration_6_fts,
+    _migration_7_rubric,
+    _migration_8_question_rollups,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version() -> int:
+    """Huidige schemaversie van de database (PRAGMA user_version)."""
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+@metrics.instrument()
+def migrate() -> int:
+    """Breng de database naar ``SCHEMA_VERSION``. Return het aantal uitgevoerde migraties.
+
+    Is de database al actueel, dan kost dit één PRAGMA-read. Alle openstaande
+    migraties draaien samen in één transactie; de versie wordt binnen de
+    schrijf-lock opnieuw gelezen, zodat meerdere processen tegelijk kunnen opstarten."""
+    if schema_version() == SCHEMA_VERSION:
+        return 0
+    with transaction() as conn:
+        cur = conn.cursor()
+        current = cur.execute("PRAGMA user_version").fetchone()[0]
+        if current > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database heeft schemaversie {current}, deze code kent maar t/m {SCHEMA_VERSION}"
+            )
+        for migration in MIGRATIONS[current:]:
+            migration(cur)
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return SCHEMA_VERSION - current
+
+
+# ---------------------------
+# Vragenbank (gedeelde in-memory cache)
+# ---------------------------
+
+_bank_lock = threading.Lock()
+_bank = None  # {"version", "path", "by_key", "by_id"}
+_bank_stats = {"hits": 0, "misses": 0, "builds": 0}
+
+_QUESTION_COLUMNS = "id, subject, level, question, options, correct_answer, image, context, topic, rubric"
+
+
+def invalidate_question_bank():
+    """Hoog de dataversie op; de vragenbank wordt bij de volgende lookup herbouwd."""
+    global _data_version
+    with _bank_lock:
+        _data_version += 1
+
+
+def _bank_connection() -> sqlite3.Connection:
+    """De snapshot (indien actief) of de database zelf. Onder _bank_lock."""
+    return _snapshot_connection() if _snapshot_active else get_connection()
+
+
+def _bank_rows(where: str, params: tuple) -> list:
+    """Lees vragen uit de snapshot (indien actief) of uit de database. Onder _bank_lock."""
+    return _bank_connection().execute(f"SELECT {_QUESTION_COLUMNS} FROM questions {where}", params).fetchall()
+
+
+def _bank_add(bank: dict, row: tuple) -> Dict:
+    rid, subject, level, question, options_json, correct, image, context, topic, rubric_json = row
+    q = bank["by_id"].get(rid)
+    if q is None:
+        q = {
+            "id": rid,
+            "question": question,
+            "options": json.loads(options_json) if options_json else None,
+            "correct_answer": correct,
+            "image": image,
+            "context": context,
+            "topic": topic,
+            "rubric": json.loads(rubric_json) if rubric_json else None,
+        }
+        bank["by_id"][rid] = q
+    return q
+
+
+def _question_bank() -> dict:
+    """Return de actuele vragenbank (leeg begonnen bij een nieuwe dataversie).
 
-    # Importeer externe vragenbestanden (./data/*.json)
-    import_json_questions(cur)
+    De bank wordt lui per (vak, niveau) gevuld, zodat opstarten niet afhangt van
+    de omvang van de bank."""
+    global _bank
+    path = _snapshot_active or str(DB_PATH)
+    bank = _bank
+    if bank is not None and bank["version"] == _data_version and bank["path"] == path:
+        return bank
+    with _bank_lock:
+        bank = _bank
+        if bank is None or bank["version"] != _data_version or bank["path"] != path:
+            bank = {"version": _data_version, "path": path, "by_key": {}, "by_id": {}}
+            _bank = bank
+            _bank_stats["builds"] += 1
+        return bank
 
-    conn.close()
 
+def question_bank_version() -> tuple:
+    """Sleutel die wijzigt zodra de vragenbank wijzigt (voor afgeleide caches)."""
+    return (_data_version, _snapshot_active or str(DB_PATH))
 
+
+@metrics.instrument()
 def fetch_questions(subject: str, level: str) -> List[Dict]:
-    """Haal alle vragen op voor een vak + niveau (mavo/havo/vwo)."""
+    """Haal alle vragen op voor een vak + niveau (mavo/havo/vwo).
+
+    Komt uit de gedeelde vragenbank van dit proces: de dicts worden gedeeld tussen
+    alle sessies en mogen dus niet aangepast worden (de lijst zelf wel)."""
+    bank = _question_bank()
+    key = (subject, level)
+    questions = bank["by_key"].get(key)
+    if questions is not None:
+        with _bank_lock:
+            _bank_stats["hits"] += 1
+        return list(questions)
+    with _bank_lock:
+        _bank_stats["misses"] += 1
+        questions = bank["by_key"].get(key)
+        if questions is None:
+            rows = _bank_rows("WHERE subject = ? AND level = ? ORDER BY id", key)
+            questions = tuple(_bank_add(bank, row) for row in rows)
+            bank["by_key"][key] = questions
+    return list(questions)
+
+
+@metrics.instrument()
+def get_question(question_id: int) -> Dict | None:
+    """Haal één vraag op via zijn ID (uit de gedeelde vragenbank), of None."""
+    bank = _question_bank()
+    q = bank["by_id"].get(question_id)
+    if q is not None:
+        with _bank_lock:
+            _bank_stats["hits"] += 1
+        return q
+    with _bank_lock:
+        _bank_stats["misses"] += 1
+        q = bank["by_id"].get(question_id)
+        if q is None:
+            rows = _bank_rows("WHERE id = ?", (question_id,))
+            q = _bank_add(bank, rows[0]) if rows else None
+    return q
+
+
+# Standaardlengte van een oefenexamen
+EXAM_SIZE = int(os.getenv("EXAM_SIZE", "20"))
+
+# Gestratificeerde steekproef: binnen elke laag (onderwerp, jaar) een seeded
+# volgorde (vragen zonder 'year' in de JSON hebben jaar 0: dan alleen op onderwerp);
+# sorteren op (rn - 0.5) / laaggrootte verdeelt de plekken naar
+# verhouding over de lagen. De gekozen vragen komen in seeded volgorde terug.
+_ASSEMBLE_EXAM_SQL = """
+WITH ranked AS (
+    SELECT id,
+           ROW_NUMBER() OVER (PARTITION BY COALESCE(topic, ''), year ORDER BY seeded_rank(?, id)) AS rn,
+           COUNT(*) OVER (PARTITION BY COALESCE(topic, ''), year) AS stratum
+    FROM questions
+    WHERE subject = ? AND level = ?
+)
+SELECT id FROM (
+    SELECT id FROM ranked
+    ORDER BY (rn - 0.5) / stratum, seeded_rank(?, id)
+    LIMIT ?
+)
+ORDER BY seeded_rank(?, id)
+"""
+
+
+@metrics.instrument()
+def assemble_exam(subject: str, level: str, size: int | None = None, seed: int = 0) -> List[int]:
+    """Stel een examen samen: de ID's van ``size`` vragen voor vak + niveau.
+
+    De steekproef gebeurt in SQL, gestratificeerd op onderwerp en jaar, zodat elk
+    onderwerp naar verhouding vertegenwoordigd is. Dezelfde ``seed`` op dezelfde
+    bank geeft hetzelfde examen. Alleen ID's; de vragen zelf komen lui via
+    ``get_question``."""
+    size = size or EXAM_SIZE
+    params = (seed, subject, level, seed, size, seed)
+    if _snapshot_active:
+        # Eén gedeelde snapshot-connectie: alleen die vraagt om de lock
+        with _bank_lock:
+            rows = _bank_connection().execute(_ASSEMBLE_EXAM_SQL, params).fetchall()
+    else:
+        # Eigen connectie per thread: examens starten parallel
+        rows = get_connection().execute(_ASSEMBLE_EXAM_SQL, params).fetchall()
+    return [row[0] for row in rows]
+
+
+def question_bank_stats() -> Dict:
+    """Hit/miss-tellers en omvang van de vragenbank (voor monitoring)."""
+    bank = _bank
+    with _bank_lock:
+        stats = dict(_bank_stats)
+    stats["version"] = _data_version
+    stats["questions"] = len(bank["by_id"]) if bank else 0
+    return stats
+
+
+# ---------------------------
+# Zoeken (FTS5)
+# ---------------------------
+
+# questions_fts is een external-content index: de tekst staat alleen in
+# questions, triggers houden de index bij (dus ook bij import en snapshot-sync).
+_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS trg_questions_fts_insert AFTER INSERT ON questions BEGIN
+           INSERT INTO questions_fts(rowid, question, context, correct_answer, topic)
+           VALUES (new.id, new.question, new.context, new.correct_answer, new.topic);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_questions_fts_delete AFTER DELETE ON questions BEGIN
+           INSERT INTO questions_fts(questions_fts, rowid, question, context, correct_answer, topic)
+           VALUES ('delete', old.id, old.question, old.context, old.correct_answer, old.topic);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_questions_fts_update
+       AFTER UPDATE OF question, context, correct_answer, topic ON questions BEGIN
+           INSERT INTO questions_fts(questions_fts, rowid, question, context, correct_answer, topic)
+           VALUES ('delete', old.id, old.question, old.context, old.correct_answer, old.topic);
+           INSERT INTO questions_fts(rowid, question, context, correct_answer, topic)
+           VALUES (new.id, new.question, new.context, new.correct_answer, new.topic);
+       END""",
+]
+
+# bm25 met gewichten per kolom: question, context, correct_answer, topic
+_FTS_RANK = "bm25(10.0, 2.0, 4.0, 6.0)"
+_SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_has_fts: Dict[str, bool] = {}  # DB_PATH -> bestaat questions_fts
+
+
+def _fts_available() -> bool:
+    path = str(DB_PATH)
+    if path not in _has_fts:
+        row = get_connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"
+        ).fetchone()
+        _has_fts[path] = row is not None
+    return _has_fts[path]
+
+
+def _fts_query(query: str) -> str:
+    """Zet vrije invoer om naar een veilige FTS5-query: alle woorden moeten
+    voorkomen, het laatste woord ook als prefix (zoeken tijdens het typen)."""
+    tokens = _SEARCH_TOKEN_RE.findall(query)
+    if not tokens:
+        return ""
+    terms = [f'"{t}"' for t in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+@metrics.instrument()
+def search_questions(
+    query: str, subject: str | None = None, level: str | None = None, limit: int = 20, offset: int = 0
+) -> List[Dict]:
+    """Zoek vragen op tekst (vraag, context, modelantwoord, onderwerp).
+
+    Resultaten zijn gerangschikt op relevantie (bm25) en te pagineren met
+    ``limit``/``offset``. Elk resultaat bevat id, subject, level, topic, question
+    en een ``snippet`` met de treffers **vetgedrukt**."""
+    match = _fts_query(query)
+    if not match:
+        return []
+
+    filters, params = "", []
+    if subject:
+        filters += " AND q.subject = ?"
+        params.append(subject)
+    if level:
+        filters += " AND q.level = ?"
+        params.append(level)
+
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, question, options, correct_answer, image, context FROM questions WHERE subject = ? AND level = ? ORDER BY id",
-        (subject, level),
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    questions = []
-    for rid, question, options_json, correct, image, context in rows:
-        options = json.loads(options_json) if options_json else None
-        questions.append(
-            {
-                "id": rid,
-                "question": question,
-                "options": options,
-                "correct_answer": correct,
-                "image": image,
-                "context": context,
-            }
+    if _fts_available():
+        rows = conn.execute(
+            f"""SELECT q.id, q.subject, q.level, q.topic, q.question,
+                       snippet(questions_fts, -1, '**', '**', ' … ', 16)
+                FROM questions_fts JOIN questions q ON q.id = questions_fts.rowid
+                WHERE questions_fts MATCH ? AND questions_fts.rank MATCH ?{filters}
+                ORDER BY questions_fts.rank
+                LIMIT ? OFFSET ?""",
+            [match, _FTS_RANK, *params, limit, offset],
+        ).fetchall()
+    else:
+        # Zonder FTS5: alle woorden moeten ergens voorkomen (geen ranking)
+        tokens = _SEARCH_TOKEN_RE.findall(query)
+        like = " AND ".join(
+            "(q.question LIKE ? OR q.context LIKE ? OR q.correct_answer LIKE ? OR q.topic LIKE ?)" for _ in tokens
         )
-    return questions
+        like_params = [f"%{t}%" for t in tokens for _ in range(4)]
+        rows = conn.execute(
+            f"""SELECT q.id, q.subject, q.level, q.topic, q.question, substr(q.question, 1, 160)
+                FROM questions q WHERE {like}{filters} ORDER BY q.id LIMIT ? OFFSET ?""",
+            [*like_params, *params, limit, offset],
+        ).fetchall()
 
+    return [
+        {"id": r[0], "subject": r[1], "level": r[2], "topic": r[3], "question": r[4], "snippet": r[5]}
+        for r in rows
+    ]
 
-def import_json_questions(cur):
-    """Importeer vragen uit ./data/*.json (bestandsnaam: <subject>_<level>.json)."""
-    data_dir = Path(__file__).with_name("data")
-    if not data_dir.exists():
-        return
 
-    # Verwijder eerst alle bestaande vragen
-    cur.execute("DELETE FROM questions")
+# ---------------------------
+# Import van ./data/*.json
+# ---------------------------
+
+SUBJECT_MAP = {"eco": "Economie", "economie": "Economie", "geschiedenis": "Geschiedenis", "nederlands": "Nederlands", "engels": "Engels"}
+
+
+def _question_id(source: str, key: str) -> int:
+    """Stabiel vraag-ID op basis van bronbestand + vraagsleutel.
+
+    Hetzelfde item krijgt dus in elke database (en na elke herimport) hetzelfde ID,
+    zodat lopende sessies en opgeslagen antwoorden blijven kloppen. 52 bits, zodat
+    het ID ook veilig als JSON/JS-getal gebruikt kan worden."""
+    digest = hashlib.sha256(f"{source}\x00{key}".encode("utf-8")).hexdigest()
+    return int(digest[:13], 16)
+
+
+# Streaming-import: bestanden worden in blokken gelezen en items één voor één
+# geparsed, zodat ook item banks van honderden MB's niet in hun geheel in het
+# geheugen hoeven. Schrijven gebeurt met executemany per batch.
+IMPORT_CHUNK_BYTES = int(os.getenv("IMPORT_CHUNK_BYTES", str(1 << 16)))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+_UPSERT_QUESTION_SQL = """INSERT INTO questions(id, subject, level, year, question, options, correct_answer, image, context, topic, rubric, source, content_hash)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+   ON CONFLICT(id) DO UPDATE SET
+       subject = excluded.subject, level = excluded.level, year = excluded.year,
+       question = excluded.question, options = excluded.options,
+       correct_answer = excluded.correct_answer, image = excluded.image,
+       context = excluded.context, topic = excluded.topic, rubric = excluded.rubric,
+       source = excluded.source, content_hash = excluded.content_hash"""
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(IMPORT_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _iter_json_array(fp, on_read=None):
+    """Parse een JSON-array incrementeel uit een binaire stream; yield elk element.
+
+    Leest per ``IMPORT_CHUNK_BYTES`` en decodeert met ``raw_decode``, zodat er
+    nooit meer dan één blok plus het huidige element in het geheugen staat.
+    ``on_read(n)`` wordt per gelezen blok aangeroepen met het aantal bytes."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(IMPORT_CHUNK_BYTES)
+        eof = not chunk
+        buf = buf[pos:] + text.decode(chunk, final=eof)
+        pos = 0
+        if on_read and chunk:
+            on_read(len(chunk))
+
+    expect = "["  # "[" -> "value" of "]" -> "," of "]" -> ...
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+        if pos >= len(buf):
+            raise ValueError("onverwacht einde van het bestand")
+
+        ch = buf[pos]
+        if expect == "[":
+            if ch != "[":
+                raise ValueError("bestand bevat geen JSON-array")
+            pos += 1
+            expect = "first"
+        elif ch == "]" and expect in ("first", ","):
+            return
+        elif expect == ",":
+            if ch != ",":
+                raise ValueError(f"',' of ']' verwacht, '{ch}' gevonden")
+            pos += 1
+            expect = "value"
+        else:
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    # Een getal aan het eind van het blok kan nog doorlopen
+                    if end < len(buf) or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+            pos = end
+            expect = ","
+            yield item
+
+
+_TEXT_FIELDS = ("level", "context", "image", "topic")
+
+
+def _validate_item(item) -> str | None:
+    """Geef een foutomschrijving voor een ongeldig item, of None."""
+    if not isinstance(item, dict):
+        return "item is geen object"
+    for field in ("question", "correct_answer"):
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return f"'{field}' ontbreekt of is geen tekst"
+    options = item.get("options")
+    if options and (not isinstance(options, list) or any(not isinstance(o, str) for o in options)):
+        return "'options' moet een lijst met teksten zijn"
+    for field in _TEXT_FIELDS:
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            return f"'{field}' moet tekst zijn"
+    rubric = item.get("rubric")
+    if rubric is not None and (not isinstance(rubric, dict) or not isinstance(rubric.get("concepts"), list)):
+        return "'rubric' moet een object met een lijst 'concepts' zijn"
+    if item.get("year") is not None and _item_year(item) is None:
+        return "'year' moet een jaartal (geheel getal) zijn"
+    return None
+
+
+def _item_year(item: Dict) -> int | None:
+    """Examenjaar van een item: 0 als het ontbreekt, None als het ongeldig is."""
+    year = item.get("year")
+    if year is None:
+        return 0  # onbekend jaar: per onderwerp één laag in de examensteekproef
+    if isinstance(year, str) and year.strip().isdigit():
+        return int(year)
+    if isinstance(year, int) and not isinstance(year, bool) and year >= 0:
+        return year
+    return None
+
+
+# Hergebruikte encoder voor de content-hash (json.dumps maakt er met
+# ensure_ascii=False bij elke aanroep een nieuwe aan); uitvoer is identiek.
+_HASH_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+def _question_rows(source: str, subject: str, level: str, items, errors: List[str] | None = None):
+    """Zet de items van één bestand om naar rijen (id, ..., content_hash).
+
+    ``items`` mag een (streaming) iterator zijn. Ongeldige items en items zonder
+    niveau worden overgeslagen (en, als ``errors`` is meegegeven, daarin gemeld).
+    Dubbele vraagteksten binnen één bestand krijgen een volgnummer in hun sleutel.
+    ``year`` is optioneel (0 = onbekend); het telt mee in de content-hash, dus
+    een gewijzigd jaar wordt bij de volgende import opgepikt."""
+    seen_keys: Dict[bytes, int] = {}  # digest van de vraagtekst -> aantal keer gezien
+    for n_item, item in enumerate(items):
+        problem = _validate_item(item)
+        if problem is None and not (item.get("level") or level):
+            problem = "'level' ontbreekt"
+        if problem:
+            if errors is not None:
+                errors.append(f"item {n_item}: {problem}")
+            continue
 
-    for path in data_dir.glob("*.json"):
+        question = item["question"]
+        options = item.get("options")
+        correct = item["correct_answer"]
+        item_level = item.get("level") or level
+
+        text_key = hashlib.sha1(question.encode("utf-8")).digest()
+        n = seen_keys.get(text_key, 0)
+        seen_keys[text_key] = n + 1
+        key = question if n == 0 else f"{question}\x00{n}"
+
+        values = (
+            subject,
+            item_level.lower(),
+            _item_year(item),
+            question,
+            json.dumps(options) if options else None,
+            correct,
+            item.get("image"),
+            item.get("context"),
+            item.get("topic"),
+        )
+        rubric = item.get("rubric")
+        rubric_json = _HASH_ENCODER.encode(rubric) if rubric else None
+        # Rubric alleen meehashen als hij er is: bestaande hashes blijven zo geldig
+        hashed = values + (rubric_json,) if rubric_json else values
+        content_hash = hashlib.sha1(_HASH_ENCODER.encode(hashed).encode("utf-8")).hexdigest()
+        yield (_question_id(source, key),) + values + (rubric_json, source, content_hash)
+
+
+def _import_file(cur, path: Path, source: str, subject: str, level: str, progress=None) -> int:
+    """Importeer één bestand streaming; return het aantal gewijzigde vragen."""
+    cur.execute("SELECT id, content_hash FROM questions WHERE source = ?", (source,))
+    existing = dict(cur.fetchall())
+    seen = set()
+    batch = []
+    changed = 0
+    errors: List[str] = []
+    total_bytes = path.stat().st_size
+    read = {"bytes": 0, "items": 0}
+
+    def on_read(n: int):
+        read["bytes"] += n
+
+    def flush():
+        nonlocal changed
+        cur.executemany(_UPSERT_QUESTION_SQL, batch)
+        changed += len(batch)
+        batch.clear()
+        if progress:
+            progress(source, read["items"], read["bytes"], total_bytes)
+
+    with open(path, "rb") as f:
+        for row in _question_rows(source, subject, level, _iter_json_array(f, on_read), errors):
+            read["items"] += 1
+            qid, content_hash = row[0], row[-1]
+            if qid in seen:
+                continue
+            seen.add(qid)
+            if existing.get(qid) == content_hash:
+                continue
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+    flush()
+
+    removed = [(qid,) for qid in existing if qid not in seen]
+    cur.executemany("DELETE FROM questions WHERE id = ?", removed)
+    changed += len(removed)
+
+    if errors:
+        shown = "; ".join(errors[:5])
+        print(f"{source}: {len(errors)} ongeldig(e) item(s) overgeslagen ({shown}{'; ...' if len(errors) > 5 else ''})")
+    return changed
+
+
+def _data_files():
+    """Yield (pad, bron, vak, niveau) voor elk vragenbestand in ./data.
+
+    Bestandsnaam: <subject>_<level>.json; andere namen worden overgeslagen."""
+    if not DATA_DIR.exists():
+        return
+    for path in sorted(DATA_DIR.glob("*.json")):
         parts = path.stem.split("_")
         if len(parts) != 2:
             continue
         raw_subject, level = parts
         # normaliseer subject
-        subject_map = {"eco": "Economie", "economie": "Economie", "geschiedenis": "Geschiedenis", "nederlands": "Nederlands", "engels": "Engels"}
-        subject = subject_map.get(raw_subject.lower(), raw_subject.capitalize())
+        subject = SUBJECT_MAP.get(raw_subject.lower(), raw_subject.capitalize())
+        yield path, path.name, subject, level
+
+
+@metrics.instrument()
+def import_json_questions(cur, progress=None) -> int:
+    """Importeer vragen uit ./data/*.json (bestandsnaam: <subject>_<level>.json).
+
+    Incrementeel: per bestand worden pad, grootte, mtime en SHA-256 in
+    ``import_manifest`` bewaard. Ongewijzigde bestanden worden overgeslagen; van
+    gewijzigde bestanden worden alleen toegevoegde/gewijzigde/verwijderde items
+    bijgewerkt, met stabiele vraag-ID's. Bestanden worden streaming geparsed en
+    in batches van ``IMPORT_BATCH_SIZE`` weggeschreven. ``progress(source, items,
+    bytes_read, total_bytes)`` wordt na elke batch aangeroepen. De aanroeper
+    beheert de transactie. Return het aantal gewijzigde vragen."""
+    if not DATA_DIR.exists():
+        return 0
+
+    cur.execute("SELECT path, size, mtime_ns, sha256 FROM import_manifest")
+    manifest = {row[0]: row[1:] for row in cur.fetchall()}
+    changed = 0
+
+    if not manifest:
+        # Eerste incrementele import: vragen uit de oude wipe-and-reload import opruimen
+        cur.execute("DELETE FROM questions WHERE source IS NULL")
+        changed += cur.rowcount
+
+    present = set()
+    for path, source, subject, level in _data_files():
+        present.add(source)
+        stat = path.stat()
+        known = manifest.get(source)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            continue  # ongewijzigd
+
+        digest = _file_sha256(path)
+        if known and known[2] == digest:
+            # Alleen aangeraakt (bv. git checkout): manifest bijwerken, verder niets
+            cur.execute(
+                "UPDATE import_manifest SET size = ?, mtime_ns = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime_ns, source),
+            )
+            continue
+
+        # Savepoint per bestand: een half geïmporteerd (corrupt) bestand laat de
+        # rest van de import en de bestaande vragen van dat bestand intact.
+        cur.execute("SAVEPOINT import_file")
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                items = json.load(f)
-        except Exception as e:
+            file_changed = _import_file(cur, path, source, subject, level, progress)
+        except (OSError, ValueError) as e:
+            cur.execute("ROLLBACK TO import_file")
+            cur.execute("RELEASE import_file")
             print(f"Fout bij laden van {path}: {e}")
             continue
+        cur.execute("RELEASE import_file")
+        changed += file_changed
+
+        cur.execute(
+            """INSERT INTO import_manifest(path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET
+                   size = excluded.size, mtime_ns = excluded.mtime_ns,
+                   sha256 = excluded.sha256, imported_at = CURRENT_TIMESTAMP""",
+            (source, stat.st_size, stat.st_mtime_ns, digest),
+        )
 
-        for item in items:
-            question = item.get("question")
-            options = item.get("options")
-            correct = item.get("correct_answer")
-            item_level = item.get("level") or level
-            context = item.get("context")
-            image = item.get("image")
+    # Bestanden die uit ./data verdwenen zijn
+    for source in manifest.keys() - present:
+        cur.execute("DELETE FROM questions WHERE source = ?", (source,))
+        changed += cur.rowcount
+        cur.execute("DELETE FROM import_manifest WHERE path = ?", (source,))
+
+    return changed
+
+
+# ---------------------------
+# Snapshot van de vragenbank
+# ---------------------------
+
+# De snapshot is een read-only SQLite-bestand met dezelfde questions- en
+# import_manifest-tabellen (gebouwd door snapshot.py, met dezelfde stabiele
+# vraag-ID's). Bij het opstarten wordt alleen de versie vergeleken; pas bij een
+# nieuwe versie worden de vragen set-based (via ATTACH) naar de database
+# gesynchroniseerd. De vragenbank leest daarna rechtstreeks uit de snapshot.
+
+_SNAPSHOT_MMAP_BYTES = int(os.getenv("SNAPSHOT_MMAP_BYTES", str(256 * 1024 * 1024)))
+_snapshot_conn = None
+
+
+def _snapshot_uri(path: Path) -> str:
+    return f"{path.resolve().as_uri()}?mode=ro&immutable=1"
 
-            if not question or not correct or not item_level:
-                continue
 
+def _open_snapshot() -> Dict | None:
+    """Lees de metadata van de snapshot, of None als die ontbreekt of onbruikbaar is.
+
+    Een snapshot die niet meer bij ./data past (andere bestanden, groottes of
+    inhoud) wordt genegeerd, zodat gewijzigde JSON niet stilletjes wegvalt. Wijkt
+    alleen de mtime af (bv. na een git checkout of deploy), dan beslist de SHA-256;
+    die wordt per bestandsversie maar één keer berekend (zie ``_snapshot_matches_data``)."""
+    if not SNAPSHOT_PATH.is_file():
+        return None
+    try:
+        conn = sqlite3.connect(_snapshot_uri(SNAPSHOT_PATH), uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            files = {row[0]: row[1:] for row in conn.execute("SELECT path, size, mtime_ns, sha256 FROM import_manifest")}
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        print(f"Snapshot {SNAPSHOT_PATH} onleesbaar ({e}); JSON-import wordt gebruikt.")
+        return None
+
+    if meta.get("format") != str(SNAPSHOT_FORMAT):
+        print(f"Snapshot {SNAPSHOT_PATH} heeft formaat {meta.get('format')}; JSON-import wordt gebruikt.")
+        return None
+    if DATA_DIR.exists() and not _snapshot_matches_data(files):
+        print(f"Snapshot {SNAPSHOT_PATH} is verouderd t.o.v. {DATA_DIR}; JSON-import wordt gebruikt.")
+        return None
+    return meta
+
+
+def _snapshot_matches_data(files: Dict[str, tuple]) -> bool:
+    """Vergelijk het manifest van de snapshot (bron -> (size, mtime_ns, sha256)) met ./data.
+
+    Bestanden met een andere mtime dan in de snapshot worden gehasht; een
+    geslaagde controle wordt als [size, mtime_ns, sha256] per bron in
+    ``app_meta`` (``snapshot_verified``) bewaard, zodat volgende starts met
+    dezelfde bestanden niet opnieuw hashen."""
+    current = {source: path for path, source, _, _ in _data_files()}
+    if current.keys() != files.keys():
+        return False
+    row = get_connection().execute("SELECT value FROM app_meta WHERE key = 'snapshot_verified'").fetchone()
+    verified = {k: v for k, v in json.loads(row[0]).items() if k in current} if row else {}
+    newly_verified = False
+    for source, path in current.items():
+        size, mtime_ns, sha256 = files[source]
+        stat = path.stat()
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns == mtime_ns or verified.get(source) == [stat.st_size, stat.st_mtime_ns, sha256]:
+            continue
+        if _file_sha256(path) != sha256:
+            return False
+        verified[source] = [stat.st_size, stat.st_mtime_ns, sha256]
+        newly_verified = True
+    if newly_verified:
+        with transaction() as conn:
+            conn.execute(
+                """INSERT INTO app_meta(key, value) VALUES ('snapshot_verified', ?)
+                   ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+                (json.dumps(verified),),
+            )
+    return True
+
+
+def _sync_from_snapshot(meta: Dict) -> int:
+    """Breng questions/import_manifest gelijk aan de snapshot. Return het aantal wijzigingen."""
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM app_meta WHERE key = 'snapshot_version'").fetchone()
+    if row and row[0] == meta["version"]:
+        return 0  # de gebruikelijke koude start: één lookup
+
+    # ATTACH kan niet binnen een transactie
+    conn.execute("ATTACH DATABASE ? AS snap", (str(SNAPSHOT_PATH),))
+    try:
+        with transaction() as conn:
+            cur = conn.cursor()
             cur.execute(
-                """INSERT INTO questions(subject, level, year, question, options, correct_answer, image, context)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    subject,
-                    item_level.lower(),
-                    0,  # onbekend jaar
-                    question,
-                    json.dumps(options) if options else None,
-                    correct,
-                    image,
-                    context,
-                ),
+                """INSERT INTO questions(id, subject, level, year, question, options, correct_answer, image, context, topic, rubric, source, content_hash)
+                   SELECT s.id, s.subject, s.level, s.year, s.question, s.options, s.correct_answer,
+                          s.image, s.context, s.topic, s.rubric, s.source, s.content_hash
+                   FROM snap.questions s
+                   WHERE NOT EXISTS (SELECT 1 FROM main.questions q WHERE q.id = s.id AND q.content_hash IS s.content_hash)
+                   ON CONFLICT(id) DO UPDATE SET
+                       subject = excluded.subject, level = excluded.level, year = excluded.year,
+                       question = excluded.question, options = excluded.options,
+                       correct_answer = excluded.correct_answer, image = excluded.image,
+                       context = excluded.context, topic = excluded.topic, rubric = excluded.rubric,
+                       source = excluded.source, content_hash = excluded.content_hash"""
             )
-    # commit via connection
-    cur.connection.commit()
+            changed = cur.rowcount
+            # Alleen vragen uit ./data (of van de oude import) verwijderen; bv. seed-vragen blijven
+            cur.execute(
+                """DELETE FROM main.questions
+                   WHERE (source IS NULL
+                          OR source IN (SELECT path FROM main.import_manifest UNION SELECT path FROM snap.import_manifest))
+                     AND id NOT IN (SELECT id FROM snap.questions)"""
+            )
+            changed += cur.rowcount
+            cur.execute("DELETE FROM main.import_manifest")
+            cur.execute(
+                """INSERT INTO main.import_manifest(path, size, mtime_ns, sha256, imported_at)
+                   SELECT path, size, mtime_ns, sha256, imported_at FROM snap.import_manifest"""
+            )
+            cur.execute(
+                """INSERT INTO app_meta(key, value) VALUES ('snapshot_version', ?)
+                   ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+                (meta["version"],),
+            )
+    finally:
+        get_connection().execute("DETACH DATABASE snap")
+    return changed
+
+
+def _snapshot_connection() -> sqlite3.Connection:
+    """Gedeelde read-only connectie op de snapshot (immutable + mmap). Onder _bank_lock."""
+    global _snapshot_conn
+    if _snapshot_conn is None:
+        _snapshot_conn = sqlite3.connect(_snapshot_uri(SNAPSHOT_PATH), uri=True, check_same_thread=False)
+        _snapshot_conn.execute(f"PRAGMA mmap_size={_SNAPSHOT_MMAP_BYTES}")
+        _snapshot_conn.create_function("seeded_rank", 2, _seeded_rank, deterministic=True)
+    return _snapshot_conn
+
+
+def _close_snapshot_connection():
+    global _snapshot_conn
+    with _bank_lock:
+        if _snapshot_conn is not None:
+            _snapshot_conn.close()
+            _snapshot_conn = None
 
 
 # ---------------------------
@@ -194,45 +1251,27 @@ def _hash_pw(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 
-def create_user(username: str, password: str, level: str) -> tuple[bool, str]:
-    """Maak een nieuwe gebruiker. Return (succes, bericht).
-
-    Deze functie controleert dynamisch of de kolom `salt` aanwezig is in de
-    tabel `users`.  Bestaat die kolom, dan wordt een willekeurig salt
-    gegenereerd en wordt het wachtwoord gehasht als `sha256(password+salt)`.
-    Bestaat de kolom niet, dan wordt het wachtwoord gehasht zonder salt (oude
-    schema)."""
+def _hash_salted(password: str, salt: str) -> str:
+    return hashlib.sha256((password + salt).encode("utf-8")).hexdigest()
 
-    conn = get_connection()
-    cur = conn.cursor()
 
-    # Bepaal kolommen in users-tabel (cached per call is prima)
-    cur.execute("PRAGMA table_info(users)")
-    user_cols = [row[1] for row in cur.fetchall()]
+@metrics.instrument()
+def create_user(username: str, password: str, level: str) -> tuple[bool, str]:
+    """Maak een nieuwe gebruiker. Return (succes, bericht).
 
-    use_salt = "salt" in user_cols
+    Er wordt een willekeurig salt gegenereerd en het wachtwoord wordt gehasht als
+    `sha256(password+salt)`."""
 
-    # Genereer hash (+ optional salt)
-    if use_salt:
-        salt = hashlib.sha256(os.urandom(16)).hexdigest()[:16]
-        pw_hash = hashlib.sha256((password + salt).encode("utf-8")).hexdigest()
-    else:
-        salt = None
-        pw_hash = _hash_pw(password)
+    salt = hashlib.sha256(os.urandom(16)).hexdigest()[:16]
+    pw_hash = _hash_salted(password, salt)
 
     try:
-        if use_salt:
-            cur.execute(
+        with transaction() as conn:
+            conn.execute(
                 "INSERT INTO users(username, password, salt, level) VALUES(?, ?, ?, ?)",
                 (username.strip(), pw_hash, salt, level),
             )
-        else:
-            cur.execute(
-                "INSERT INTO users(username, password, level) VALUES(?, ?, ?)",
-                (username.strip(), pw_hash, level),
-            )
 
-        conn.commit()
         return True, "Gebruiker succesvol aangemaakt"
 
     except sqlite3.IntegrityError as e:
@@ -242,52 +1281,26 @@ def create_user(username: str, password: str, level: str) -> tuple[bool, str]:
             return False, "Deze gebruikersnaam bestaat al"
         return False, f"Fout bij registreren gebruiker: {e}"
 
-    finally:
-        conn.close()
-
 
+@metrics.instrument()
 def authenticate_user(username: str, password: str):
     """Return gebruiker-info dict indien inlog klopt, anders None.
 
-    Ondersteunt zowel het oude schema (zonder salt) als het nieuwe schema
-    (met salt-kolom)."""
-
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Bepaal of salt-kolom aanwezig is
-    cur.execute("PRAGMA table_info(users)")
-    user_cols = [row[1] for row in cur.fetchall()]
+    Gebruikers met salt worden gecontroleerd met `sha256(password+salt)`;
+    gebruikers uit het oude schema (salt NULL) met de ongezouten hash."""
 
-    has_salt = "salt" in user_cols
-
-    if has_salt:
-        # Haal salt & hash op en vergelijk in Python
-        cur.execute(
-            "SELECT id, username, level, salt, password FROM users WHERE username = ?",
-            (username.strip(),),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.close()
-            return None
-
-        uid, uname, lvl, salt, stored_hash = row
-        pw_hash = hashlib.sha256((password + salt).encode("utf-8")).hexdigest()
-        conn.close()
-        if pw_hash == stored_hash:
-            return {"id": uid, "username": uname, "level": lvl}
+    row = get_connection().execute(
+        "SELECT id, username, level, salt, password FROM users WHERE username = ?",
+        (username.strip(),),
+    ).fetchone()
+    if not row:
         return None
 
-    else:
-        # Oud schema zonder salt
-        cur.execute(
-            "SELECT id, username, level FROM users WHERE username = ? AND password = ?",
-            (username.strip(), _hash_pw(password)),
-        )
-        row = cur.fetchone()
-        conn.close()
-        return {"id": row[0], "username": row[1], "level": row[2]} if row else None
+    uid, uname, lvl, salt, stored_hash = row
+    pw_hash = _hash_salted(password, salt) if salt is not None else _hash_pw(password)
+    if pw_hash == stored_hash:
+        return {"id": uid, "username": uname, "level": lvl}
+    return None
 
 
 # ---------------------------
@@ -295,54 +1308,213 @@ def authenticate_user(username: str, password: str):
 # ---------------------------
 
 
+@metrics.instrument()
 def start_session_db(user_id: int, subject: str) -> int:
     """Maak een sessie aan en return ID."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO sessions(user_id, subject) VALUES(?, ?)",
-        (user_id, subject),
-    )
-    conn.commit()
-    sid = cur.lastrowid
-    conn.close()
-    return sid
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO sessions(user_id, subject) VALUES(?, ?)",
+            (user_id, subject),
+        )
+        return cur.lastrowid
+
+
+class AnswerWriter:
+    """Write-behind buffer voor antwoorden.
+
+    Antwoorden worden per sessie in het geheugen verzameld en in één transactie
+    weggeschreven: bij ``flush(session_id)`` (einde sessie), elke
+    ``flush_interval`` seconden (achtergrondthread) of zodra er ``max_buffer``
+    antwoorden wachten. Schrijven is een upsert op (session_id, question_id), dus
+    opnieuw opslaan (ook na een mislukte flush) is idempotent; feedback toevoegen is
+    een UPDATE van dezelfde rij.
+
+    Crash-semantiek: wat nog in de buffer zit staat alleen in het geheugen van dit
+    proces. Bij een harde crash gaan dus hooguit de antwoorden van de laatste
+    ``flush_interval`` seconden (max. ``max_buffer`` stuks) verloren; een flush zelf
+    is atomair (alles of niets). Mislukt een flush, dan gaan de rijen terug in de
+    buffer (zonder nieuwere waarden te overschrijven) en wordt het later opnieuw
+    geprobeerd. Bij normaal afsluiten flusht ``atexit`` de buffer."""
+
+    def __init__(self, flush_interval: float, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._rows: Dict[int, Dict[int, list]] = {}  # session_id -> question_id -> [answer, correct, feedback]
+        self._feedback: Dict[tuple, str] = {}  # (session_id, question_id) -> feedback voor al weggeschreven rijen
+        self._pending = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, session_id: int, question_id: int, user_answer: str, is_correct: bool, feedback: str = None):
+        with self._lock:
+            rows = self._rows.setdefault(session_id, {})
+            old = rows.get(question_id)
+            if old is None:
+                self._pending += 1
+            elif feedback is None:
+                feedback = old[2]
+            # Losse feedback voor deze rij gaat in de nieuwe rij op; anders zou de
+            # UPDATE na de upserts in flush() nieuwere feedback overschrijven.
+            queued = self._feedback.pop((session_id, question_id), None)
+            if queued is not None:
+                self._pending -= 1
+                if feedback is None:
+                    feedback = queued
+            rows[question_id] = [user_answer, int(is_correct), feedback]
+            full = self._pending >= self.max_buffer
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def set_feedback(self, session_id: int, question_id: int, feedback: str):
+        with self._lock:
+            row = self._rows.get(session_id, {}).get(question_id)
+            if row is not None:
+                row[2] = feedback
+            else:
+                key = (session_id, question_id)
+                if key not in self._feedback:
+                    self._pending += 1
+                self._feedback[key] = feedback
+            full = self._pending >= self.max_buffer
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def flush(self, session_id: int | None = None):
+        """Schrijf gebufferde antwoorden (van één sessie, of alles) in één transactie weg."""
+        with self._lock:
+            if session_id is None:
+                rows, self._rows = self._rows, {}
+                feedback, self._feedback = self._feedback, {}
+            else:
+                rows = {session_id: self._rows.pop(session_id)} if session_id in self._rows else {}
+                feedback = {k: self._feedback.pop(k) for k in list(self._feedback) if k[0] == session_id}
+            self._pending -= sum(len(r) for r in rows.values()) + len(feedback)
+        if not rows and not feedback:
+            return
+        upserts = [
+            (sid, qid, answer, correct, fb)
+            for sid, by_q in rows.items()
+            for qid, (answer, correct, fb) in by_q.items()
+        ]
+        try:
+            with transaction() as conn:
+                conn.executemany(
+                    """INSERT INTO answers(session_id, question_id, user_answer, is_correct, feedback)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(session_id, question_id) DO UPDATE SET
+                           user_answer = excluded.user_answer,
+                           is_correct = excluded.is_correct,
+                           feedback = COALESCE(excluded.feedback, answers.feedback)""",
+                    upserts,
+                )
+                conn.executemany(
+                    "UPDATE answers SET feedback = ? WHERE session_id = ? AND question_id = ?",
+                    [(fb, sid, qid) for (sid, qid), fb in feedback.items()],
+                )
+        except Exception:
+            self._requeue(rows, feedback)
+            raise
+
+    def _requeue(self, rows: dict, feedback: dict):
+        with self._lock:
+            for sid, by_q in rows.items():
+                target = self._rows.setdefault(sid, {})
+                for qid, row in by_q.items():
+                    if qid not in target:
+                        target[qid] = row
+                        self._pending += 1
+            for key, fb in feedback.items():
+                if key not in self._feedback:
+                    self._feedback[key] = fb
+                    self._pending += 1
+
+    def _ensure_thread(self):
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="answer-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Fout bij wegschrijven antwoorden: {e}")
+
+    def close(self):
+        """Stop de achtergrondthread en flush wat er nog in de buffer zit."""
+        self._stop.set()
+        self.flush()
+
+
+ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "2"))  # seconden; 0 = alleen op drempel/einde sessie
+ANSWER_BUFFER_MAX = int(os.getenv("ANSWER_BUFFER_MAX", "200"))  # 1 = direct wegschrijven
+
+_answer_writer = AnswerWriter(ANSWER_FLUSH_INTERVAL, ANSWER_BUFFER_MAX)
+atexit.register(_answer_writer.close)
+
+
+@metrics.instrument()
+def save_answer_db(session_id: int, question_id: int, user_answer: str, is_correct: bool, feedback: str = None):
+    """Sla een antwoord op (write-behind, zie ``AnswerWriter``).
 
+    Idempotent: nogmaals opslaan voor dezelfde (sessie, vraag) overschrijft het
+    eerdere antwoord i.p.v. een extra rij aan te maken."""
+    _answer_writer.add(session_id, question_id, user_answer, is_correct, feedback)
+
+
+@metrics.instrument()
+def save_feedback_db(session_id: int, question_id: int, feedback: str):
+    """Koppel feedback aan een (eventueel nog gebufferd) antwoord."""
+    _answer_writer.set_feedback(session_id, question_id, feedback)
 
-def save_answer_db(session_id: int, question_id: int, user_answer: str, is_correct: bool, feedback: str = None):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO answers(session_id, question_id, user_answer, is_correct, feedback)
-           VALUES (?, ?, ?, ?, ?)""",
-        (session_id, question_id, user_answer, int(is_correct), feedback),
-    )
-    conn.commit()
-    conn.close()
 
+@metrics.instrument()
+def flush_answers(session_id: int | None = None):
+    """Schrijf gebufferde antwoorden direct weg (van één sessie, of alle)."""
+    _answer_writer.flush(session_id)
 
+
+@metrics.instrument()
+def finish_session_db(session_id: int):
+    """Rond een sessie af: antwoorden wegschrijven en ``finished_at`` zetten."""
+    _answer_writer.flush(session_id)
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE sessions SET finished_at = CURRENT_TIMESTAMP WHERE id = ? AND finished_at IS NULL",
+            (session_id,),
+        )
+
+
+@metrics.instrument()
 def get_user_sessions_with_scores(user_id: int) -> List[Dict]:
-    """Haal alle sessies van een gebruiker op met scores."""
+    """Haal alle sessies van een gebruiker op met scores.
+
+    Leest de rollup-tabel ``session_scores`` (één rij per sessie), dus de kosten
+    hangen af van het aantal getoonde sessies, niet van het aantal antwoorden."""
+    if _answer_writer.pending():
+        _answer_writer.flush()
     conn = get_connection()
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT 
-            s.id AS session_id,
-            s.subject,
-            s.started_at,
-            COUNT(a.id) AS total_questions,
-            SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END) AS correct_answers
-        FROM sessions s
-        JOIN answers a ON s.id = a.session_id
-        WHERE s.user_id = ?
-        GROUP BY s.id, s.subject, s.started_at
-        ORDER BY s.started_at DESC
+        SELECT session_id, subject, started_at, total_questions, correct_answers
+        FROM session_scores
+        WHERE user_id = ? AND total_questions > 0
+        ORDER BY started_at DESC
         """,
         (user_id,)
     )
     rows = cur.fetchall()
-    conn.close()
 
     sessions_data = []
     for row in rows:
@@ -351,40 +1523,394 @@ def get_user_sessions_with_scores(user_id: int) -> List[Dict]:
             "subject": row[1],
             "started_at": row[2],
             "total_questions": row[3],
-            "correct_answers": row[4] if row[4] is not None else 0,  # Zorg voor 0 als er geen correcte antwoorden zijn
+            "correct_answers": row[4],
         })
     return sessions_data
 
 
+@metrics.instrument()
 def get_user_progress(user_id: int) -> List[Dict]:
-    """Haal de voortgang van een gebruiker op per vak en onderwerp."""
+    """Haal de voortgang van een gebruiker op per vak en onderwerp (uit ``user_topic_progress``)."""
+    if _answer_writer.pending():
+        _answer_writer.flush()
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Haal alle sessies van de gebruiker op met hun scores per onderwerp
     cursor.execute("""
-        SELECT 
-            s.subject,
-            q.topic,
-            COUNT(*) as total_questions,
-            SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) as correct_answers
-        FROM sessions s
-        JOIN answers a ON s.id = a.session_id
-        JOIN questions q ON a.question_id = q.id
-        WHERE s.user_id = ?
-        GROUP BY s.subject, q.topic
-        ORDER BY s.subject, q.topic
+        SELECT subject, topic, total_questions, correct_answers
+        FROM user_topic_progress
+        WHERE user_id = ? AND total_questions > 0
+        ORDER BY subject, topic
     """, (user_id,))
 
     progress = []
     for row in cursor.fetchall():
         progress.append({
             "subject": row[0],
-            "topic": row[1],
+            "topic": row[1] or None,  # '' = vraag zonder onderwerp
             "total_questions": row[2],
             "correct_answers": row[3],
             "percentage": round((row[3] / row[2]) * 100) if row[2] > 0 else 0
         })
 
-    conn.close()
     return progress
+
+
+# ---------------------------
+# Rollups
+# ---------------------------
+
+# Sessiescore en voortgang per (gebruiker, vak, onderwerp) worden bij elke
+# wijziging in answers incrementeel bijgewerkt door triggers; zo werkt het voor
+# elk schrijfpad (AnswerWriter-upserts, feedback-updates, handmatige correcties).
+# Wijzigingen in questions (import, snapshot-sync) volgen via
+# ``_QUESTION_ROLLUP_TRIGGERS``. Wijzigt het vak van een sessie achteraf, dan
+# loopt de rollup uit de pas: draai dan ``rebuild_rollups()``.
+_ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS session_scores (
+        session_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        subject TEXT NOT NULL,
+        started_at TIMESTAMP,
+        total_questions INTEGER NOT NULL DEFAULT 0,
+        correct_answers INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_session_scores_user ON session_scores(user_id, started_at)",
+    """
+    CREATE TABLE IF NOT EXISTS user_topic_progress (
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        topic TEXT NOT NULL DEFAULT '',    -- '' = geen onderwerp
+        total_questions INTEGER NOT NULL DEFAULT 0,
+        correct_answers INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, subject, topic)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_answers_rollup_insert AFTER INSERT ON answers
+    BEGIN
+        INSERT INTO session_scores(session_id, user_id, subject, started_at)
+            SELECT id, user_id, subject, started_at FROM sessions WHERE id = NEW.session_id
+            ON CONFLICT(session_id) DO NOTHING;
+        UPDATE session_scores
+            SET total_questions = total_questions + 1,
+                correct_answers = correct_answers + (NEW.is_correct = 1)
+            WHERE session_id = NEW.session_id;
+        INSERT INTO user_topic_progress(user_id, subject, topic, total_questions, correct_answers)
+            SELECT s.user_id, s.subject, COALESCE(q.topic, ''), 1, CASE WHEN NEW.is_correct THEN 1 ELSE 0 END
+            FROM sessions s JOIN questions q ON q.id = NEW.question_id
+            WHERE s.id = NEW.session_id AND s.user_id IS NOT NULL
+            ON CONFLICT(user_id, subject, topic) DO UPDATE SET
+                total_questions = total_questions + 1,
+                correct_answers = correct_answers + excluded.correct_answers;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_answers_rollup_delete AFTER DELETE ON answers
+    BEGIN
+        UPDATE session_scores
+            SET total_questions = total_questions - 1,
+                correct_answers = correct_answers - (OLD.is_correct = 1)
+            WHERE session_id = OLD.session_id;
+        UPDATE user_topic_progress
+            SET total_questions = total_questions - 1,
+                correct_answers = correct_answers - (CASE WHEN OLD.is_correct THEN 1 ELSE 0 END)
+            WHERE (user_id, subject, topic) = (
+                SELECT s.user_id, s.subject, COALESCE(q.topic, '')
+                FROM sessions s JOIN questions q ON q.id = OLD.question_id
+                WHERE s.id = OLD.session_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_answers_rollup_update
+    AFTER UPDATE OF session_id, question_id, is_correct ON answers
+    WHEN OLD.session_id IS NOT NEW.session_id
+         OR OLD.question_id IS NOT NEW.question_id
+         OR OLD.is_correct IS NOT NEW.is_correct
+    BEGIN
+        -- oude bijdrage eraf
+        UPDATE session_scores
+            SET total_questions = total_questions - 1,
+                correct_answers = correct_answers - (OLD.is_correct = 1)
+            WHERE session_id = OLD.session_id;
+        UPDATE user_topic_progress
+            SET total_questions = total_questions - 1,
+                correct_answers = correct_answers - (CASE WHEN OLD.is_correct THEN 1 ELSE 0 END)
+            WHERE (user_id, subject, topic) = (
+                SELECT s.user_id, s.subject, COALESCE(q.topic, '')
+                FROM sessions s JOIN questions q ON q.id = OLD.question_id
+                WHERE s.id = OLD.session_id);
+        -- nieuwe bijdrage erbij
+        INSERT INTO session_scores(session_id, user_id, subject, started_at)
+            SELECT id, user_id, subject, started_at FROM sessions WHERE id = NEW.session_id
+            ON CONFLICT(session_id) DO NOTHING;
+        UPDATE session_scores
+            SET total_questions = total_questions + 1,
+                correct_answers = correct_answers + (NEW.is_correct = 1)
+            WHERE session_id = NEW.session_id;
+        INSERT INTO user_topic_progress(user_id, subject, topic, total_questions, correct_answers)
+            SELECT s.user_id, s.subject, COALESCE(q.topic, ''), 1, CASE WHEN NEW.is_correct THEN 1 ELSE 0 END
+            FROM sessions s JOIN questions q ON q.id = NEW.question_id
+            WHERE s.id = NEW.session_id AND s.user_id IS NOT NULL
+            ON CONFLICT(user_id, subject, topic) DO UPDATE SET
+                total_questions = total_questions + 1,
+                correct_answers = correct_answers + excluded.correct_answers;
+    END
+    """,
+]
+
+# user_topic_progress telt alleen antwoorden op bestaande vragen (JOIN, zie
+# _TOPIC_PROGRESS_SQL). Verdwijnt een vraag (import, snapshot-sync), dan gaan
+# haar antwoorden eraf; komt hij terug of wisselt hij van onderwerp, dan gaan ze
+# er (onder het nieuwe onderwerp) weer bij. session_scores telt alle antwoorden
+# en verandert niet.
+_QUESTION_TOPIC_DELTA = """
+    SELECT s.user_id, s.subject, COALESCE({row}.topic, '') AS topic,
+           COUNT(*) AS n, SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) AS c
+    FROM answers a JOIN sessions s ON s.id = a.session_id
+    WHERE a.question_id = {row}.id AND s.user_id IS NOT NULL
+    GROUP BY s.user_id, s.subject
+"""
+_QUESTION_ROLLUP_ADD = """
+    INSERT INTO user_topic_progress(user_id, subject, topic, total_questions, correct_answers)
+        {delta}
+        ON CONFLICT(user_id, subject, topic) DO UPDATE SET
+            total_questions = total_questions + excluded.total_questions,
+            correct_answers = correct_answers + excluded.correct_answers;
+"""
+_QUESTION_ROLLUP_SUBTRACT = """
+    UPDATE user_topic_progress
+        SET total_questions = total_questions - d.n,
+            correct_answers = correct_answers - d.c
+        FROM ({delta}) AS d
+        WHERE user_topic_progress.user_id = d.user_id
+              AND user_topic_progress.subject = d.subject
+              AND user_topic_progress.topic = d.topic;
+"""
+_QUESTION_ROLLUP_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_rollup_delete AFTER DELETE ON questions
+    BEGIN
+        {_QUESTION_ROLLUP_SUBTRACT.format(delta=_QUESTION_TOPIC_DELTA.format(row="OLD"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_rollup_insert AFTER INSERT ON questions
+    BEGIN
+        {_QUESTION_ROLLUP_ADD.format(delta=_QUESTION_TOPIC_DELTA.format(row="NEW"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_questions_rollup_topic AFTER UPDATE OF topic ON questions
+    WHEN COALESCE(OLD.topic, '') IS NOT COALESCE(NEW.topic, '')
+    BEGIN
+        {_QUESTION_ROLLUP_SUBTRACT.format(delta=_QUESTION_TOPIC_DELTA.format(row="OLD"))}
+        {_QUESTION_ROLLUP_ADD.format(delta=_QUESTION_TOPIC_DELTA.format(row="NEW"))}
+    END
+    """,
+]
+
+# Dezelfde aggregaten, direct berekend uit de ruwe antwoorden
+_SESSION_SCORES_SQL = """
+    SELECT s.id, s.user_id, s.subject, s.started_at,
+           COUNT(a.id), SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END)
+    FROM sessions s
+    JOIN answers a ON s.id = a.session_id
+    GROUP BY s.id
+"""
+_TOPIC_PROGRESS_SQL = """
+    SELECT s.user_id, s.subject, COALESCE(q.topic, ''),
+           COUNT(*), SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END)
+    FROM sessions s
+    JOIN answers a ON s.id = a.session_id
+    JOIN questions q ON a.question_id = q.id
+    WHERE s.user_id IS NOT NULL
+    GROUP BY s.user_id, s.subject, COALESCE(q.topic, '')
+"""
+
+
+def _rebuild_rollups(cur):
+    cur.execute("DELETE FROM session_scores")
+    cur.execute("DELETE FROM user_topic_progress")
+    cur.execute(
+        "INSERT INTO session_scores(session_id, user_id, subject, started_at, total_questions, correct_answers) "
+        + _SESSION_SCORES_SQL
+    )
+    cur.execute(
+        "INSERT INTO user_topic_progress(user_id, subject, topic, total_questions, correct_answers) "
+        + _TOPIC_PROGRESS_SQL
+    )
+
+
+@metrics.instrument()
+def rebuild_rollups():
+    """Herbereken alle rollups vanuit de ruwe antwoorden."""
+    flush_answers()
+    with transaction() as conn:
+        _rebuild_rollups(conn.cursor())
+
+
+@metrics.instrument()
+def verify_rollups() -> List[str]:
+    """Vergelijk de rollups met een herberekening uit de ruwe antwoorden.
+
+    Return een lijst met verschillen (leeg = consistent)."""
+    flush_answers()
+    conn = get_connection()
+    problems = []
+    checks = (
+        (
+            "session_scores",
+            _SESSION_SCORES_SQL,
+            "SELECT session_id, user_id, subject, started_at, total_questions, correct_answers "
+            "FROM session_scores WHERE total_questions > 0",
+            1,
+        ),
+        (
+            "user_topic_progress",
+            _TOPIC_PROGRESS_SQL,
+            "SELECT user_id, subject, topic, total_questions, correct_answers "
+            "FROM user_topic_progress WHERE total_questions > 0",
+            3,
+        ),
+    )
+    for table, expected_sql, actual_sql, key_len in checks:
+        expected = {row[:key_len]: row[key_len:] for row in conn.execute(expected_sql)}
+        actual = {row[:key_len]: row[key_len:] for row in conn.execute(actual_sql)}
+        for key in sorted(expected.keys() | actual.keys(), key=repr):
+            if expected.get(key) != actual.get(key):
+                problems.append(f"{table} {key}: verwacht {expected.get(key)}, rollup {actual.get(key)}")
+    return problems
+
+
+# ---------------------------
+# Feedback-cache (LLM)
+# ---------------------------
+
+# Eviction-check (COUNT) alleen elke zoveel inserts, niet bij elke
+_FEEDBACK_CACHE_EVICT_EVERY = 100
+_feedback_cache_puts = 0
+
+# Een hit schrijft last_used_at pas weer weg als die ouder is dan dit (seconden);
+# tussentijdse hits worden in het geheugen geteld en met de volgende schrijfactie
+# op de cache meegeschreven. Zo kost een cache-hit meestal geen schrijf-lock.
+FEEDBACK_CACHE_TOUCH_INTERVAL = int(os.getenv("FEEDBACK_CACHE_TOUCH_INTERVAL", "3600"))
+_feedback_hits_lock = threading.Lock()
+_feedback_hits: Dict[tuple, list] = {}  # key -> [aantal hits, laatste hit]
+
+
+def _take_feedback_hits(key: tuple | None = None) -> list:
+    """Haal de nog niet weggeschreven hits op (van één key, of alle): [(hits, last_used_at, *key)]."""
+    with _feedback_hits_lock:
+        if key is None:
+            pending = list(_feedback_hits.items())
+            _feedback_hits.clear()
+        else:
+            entry = _feedback_hits.pop(key, None)
+            pending = [(key, entry)] if entry else []
+    return [(hits, last, *k) for k, (hits, last) in pending]
+
+
+def _write_feedback_hits(conn, rows: list):
+    conn.executemany(
+        """UPDATE feedback_cache SET hits = hits + ?, last_used_at = MAX(last_used_at, ?)
+           WHERE question_key = ? AND user_answer = ? AND model = ? AND prompt_version = ? AND language = ?""",
+        rows,
+    )
+
+
+@metrics.instrument()
+def get_cached_feedback(key: tuple, ttl: float) -> str | None:
+    """Zoek feedback op in de cache. ``key`` = (question_key, user_answer, model,
+    prompt_version, language). Verlopen entries (ouder dan ``ttl`` seconden) tellen
+    als miss. Een hit telt mee voor de LRU-eviction; ``last_used_at`` wordt hooguit
+    eens per ``FEEDBACK_CACHE_TOUCH_INTERVAL`` direct weggeschreven, verder gaat het
+    mee met de volgende schrijfactie op de cache."""
+    now = time.time()
+    key = tuple(key)
+    row = get_connection().execute(
+        """SELECT feedback, created_at, last_used_at FROM feedback_cache
+           WHERE question_key = ? AND user_answer = ? AND model = ? AND prompt_version = ? AND language = ?""",
+        key,
+    ).fetchone()
+    if row is None or now - row[1] > ttl:
+        return None
+    with _feedback_hits_lock:
+        entry = _feedback_hits.setdefault(key, [0, now])
+        entry[0] += 1
+        entry[1] = now
+    if now - row[2] > FEEDBACK_CACHE_TOUCH_INTERVAL:
+        pending = _take_feedback_hits(key)
+        if pending:
+            with transaction() as conn:
+                _write_feedback_hits(conn, pending)
+    return row[0]
+
+
+@metrics.instrument()
+def put_cached_feedback(key: tuple, feedback: str, max_entries: int):
+    """Sla feedback op in de cache; houdt de cache op max. ``max_entries`` (LRU)."""
+    global _feedback_cache_puts
+    now = time.time()
+    pending = _take_feedback_hits()
+    with transaction() as conn:
+        # Tussentijds getelde hits meeschrijven (vóór de eviction, die op last_used_at sorteert).
+        # Een bestaande rij wordt ge-upsert, niet vervangen, zodat 'hits' behouden blijft.
+        if pending:
+            _write_feedback_hits(conn, pending)
+        conn.execute(
+            """INSERT INTO feedback_cache(question_key, user_answer, model, prompt_version, language,
+                                          feedback, created_at, last_used_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(question_key, user_answer, model, prompt_version, language) DO UPDATE SET
+                   feedback = excluded.feedback,
+                   created_at = excluded.created_at,
+                   last_used_at = excluded.last_used_at""",
+            tuple(key) + (feedback, now, now),
+        )
+        _feedback_cache_puts += 1
+        if _feedback_cache_puts % _FEEDBACK_CACHE_EVICT_EVERY == 0:
+            (count,) = conn.execute("SELECT COUNT(*) FROM feedback_cache").fetchone()
+            if count > max_entries:
+                conn.execute(
+                    """DELETE FROM feedback_cache WHERE rowid IN (
+                           SELECT rowid FROM feedback_cache ORDER BY last_used_at LIMIT ?)""",
+                    (count - max_entries,),
+                )
+
+
+def feedback_cache_size() -> int:
+    """Aantal entries in de feedback-cache."""
+    return get_connection().execute("SELECT COUNT(*) FROM feedback_cache").fetchone()[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Onderhoud van de database.")
+    parser.add_argument("command", choices=["import", "verify-rollups", "rebuild-rollups"])
+    args = parser.parse_args()
+
+    if args.command == "import":
+        # Expliciete (grote) import met voortgang; daarna zoals gewoonlijk verder
+        def report(source, items, done, total):
+            pct = 100 * done / total if total else 100
+            print(f"\r{source}: {items} items, {pct:5.1f}%", end="", flush=True)
+
+        migrate()
+        started = time.perf_counter()
+        with transaction() as conn:
+            changed = import_json_questions(conn.cursor(), progress=report)
+        print(f"\n{changed} vraag/vragen gewijzigd in {time.perf_counter() - started:.1f}s.")
+
+    init_db()
+    if args.command == "rebuild-rollups":
+        rebuild_rollups()
+        print("Rollups opnieuw berekend.")
+    problems = verify_rollups()
+    for problem in problems:
+        print(problem)
+    print("Rollups consistent." if not problems else f"{len(problems)} verschil(len) gevonden.")
+    raise SystemExit(1 if problems else 0)
@@ -0,0 +1,86 @@
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+# Score per antwoord in één byte: 0-100 procent, 255 = geen score (bv. meerkeuze)
+_NO_SCORE = 255
+
+
+def _get_bit(bits: bytearray, i: int) -> bool:
+    return bool(bits[i >> 3] & (1 << (i & 7)))
+
+
+def _set_bit(bits: bytearray, i: int, value: bool):
+    while len(bits) <= i >> 3:
+        bits.append(0)
+    if value:
+        bits[i >> 3] |= 1 << (i & 7)
+    else:
+        bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+
+class ExamRecord:
+    """Compact verslag van één examensessie in ``st.session_state``.
+
+    Bewaart per antwoord alleen het vraag-ID, het antwoord van de leerling, een
+    score-byte en twee bits (goed / wacht op AI-feedback). Vraagtekst,
+    modelantwoord, context en afbeelding worden bij het tonen opgezocht in de
+    gedeelde vragenbank (``db.get_question``); alleen AI-feedback wordt bewaard."""
+
+    __slots__ = ("question_ids", "answers", "scores", "_correct", "_escalated", "_feedback")
+
+    def __init__(self):
+        self.question_ids = array("q")
+        self.answers: List[str] = []
+        self.scores = array("B")
+        self._correct = bytearray()
+        self._escalated = bytearray()
+        self._feedback: Dict[int, str] = {}  # index -> AI-feedback
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def add(self, question_id: int, user_answer: str | None, correct: bool, score: float | None = None, escalate: bool = False) -> int:
+        """Voeg een antwoord toe; return de index."""
+        i = len(self.question_ids)
+        self.question_ids.append(question_id)
+        self.answers.append(user_answer or "")
+        self.scores.append(_NO_SCORE if score is None else round(score * 100))
+        _set_bit(self._correct, i, correct)
+        _set_bit(self._escalated, i, escalate)
+        return i
+
+    def is_correct(self, i: int) -> bool:
+        return _get_bit(self._correct, i)
+
+    def set_correct(self, i: int, correct: bool):
+        """Vervang het lokale oordeel (bv. door dat van het LLM)."""
+        _set_bit(self._correct, i, correct)
+
+    def score(self, i: int) -> float | None:
+        value = self.scores[i]
+        return None if value == _NO_SCORE else value / 100
+
+    def correct_count(self) -> int:
+        return sum(bin(b).count("1") for b in self._correct)
+
+    def mistake_ids(self) -> List[int]:
+        return [qid for i, qid in enumerate(self.question_ids) if not self.is_correct(i)]
+
+    def needs_feedback(self, i: int) -> bool:
+        """True als dit antwoord op AI-feedback wacht (lokale grader twijfelde)."""
+        return _get_bit(self._escalated, i) and i not in self._feedback
+
+    def has_escalated(self) -> bool:
+        """True als het LLM minstens één antwoord beoordeelt; de fouten liggen dan pas op de resultatenpagina vast."""
+        return any(self._escalated)
+
+    def feedback(self, i: int) -> str | None:
+        return self._feedback.get(i)
+
+    def set_feedback(self, i: int, text: str):
+        self._feedback[i] = text
+
+    def entries(self) -> Iterator[Tuple[int, int, str, bool]]:
+        """Yield (index, vraag-ID, antwoord, goed) per antwoord."""
+        for i, qid in enumerate(self.question_ids):
+            yield i, qid, self.answers[i], self.is_correct(i)
@@ -0,0 +1,196 @@
+"""Lokale beoordeling van antwoorden, vóór (en meestal in plaats van) een LLM-call.
+
+Meerkeuzevragen worden exact vergeleken. Open vragen krijgen een score tussen
+0 en 1 op basis van de begrippen uit het beoordelingsmodel (``rubric``) van de
+vraag, of, zonder rubric, op basis van de kernwoorden uit het modelantwoord.
+Alleen antwoorden waarover de grader twijfelt (lage ``confidence``) gaan naar
+het LLM.
+
+Rubric-formaat (veld ``rubric`` in ./data/*.json)::
+
+    {
+      "concepts": [
+        {"name": "extern effect", "terms": ["extern effect", "externe kosten"], "weight": 2},
+        "luchtvervuiling|co2|ziekte"
+      ],
+      "pass": 0.6
+    }
+
+Een concept is een object (``terms`` = alternatieven) of een string met
+alternatieven gescheiden door ``|``. Een alternatief telt als alle woorden
+ervan in het antwoord voorkomen.
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from retrieval import tokenize
+
+# ---------------------------
+# Configuratie
+# ---------------------------
+
+# Vanaf deze score is een open antwoord goed (per vraag te overschrijven met rubric["pass"])
+GRADER_PASS_SCORE = float(os.getenv("GRADER_PASS_SCORE", "0.5"))
+# Onder deze zekerheid gaat het antwoord alsnog naar het LLM
+GRADER_MIN_CONFIDENCE = float(os.getenv("GRADER_MIN_CONFIDENCE", "0.6"))
+
+# Afstand tot de drempel waarbij de grader volledig zeker is
+_RUBRIC_MARGIN = 0.25
+_AUTO_MARGIN = 0.35
+# Zonder rubric: met minder kernwoorden dan dit is de overlap weinig zeggend
+_AUTO_MIN_TERMS = 6
+_MIN_PREFIX = 5
+
+
+# ---------------------------
+# Tekstnormalisatie
+# ---------------------------
+
+
+def _stem(token: str) -> str:
+    """Zeer lichte Nederlandse stemmer: meervoud/verbuiging eraf."""
+    for suffix in ("heden", "ingen", "en", "es", "s", "e"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[: -len(suffix)]
+    return token
+
+
+# Woorden die in modelantwoorden veel voorkomen maar niets over de inhoud zeggen
+_FILLER = frozenset(
+    """
+    bijv bijvoorbeeld omdat doordat waardoor want daarom daarbij namelijk dus
+    zorgen zorgt ontstaan ontstaat leidt leiden geldt gebruik gebruiken bepaal
+    bepaalt stap vul lees moet moeten zodat waarbij wanneer indien
+    """.split()
+)
+
+
+@lru_cache(maxsize=4096)
+def _terms(text: str) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(_stem(t) for t in tokenize(text) if t not in _FILLER))
+
+
+def _matches(term: str, answer_terms: frozenset) -> bool:
+    if term in answer_terms:
+        return True
+    # Samenstellingen/afleidingen: 'vervuiling' ~ 'vervuilend'
+    if len(term) >= _MIN_PREFIX:
+        head = term[:_MIN_PREFIX]
+        return any(t.startswith(head) and (t.startswith(term) or term.startswith(t)) for t in answer_terms if len(t) >= _MIN_PREFIX)
+    return False
+
+
+@lru_cache(maxsize=1024)
+def _compile_rubric(concepts: tuple) -> List[Tuple[str, float, List[Tuple[str, ...]]]]:
+    """Rubric -> [(naam, gewicht, [alternatief als tuple van termen])]."""
+    compiled = []
+    for concept in concepts:
+        if isinstance(concept, str):
+            name, weight, alternatives = concept.split("|")[0], 1.0, concept.split("|")
+        else:
+            concept = dict(concept)
+            alternatives = list(concept.get("terms") or [concept.get("name", "")])
+            name = concept.get("name") or alternatives[0]
+            weight = float(concept.get("weight", 1.0))
+        terms = [_terms(a) for a in alternatives if _terms(a)]
+        if terms and weight > 0:
+            compiled.append((name, weight, terms))
+    return compiled
+
+
+def _freeze(value):
+    """Maak een rubric hashbaar voor de lru_cache."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# ---------------------------
+# Beoordelen
+# ---------------------------
+
+
+def _result(correct: bool, score: float, confidence: float, method: str, matched=(), missing=()) -> Dict:
+    return {
+        "correct": correct,
+        "score": round(score, 3),
+        "confidence": round(confidence, 3),
+        "escalate": confidence < GRADER_MIN_CONFIDENCE,
+        "method": method,
+        "matched": list(matched),
+        "missing": list(missing),
+    }
+
+
+def grade_answer(question: Dict, user_answer: str | None) -> Dict:
+    """Beoordeel één antwoord op een vraag uit de vragenbank.
+
+    Return een dict met ``correct``, ``score`` (0-1), ``confidence`` (0-1),
+    ``escalate`` (True = laat het LLM meekijken), ``method`` en de gevonden
+    (``matched``) en ontbrekende (``missing``) begrippen."""
+    answer = (user_answer or "").strip()
+    if question.get("options"):
+        correct = answer == question["correct_answer"]
+        return _result(correct, 1.0 if correct else 0.0, 1.0, "exact")
+
+    model = question["correct_answer"]
+    if not answer:
+        return _result(False, 0.0, 1.0, "empty")
+    if " ".join(answer.lower().split()) == " ".join(model.lower().split()):
+        return _result(True, 1.0, 1.0, "exact")
+
+    answer_terms = frozenset(_terms(answer))
+    rubric = question.get("rubric")
+    if rubric and rubric.get("concepts"):
+        concepts = _compile_rubric(_freeze(rubric["concepts"]))
+        if concepts:
+            threshold = float(rubric.get("pass", GRADER_PASS_SCORE))
+            total = sum(weight for _, weight, _ in concepts)
+            matched, missing, got = [], [], 0.0
+            for name, weight, alternatives in concepts:
+                if any(all(_matches(t, answer_terms) for t in alt) for alt in alternatives):
+                    matched.append(name)
+                    got += weight
+                else:
+                    missing.append(name)
+            score = got / total
+            confidence = min(1.0, abs(score - threshold) / _RUBRIC_MARGIN)
+            return _result(score >= threshold, score, confidence, "rubric", matched, missing)
+
+    # Geen rubric: overlap met de kernwoorden uit het modelantwoord
+    model_terms = _terms(model)
+    if not model_terms:
+        return _result(False, 0.0, 0.0, "keywords")
+    matched = [t for t in model_terms if _matches(t, answer_terms)]
+    missing = [t for t in model_terms if t not in matched]
+    score = len(matched) / len(model_terms)
+    coverage = min(1.0, len(model_terms) / _AUTO_MIN_TERMS)
+    if score >= GRADER_PASS_SCORE:
+        confidence = min(1.0, (score - GRADER_PASS_SCORE) / _AUTO_MARGIN)
+    else:
+        # Een parafrase haalt zelden alle kernwoorden: alleen bij (bijna) geen
+        # overlap is 'fout' zeker, daartussen beslist het LLM
+        confidence = (GRADER_PASS_SCORE - score) / GRADER_PASS_SCORE
+    return _result(score >= GRADER_PASS_SCORE, score, confidence * coverage, "keywords", matched, missing)
+
+
+def local_feedback(grade: Dict, correct_answer: str) -> str:
+    """Korte feedback zonder API, op basis van de beoordeling."""
+    if grade["method"] == "empty":
+        return f"Je hebt geen antwoord gegeven. Juiste antwoord: '{correct_answer}'."
+    if grade["method"] == "exact":
+        if grade["correct"]:
+            return "Goed!"
+        return f"Helaas, dat is niet juist. Juiste antwoord: '{correct_answer}'."
+    if grade["correct"]:
+        text = "Goed! Je noemt de belangrijkste punten"
+        if grade["missing"] and grade["method"] == "rubric":
+            text += f"; let nog op: {', '.join(grade['missing'])}"
+        return text + "."
+    if grade["method"] == "rubric" and grade["missing"]:
+        return f"Je antwoord mist nog: {', '.join(grade['missing'])}. Vergelijk met het modelantwoord: '{correct_answer}'."
+    return f"Je antwoord is nog onvolledig. Vergelijk met het modelantwoord: '{correct_answer}'."
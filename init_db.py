@@ -1,104 +1,21 @@
-import sqlite3
-import hashlib
 import os
 
+import db
+
 
 def init_db():
     # Verwijder bestaande database als die bestaat
-    if os.path.exists('db.db'):
-        os.remove('db.db')
-
-    # Maak nieuwe database connectie
-    conn = sqlite3.connect('db.db')
-    c = conn.cursor()
-
-    # Maak users tabel
-    c.execute('''
-    CREATE TABLE users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        salt TEXT NOT NULL,
-        level TEXT NOT NULL DEFAULT 'havo',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # Maak questions tabel
-    c.execute('''
-    CREATE TABLE questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        subject TEXT NOT NULL,
-        level TEXT NOT NULL,
-        year INTEGER NOT NULL,
-        question TEXT NOT NULL,
-        correct_answer TEXT NOT NULL,
-        options TEXT,
-        context TEXT,
-        image TEXT,
-        topic TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # Maak question_options tabel
-    c.execute('''
-    CREATE TABLE question_options (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question_id INTEGER NOT NULL,
-        option_text TEXT NOT NULL,
-        option_order INTEGER NOT NULL,
-        FOREIGN KEY(question_id) REFERENCES questions(id)
-    )
-    ''')
+    db.close_connections()
+    for suffix in ("", "-wal", "-shm"):
+        path = f"{db.DB_PATH}{suffix}"
+        if os.path.exists(path):
+            os.remove(path)
 
-    # Maak sessions tabel
-    c.execute('''
-    CREATE TABLE sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        subject TEXT NOT NULL,
-        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        finished_at TIMESTAMP,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    ''')
-
-    # Maak answers tabel
-    c.execute('''
-    CREATE TABLE answers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id INTEGER NOT NULL,
-        question_id INTEGER NOT NULL,
-        user_answer TEXT NOT NULL,
-        is_correct INTEGER NOT NULL,
-        feedback TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(session_id) REFERENCES sessions(id),
-        FOREIGN KEY(question_id) REFERENCES questions(id)
-    )
-    ''')
-
-    # Maak indexes
-    c.execute('CREATE INDEX idx_questions_subject ON questions(subject)')
-    c.execute('CREATE INDEX idx_questions_level ON questions(level)')
-    c.execute('CREATE INDEX idx_answers_session ON answers(session_id)')
-    c.execute('CREATE INDEX idx_answers_question ON answers(question_id)')
+    # Schema (via de migraties in db.py) + import van ./data/*.json
+    db.init_db(force=True)
 
     # Voeg test gebruiker toe
-    salt = 'salt123'
-    password = 'test123'
-    hashed_password = hashlib.sha256((password + salt).encode()).hexdigest()
-
-    c.execute('''
-    INSERT INTO users (username, password, salt, level)
-    VALUES (?, ?, ?, ?)
-    ''', ('friso', hashed_password, salt, 'vwo'))
+    db.create_user('friso', 'test123', 'vwo')
 
     # Voeg test vragen toe
     questions = [
@@ -114,14 +31,13 @@ def init_db():
          'Bij de productie van A ontstaat vervuiling die niet in de prijs zit. Dit is een negatief extern effect. De maatschappelijke kosten zijn hoger dan de private kosten. Daardoor is de marktuitkomst niet efficiënt, wat leidt tot welvaartsverlies.')
     ]
 
-    c.executemany('''
-    INSERT INTO questions (subject, level, year, question, correct_answer)
-    VALUES (?, ?, ?, ?, ?)
-    ''', questions)
-
-    # Commit changes en sluit connectie
-    conn.commit()
-    conn.close()
+    # Bron 'seed' (geen bestand in ./data), met stabiele ID's zoals bij de import
+    with db.transaction() as conn:
+        conn.executemany('''
+        INSERT INTO questions (id, subject, level, year, question, correct_answer, source)
+        VALUES (?, ?, ?, ?, ?, ?, 'seed')
+        ''', [(db._question_id('seed', q[3]),) + q for q in questions])
+    db.invalidate_question_bank()
 
 
 if __name__ == '__main__':
@@ -1,10 +1,36 @@
+import hashlib
+import json
 import os
-from typing import List
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, APIConnectionError, APITimeoutError
 except ImportError:  # indien requirements nog niet geïnstalleerd
     OpenAI = None
+    APIConnectionError = APITimeoutError = None
+
+try:
+    import httpx  # wordt meegeïnstalleerd met openai
+except ImportError:
+    httpx = None
+
+import db
+import llm_backends
+import metrics
+import retrieval
+
+try:
+    import tiktoken  # optioneel: exacte tokentelling
+except ImportError:
+    tiktoken = None
 
 try:
     from dotenv import load_dotenv
@@ -17,27 +43,339 @@ except ImportError:
 # Config
 # -------------
 
+# Maximaal aantal gelijktijdige API-calls bij het genereren van feedback per sessie
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+
+FEEDBACK_MODEL = "gpt-3.5-turbo"
+# Ophogen bij elke wijziging van de feedback-prompt: oude cache-entries vervallen dan
+FEEDBACK_PROMPT_VERSION = "2"  # 2: JSON met oordeel ("correct") en feedback
+
+# "concurrent": één request per antwoord, parallel; "batch": meerdere antwoorden per request
+FEEDBACK_MODE = os.getenv("LLM_FEEDBACK_MODE", "concurrent")
+FEEDBACK_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_FEEDBACK_BATCH_TOKENS", "3000"))  # input-tokens per request
+FEEDBACK_BATCH_MAX_ITEMS = int(os.getenv("LLM_FEEDBACK_BATCH_MAX_ITEMS", "20"))
+FEEDBACK_BATCH_TOKENS_PER_ITEM = 120  # max_tokens per antwoord in de batch-response
+
+# Tokenbudget voor het tutorgesprek (systeemprompt + samenvatting + recente beurten + vraag)
+TUTOR_CONTEXT_TOKENS = int(os.getenv("LLM_TUTOR_CONTEXT_TOKENS", "1500"))
+TUTOR_SUMMARY_TOKENS = 150  # max. lengte van de samenvatting van oudere beurten
+TUTOR_SUMMARY_CACHE_SIZE = 256
+# Grounding: aantal vragen/modelantwoorden uit de bank en hun tokenplafond
+TUTOR_GROUNDING_K = int(os.getenv("LLM_TUTOR_GROUNDING_K", "3"))
+TUTOR_GROUNDING_TOKENS = int(os.getenv("LLM_TUTOR_GROUNDING_TOKENS", "400"))
+TUTOR_GROUNDING_MIN_ITEM_TOKENS = 80
+
+# Vervolgvragen: memo-grootte en of ze tijdens het examen al vooraf gegenereerd worden
+FOLLOWUP_CACHE_SIZE = 512
+FOLLOWUP_PREFETCH = os.getenv("LLM_PREFETCH_FOLLOWUP", "0") == "1"
+
+# Persistente feedback-cache (tabel feedback_cache in db.py)
+FEEDBACK_CACHE_ENABLED = os.getenv("FEEDBACK_CACHE", "1") != "0"
+FEEDBACK_CACHE_TTL = int(os.getenv("FEEDBACK_CACHE_TTL", str(30 * 24 * 3600)))  # seconden
+FEEDBACK_CACHE_MAX_ENTRIES = int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "50000"))
+
+
+# Gedeelde client: timeouts, retries en circuit breaker
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))  # seconden per request
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = 0.5  # seconden; verdubbelt per poging (met jitter)
+LLM_BACKOFF_MAX = 8.0
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # opeenvolgende fouten
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconden open
+
+# openai | fake | record | replay (zie llm_backends.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+
 def _openai_available() -> bool:
+    # fake en replay hebben geen API-key (of netwerk) nodig
+    if LLM_BACKEND in ("fake", "replay"):
+        return True
     return OpenAI is not None and os.getenv("OPENAI_API_KEY")
 
 
 # -------------
-# Public API
+# Client, retries en circuit breaker
 # -------------
 
-def get_feedback(question_text: str, correct_answer: str, user_answer: str, *, subject: str, level: str, language: str = "nl") -> str:
-    """Geef feedback op basis van GPT. Valt terug op een simpele string zonder API-key."""
-    if not _openai_available():
-        return (
-            "AI-feedback niet beschikbaar (geen API-key). Juiste antwoord is "
-            f"'{correct_answer}'."
+class CircuitOpenError(RuntimeError):
+    """De LLM-provider is (tijdelijk) als onbereikbaar gemarkeerd."""
+
+
+class CircuitBreaker:
+    """Eenvoudige circuit breaker.
+
+    Na ``threshold`` opeenvolgende mislukte requests gaat hij ``cooldown`` seconden
+    open: calls falen dan direct (offline fallback) i.p.v. op timeouts te wachten.
+    Daarna mag er één proefrequest door (half-open); slaagt dat, dan sluit hij weer."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and (
+                self._probing or time.monotonic() - self._opened_at < self.cooldown
+            )
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True  # half-open: dit request is de proef
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+_client = None
+_client_lock = threading.Lock()
+
+
+def _openai_client():
+    """OpenAI-client met gedeelde HTTP-connectiepool.
+
+    Keep-alive en TLS-sessies worden zo hergebruikt tussen alle calls. Retries
+    doen we zelf (zie ``_chat_completion``), dus die van de SDK staan uit."""
+    http_client = None
+    if httpx is not None:
+        http_client = httpx.Client(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
         )
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        http_client=http_client,
+    )
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    system_msg = (
+
+def _get_client():
+    """Eén procesbrede client (lazy) voor de gekozen ``LLM_BACKEND``."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = llm_backends.create_client(LLM_BACKEND, _openai_client)
+    return _client
+
+
+def use_backend(backend: str, client=None):
+    """Wissel van backend (bv. in benchmarks): nieuwe client en een gesloten circuit breaker.
+
+    Zonder ``client`` wordt hij bij de volgende call uit de omgeving opgebouwd."""
+    global LLM_BACKEND, _client, _breaker
+    if backend not in llm_backends.BACKENDS:
+        raise ValueError(f"Onbekende LLM_BACKEND {backend!r}")
+    with _client_lock:
+        LLM_BACKEND = backend
+        _client = client
+        _breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+
+
+def _llm_ready() -> bool:
+    """API-key aanwezig en de provider niet als onbereikbaar gemarkeerd."""
+    return bool(_openai_available()) and not _breaker.is_open()
+
+
+def _unavailable_reason() -> str:
+    return "geen API-key" if not _openai_available() else "AI-dienst tijdelijk onbereikbaar"
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """429, 408/409 en 5xx zijn tijdelijk; netwerkfouten en timeouts ook."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return APIConnectionError is not None and isinstance(exc, (APIConnectionError, APITimeoutError))
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    # Respecteer Retry-After van de provider, anders exponentieel met full jitter
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+    except ValueError:
+        pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+@metrics.instrument("llm.chat_completion", scope=False)
+def _chat_completion(**kwargs):
+    """``chat.completions.create`` via de gedeelde client, met retries en circuit breaker.
+
+    Tijdelijke fouten worden tot ``LLM_MAX_RETRIES`` keer opnieuw geprobeerd; pas als
+    dat ook mislukt telt het als fout voor de circuit breaker. Bij ``stream=True``
+    wordt alleen het openen van de stream opnieuw geprobeerd."""
+    if not _breaker.allow():
+        raise CircuitOpenError("AI-dienst tijdelijk onbereikbaar")
+    kwargs.setdefault("timeout", LLM_TIMEOUT)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            response = _get_client().chat.completions.create(**kwargs)
+        except Exception as e:
+            if not _is_retryable(e):
+                _breaker.record_success()  # provider antwoordt; fout ligt aan het request
+                raise
+            if attempt == LLM_MAX_RETRIES:
+                _breaker.record_failure()
+                raise
+            time.sleep(_retry_delay(e, attempt))
+        else:
+            _breaker.record_success()
+            if metrics.ENABLED and not kwargs.get("stream"):
+                metrics.record_tokens(getattr(response, "usage", None))
+            return response
+
+
+# -------------
+# Feedback-cache
+# -------------
+
+_cache_stats_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+def _normalize_answer(text: str) -> str:
+    """Normaliseer een antwoord zodat bijna-identieke antwoorden dezelfde cache-key krijgen."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(".,;:!?\"' ")
+
+
+def _feedback_cache_key(question_text: str, correct_answer: str, user_answer: str, subject: str, level: str, language: str) -> tuple:
+    # Vak en niveau zitten in de prompt, dus horen bij de vraag-sleutel
+    question_key = hashlib.sha256(
+        "\x00".join((question_text, correct_answer, subject, level.lower())).encode("utf-8")
+    ).hexdigest()
+    return (question_key, _normalize_answer(user_answer), FEEDBACK_MODEL, FEEDBACK_PROMPT_VERSION, language)
+
+
+def _count_cache(stat: str):
+    with _cache_stats_lock:
+        _cache_stats[stat] += 1
+
+
+def feedback_cache_stats() -> Dict:
+    """Hit-rate van de feedback-cache in dit proces (+ aantal entries in de DB)."""
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    try:
+        stats["entries"] = db.feedback_cache_size()
+    except sqlite3.Error:
+        stats["entries"] = None
+    return stats
+
+
+# -------------
+# Public API
+# -------------
+
+def _feedback_system_msg(subject: str, level: str, language: str) -> str:
+    return (
         "Je bent een behulpzame docent {}-docent op {} niveau. "
+        "Beoordeel of het antwoord inhoudelijk juist is (andere bewoording dan het correcte antwoord mag). "
         "Leg kort (max 2 zinnen, {} taal) uit waarom het antwoord juist of onjuist is en geef een tip.".format(subject, level.upper(), language)
     )
+
+
+def _parse_verdict(content: str | None) -> Tuple[str, bool | None]:
+    """Parse ``{"correct": true, "feedback": "..."}`` tot (feedback, correct).
+
+    Geen geldige JSON: de tekst is de feedback en er is geen oordeel (None)."""
+    text = (content or "").strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text, None
+    if not isinstance(data, dict) or not isinstance(data.get("feedback"), str):
+        return text, None
+    correct = data.get("correct")
+    return data["feedback"].strip(), correct if isinstance(correct, bool) else None
+
+
+def _offline_feedback(correct_answer: str) -> str:
+    return (
+        f"AI-feedback niet beschikbaar ({_unavailable_reason()}). Juiste antwoord is "
+        f"'{correct_answer}'."
+    )
+
+
+def _lookup_feedback(cache_key: tuple | None) -> Tuple[str, bool | None] | None:
+    """Return (feedback, correct) uit de cache, of None bij een miss."""
+    if cache_key is None:
+        return None
+    try:
+        cached = db.get_cached_feedback(cache_key, FEEDBACK_CACHE_TTL)
+    except sqlite3.Error:
+        _count_cache("errors")
+        cached = None
+    _count_cache("hits" if cached is not None else "misses")
+    return None if cached is None else _parse_verdict(cached)
+
+
+def _store_feedback(cache_key: tuple | None, feedback: str, correct: bool | None):
+    if cache_key is None or not feedback:
+        return
+    # Oordeel en feedback samen bewaren, in hetzelfde formaat als het model antwoordt
+    value = json.dumps({"correct": correct, "feedback": feedback}, ensure_ascii=False)
+    try:
+        db.put_cached_feedback(cache_key, value, FEEDBACK_CACHE_MAX_ENTRIES)
+    except sqlite3.Error:
+        _count_cache("errors")
+
+
+@metrics.instrument()
+def get_feedback_verdict(question_text: str, correct_answer: str, user_answer: str, *, subject: str, level: str, language: str = "nl") -> Tuple[str, bool | None]:
+    """Geef feedback én het oordeel van GPT: (feedback, correct).
+
+    ``correct`` is None als er geen oordeel is (geen API-key, fout, geen geldige
+    JSON); de aanroeper houdt dan het lokale oordeel aan. Kijkt eerst in de
+    persistente feedback-cache (vraag + genormaliseerd antwoord + model +
+    promptversie + taal); alleen bij een miss wordt de API aangeroepen."""
+    if not _llm_ready():
+        return _offline_feedback(correct_answer), None
+
+    cache_key = None
+    if FEEDBACK_CACHE_ENABLED:
+        cache_key = _feedback_cache_key(question_text, correct_answer, user_answer, subject, level, language)
+        cached = _lookup_feedback(cache_key)
+        if cached is not None:
+            return cached
+
+    system_msg = (
+        _feedback_system_msg(subject, level, language)
+        + ' Antwoord uitsluitend met JSON in de vorm {"correct": true/false, "feedback": "<feedback>"}.'
+    )
     user_prompt = (
         f"Vraag: {question_text}\n"
         f"Antwoord leerling: {user_answer}\n"
@@ -46,77 +384,536 @@ def get_feedback(question_text: str, correct_answer: str, user_answer: str, *, s
     )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = _chat_completion(
+            model=FEEDBACK_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_prompt},
             ],
-            max_tokens=100,
+            max_tokens=120,
             temperature=0.7,
+            response_format={"type": "json_object"},
         )
-        return response.choices[0].message.content.strip()
+        feedback, correct = _parse_verdict(response.choices[0].message.content)
     except Exception as e:
-        return f"(Fout bij ophalen AI-feedback: {e}) Juiste antwoord: '{correct_answer}'."
+        return f"(Fout bij ophalen AI-feedback: {e}) Juiste antwoord: '{correct_answer}'.", None
 
+    _store_feedback(cache_key, feedback, correct)
+    return feedback, correct
 
-def generate_followup(subject: str, level: str, mistakes: List[str], n: int = 3) -> List[str]:
-    """Genereer n nieuwe vragen van hetzelfde vak gebaseerd op fouten. Returnt lijst string-vragen."""
-    if not _openai_available() or not mistakes:
-        return []
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def get_feedback(question_text: str, correct_answer: str, user_answer: str, *, subject: str, level: str, language: str = "nl") -> str:
+    """Alleen de feedbacktekst van ``get_feedback_verdict``."""
+    return get_feedback_verdict(
+        question_text, correct_answer, user_answer, subject=subject, level=level, language=language
+    )[0]
+
+
+# -------------
+# Batch-feedback (één request voor meerdere antwoorden)
+# -------------
+
+def _estimate_tokens(text: str) -> int:
+    """Ruwe schatting (±4 tekens per token), ruim genoeg om batches te begrenzen."""
+    return len(text) // 4 + 1
+
+
+def _batch_item_text(i: int, a: Dict) -> str:
+    return (
+        f"[{i}]\nVraag: {a['question']}\n"
+        f"Antwoord leerling: {a['user_answer']}\n"
+        f"Correcte antwoord: {a['correct_answer']}\n"
+    )
+
+
+def _chunk_for_budget(indexed: List[Tuple[int, Dict]]) -> List[List[Tuple[int, Dict]]]:
+    """Verdeel items over chunks die binnen het tokenbudget en het max. aantal items blijven."""
+    chunks: List[List[Tuple[int, Dict]]] = []
+    current: List[Tuple[int, Dict]] = []
+    used = 0
+    for i, a in indexed:
+        cost = _estimate_tokens(_batch_item_text(i, a))
+        if current and (used + cost > FEEDBACK_BATCH_TOKEN_BUDGET or len(current) >= FEEDBACK_BATCH_MAX_ITEMS):
+            chunks.append(current)
+            current, used = [], 0
+        current.append((i, a))
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _parse_batch_response(content: str) -> Dict[int, Tuple[str, bool | None]]:
+    """Parse ``{"feedback": [{"id": 0, "correct": true, "feedback": "..."}, ...]}``
+    tot id -> (feedback, correct); onleesbare items worden overgeslagen."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+    entries = data.get("feedback") if isinstance(data, dict) else data
+    parsed: Dict[int, Tuple[str, bool | None]] = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        text = entry.get("feedback")
+        correct = entry.get("correct")
+        if isinstance(text, str) and text.strip():
+            parsed[idx] = (text.strip(), correct if isinstance(correct, bool) else None)
+    return parsed
+
+
+@metrics.instrument("llm.feedback_chunk")
+def _feedback_chunk(chunk: List[Tuple[int, Dict]], subject: str, level: str, language: str) -> Dict[int, Tuple[str, bool | None]]:
+    """Vraag feedback en oordeel voor één chunk in één request. Items die niet (goed)
+    terugkomen vallen terug op een losse ``get_feedback_verdict``-call."""
     system_msg = (
-        "Je bent een examenmaker voor het vak {} (niveau {}). Schrijf {} nieuwe examenvragen gebaseerd op deze fouten. "
-        "Elke vraag moet een korte multiple-choice vraag zijn met 4 opties (A-D) en geef het correcte antwoord apart."
-    ).format(subject, level.upper(), n)
-    user_prompt = "Fouten/onderwerpen: " + "; ".join(mistakes)
+        _feedback_system_msg(subject, level, language)
+        + ' Je krijgt meerdere genummerde antwoorden. Antwoord uitsluitend met JSON in de vorm '
+        '{"feedback": [{"id": <nummer>, "correct": true/false, "feedback": "<feedback>"}, ...]}, één entry per nummer.'
+    )
+    user_prompt = "".join(_batch_item_text(i, a) for i, a in chunk)
 
+    parsed: Dict[int, Tuple[str, bool | None]] = {}
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = _chat_completion(
+            model=FEEDBACK_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_prompt},
             ],
-            max_tokens=300,
-            temperature=0.8,
+            max_tokens=FEEDBACK_BATCH_TOKENS_PER_ITEM * len(chunk) + 50,
+            timeout=LLM_TIMEOUT * 2,  # langere response dan een los antwoord
+            temperature=0.7,
+            response_format={"type": "json_object"},
         )
-        return [response.choices[0].message.content.strip()]
+        parsed = _parse_batch_response(response.choices[0].message.content)
+    except Exception:
+        pass  # hele chunk valt terug op losse calls
+
+    results: Dict[int, Tuple[str, bool | None]] = {}
+    for i, a in chunk:
+        if i in parsed:
+            results[i] = parsed[i]
+            if FEEDBACK_CACHE_ENABLED:
+                _store_feedback(
+                    _feedback_cache_key(a["question"], a["correct_answer"], a["user_answer"], subject, level, language),
+                    *parsed[i],
+                )
+        else:
+            results[i] = get_feedback_verdict(
+                a["question"], a["correct_answer"], a["user_answer"],
+                subject=subject, level=level, language=language,
+            )
+    return results
+
+
+def _iter_feedback_batched(answers: List[Dict], subject: str, level: str, language: str, workers: int) -> Iterator[Tuple[int, str, bool | None]]:
+    if not _llm_ready():
+        for i, a in enumerate(answers):
+            yield i, _offline_feedback(a["correct_answer"]), None
+        return
+
+    # Cache-hits meteen teruggeven; alleen de misses gaan de batch in
+    misses: List[Tuple[int, Dict]] = []
+    for i, a in enumerate(answers):
+        cached = None
+        if FEEDBACK_CACHE_ENABLED:
+            cached = _lookup_feedback(
+                _feedback_cache_key(a["question"], a["correct_answer"], a["user_answer"], subject, level, language)
+            )
+        if cached is not None:
+            yield (i,) + cached
+        else:
+            misses.append((i, a))
+    if not misses:
+        return
+
+    chunks = _chunk_for_budget(misses)
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix="feedback") as pool:
+        futures = [pool.submit(_feedback_chunk, chunk, subject, level, language) for chunk in chunks]
+        for future in as_completed(futures):
+            for i, (feedback, correct) in future.result().items():
+                yield i, feedback, correct
+
+
+@metrics.instrument()
+def get_feedback_batch(answers: List[Dict], *, subject: str, level: str, language: str = "nl") -> List[str]:
+    """Feedback voor alle antwoorden van een sessie in zo min mogelijk requests.
+
+    Alle (vraag, correct antwoord, antwoord leerling)-triples gaan in één request
+    (gesplitst in chunks zodra het tokenbudget overschreden wordt) en het
+    JSON-antwoord wordt per antwoord uitgesplitst. Return feedback in dezelfde
+    volgorde als ``answers``."""
+    results = {i: feedback for i, feedback, _ in _iter_feedback_batched(answers, subject, level, language, LLM_MAX_CONCURRENCY)}
+    return [results[i] for i in range(len(answers))]
+
+
+@metrics.instrument()
+def iter_feedback(
+    answers: List[Dict],
+    *,
+    subject: str,
+    level: str,
+    language: str = "nl",
+    max_concurrency: int | None = None,
+) -> Iterator[Tuple[int, str, bool | None]]:
+    """Genereer feedback en oordeel voor alle antwoorden van een sessie tegelijk.
+
+    ``answers`` is een lijst dicts met ``question``, ``correct_answer`` en
+    ``user_answer``. Yield ``(index, feedback, correct)`` zodra een antwoord klaar
+    is (dus niet in volgorde), zodat de pagina elk blok meteen kan tonen;
+    ``correct`` is None als het LLM geen oordeel gaf (zie ``get_feedback_verdict``). De totale
+    wachttijd is daarmee ongeveer die van de traagste call i.p.v. de som.
+    Met ``LLM_FEEDBACK_MODE=batch`` gaan de antwoorden per chunk in één request."""
+    if not answers:
+        return
+    workers = max(1, min(max_concurrency or LLM_MAX_CONCURRENCY, len(answers)))
+    if FEEDBACK_MODE == "batch":
+        yield from _iter_feedback_batched(answers, subject, level, language, workers)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feedback") as pool:
+        futures = {
+            pool.submit(
+                get_feedback_verdict,
+                a["question"],
+                a["correct_answer"],
+                a["user_answer"],
+                subject=subject,
+                level=level,
+                language=language,
+            ): i
+            for i, a in enumerate(answers)
+        }
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
+
+
+# -------------
+# Vervolgvragen (gememoiseerd, optioneel vooraf gegenereerd)
+# -------------
+
+_followup_lock = threading.Lock()
+_followup_cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
+_followup_inflight: Dict[tuple, "Future"] = {}
+_followup_pool: ThreadPoolExecutor | None = None
+
+
+def _followup_key(subject: str, level: str, mistakes: List[str], n: int) -> tuple:
+    # Volgorde van de fouten maakt voor de prompt niet uit
+    return (subject, level.lower(), tuple(sorted(set(mistakes))), n)
+
+
+@metrics.instrument("llm.request_followup")
+def _request_followup(subject: str, level: str, mistakes: List[str], n: int) -> List[str]:
+    system_msg = (
+        "Je bent een examenmaker voor het vak {} (niveau {}). Schrijf {} nieuwe examenvragen gebaseerd op deze fouten. "
+        "Elke vraag moet een korte multiple-choice vraag zijn met 4 opties (A-D) en geef het correcte antwoord apart."
+    ).format(subject, level.upper(), n)
+    user_prompt = "Fouten/onderwerpen: " + "; ".join(mistakes)
+
+    response = _chat_completion(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_prompt},
+        ],
+        max_tokens=300,
+        temperature=0.8,
+    )
+    return [response.choices[0].message.content.strip()]
+
+
+def _remember_followup(key: tuple, result: List[str]):
+    with _followup_lock:
+        _followup_cache[key] = result
+        _followup_cache.move_to_end(key)
+        while len(_followup_cache) > FOLLOWUP_CACHE_SIZE:
+            _followup_cache.popitem(last=False)
+
+
+def _followup_done(key: tuple, future: "Future"):
+    with _followup_lock:
+        _followup_inflight.pop(key, None)
+    if future.exception() is None:
+        _remember_followup(key, future.result())
+
+
+@metrics.instrument()
+def prefetch_followup(subject: str, level: str, mistakes: List[str], n: int = 3):
+    """Start het genereren van vervolgvragen alvast op de achtergrond.
+
+    Bedoeld om tijdens het examen aan te roepen zodra er een fout is; staat de
+    resultatenpagina er later om, dan haalt ``generate_followup`` het resultaat
+    (of het lopende request) op i.p.v. opnieuw te wachten. Doet niets als
+    ``LLM_PREFETCH_FOLLOWUP`` uit staat."""
+    if not FOLLOWUP_PREFETCH or not _llm_ready() or not mistakes:
+        return
+    global _followup_pool
+    key = _followup_key(subject, level, mistakes, n)
+    with _followup_lock:
+        if key in _followup_cache or key in _followup_inflight:
+            return
+        if _followup_pool is None:
+            _followup_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="followup")
+        future = _followup_pool.submit(_request_followup, subject, level, list(mistakes), n)
+        _followup_inflight[key] = future
+    future.add_done_callback(lambda f: _followup_done(key, f))
+
+
+@metrics.instrument()
+def generate_followup(subject: str, level: str, mistakes: List[str], n: int = 3) -> List[str]:
+    """Genereer n nieuwe vragen van hetzelfde vak gebaseerd op fouten. Returnt lijst string-vragen.
+
+    Gememoiseerd per (vak, niveau, set fouten, n); een eventueel al lopend
+    prefetch-request wordt hergebruikt."""
+    if not _llm_ready() or not mistakes:
+        return []
+
+    key = _followup_key(subject, level, mistakes, n)
+    with _followup_lock:
+        cached = _followup_cache.get(key)
+        if cached is not None:
+            _followup_cache.move_to_end(key)
+            return list(cached)
+        future = _followup_inflight.get(key)
+
+    try:
+        if future is not None:
+            return list(future.result())
+        result = _request_followup(subject, level, mistakes, n)
     except Exception as e:
         return [f"(Fout bij genereren vragen: {e})"]
+    _remember_followup(key, result)
+    return list(result)
 
 
 # -----------------------------
 # Tutor Chat
 # -----------------------------
 
-def ask_tutor(subject: str, level: str, user_question: str, history: List[dict] | None = None, language: str = "nl") -> str:
-    """Stel een vraag aan een vakdocent-tutor. History is lijst van {role, content}."""
-    if not _openai_available():
-        return "AI-chat niet beschikbaar (geen API-key)."
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Aantal tokens in ``text`` (tiktoken indien geïnstalleerd, anders een schatting)."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text or ""))
+    return _estimate_tokens(text or "")
+
+
+def _message_tokens(msg: dict) -> int:
+    return count_tokens(msg["content"]) + 4  # overhead per bericht (rol, scheiding)
+
+
+_summary_lock = threading.Lock()
+_summary_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _prefix_keys(turns: List[dict]) -> List[str]:
+    """Hash van elke prefix turns[:k+1] (ketting-hash, O(n) voor alle prefixen)."""
+    keys, h = [], b""
+    for msg in turns:
+        h = hashlib.sha256(h + f"{msg['role']}\x00{msg['content']}".encode("utf-8")).digest()
+        keys.append(h.hex())
+    return keys
+
+
+def _fallback_summary(previous: str | None, turns: List[dict]) -> str:
+    """Samenvatting zonder API: eerste regel van elke beurt, afgekapt op het budget."""
+    parts = [previous] if previous else []
+    parts += [f"{m['role']}: {m['content'].splitlines()[0][:120]}" for m in turns if m["content"]]
+    text = "\n".join(parts)
+    while parts and count_tokens(text) > TUTOR_SUMMARY_TOKENS:
+        parts.pop(0)
+        text = "\n".join(parts)
+    return text
+
+
+def _summarize_turns(previous: str | None, turns: List[dict], language: str) -> str:
+    if not _llm_ready():
+        return _fallback_summary(previous, turns)
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    if previous:
+        transcript = f"Eerdere samenvatting: {previous}\n{transcript}"
+    try:
+        response = _chat_completion(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"Vat dit gesprek tussen leerling en tutor beknopt samen in {language} "
+                    "(onderwerpen, misverstanden, wat al uitgelegd is).",
+                },
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=TUTOR_SUMMARY_TOKENS,
+            temperature=0.3,
+        )
+        return response.choices[0].message.content.strip()
+    except Exception:
+        return _fallback_summary(previous, turns)
+
+
+def _summary_for(dropped: List[dict], language: str) -> str:
+    """Lopende samenvatting van de beurten die uit het venster gevallen zijn.
+
+    Gecachet per prefix: zolang het venster niet verschuift is dit een lookup, en
+    verschuift het wel, dan wordt alleen het nieuw weggevallen stuk samengevat
+    bovenop de vorige samenvatting."""
+    keys = _prefix_keys(dropped)
+    with _summary_lock:
+        base, start = None, 0
+        for k in range(len(keys) - 1, -1, -1):
+            if keys[k] in _summary_cache:
+                base, start = _summary_cache[keys[k]], k + 1
+                _summary_cache.move_to_end(keys[k])
+                break
+    if start == len(dropped):
+        return base
+    summary = _summarize_turns(base, dropped[start:], language)
+    with _summary_lock:
+        _summary_cache[keys[-1]] = summary
+        while len(_summary_cache) > TUTOR_SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return summary
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Kap ``text`` af op een woordgrens zodat hij binnen ``max_tokens`` past."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = len(text)
+    while cut > 1:
+        cut = cut * 3 // 4
+        candidate = text[:cut].rsplit(" ", 1)[0] + " …"
+        if count_tokens(candidate) <= max_tokens:
+            return candidate
+    return ""
+
+
+@metrics.instrument()
+def tutor_grounding(subject: str, level: str, query: str, *, ids: List[int] | None = None, k: int | None = None, max_tokens: int | None = None) -> str | None:
+    """Relevante vragen + modelantwoorden uit de bank als context voor de tutor.
+
+    Lokale BM25-retrieval (zie retrieval.py); alleen de top-``k`` gaat mee en het
+    geheel blijft onder ``max_tokens``. ``ids`` beperkt de zoektocht eerst tot
+    bepaalde vragen (bv. de fouten uit het laatste examen). None als er niets
+    relevants is."""
+    k = k or TUTOR_GROUNDING_K
+    max_tokens = max_tokens or TUTOR_GROUNDING_TOKENS
+    hits = retrieval.retrieve(subject, level.lower(), query, k=k, ids=ids)
+    if not hits:
+        return None
+
+    header = "Relevante opgaven uit de vragenbank (gebruik de modelantwoorden, noem ze niet letterlijk als bron):"
+    available = max_tokens - count_tokens(header)
+    # Liever minder opgaven mét modelantwoord dan veel afgekapte
+    n = max(1, min(len(hits), available // TUTOR_GROUNDING_MIN_ITEM_TOKENS))
+    per_item = available // n - 8  # opmaak per item
+    parts = [header]
+    for q in hits[:n]:
+        question = _truncate_tokens(q["question"], per_item // 3)
+        answer = _truncate_tokens(q["correct_answer"], per_item - count_tokens(question))
+        if question and answer:
+            parts.append(f"- Vraag: {question}\n  Modelantwoord: {answer}")
+    return "\n".join(parts) if len(parts) > 1 else None
+
+
+def build_tutor_messages(system_msg: str, history: List[dict] | None, user_question: str, *, budget: int | None = None, language: str = "nl", grounding: str | None = None) -> List[dict]:
+    """Bouw de berichtenlijst voor de tutor binnen een tokenbudget.
+
+    Systeemprompt, eventuele grounding (opgaven uit de bank) en huidige vraag gaan
+    altijd mee; daarna zoveel mogelijk recente beurten uit ``history``. Oudere
+    beurten worden vervangen door een (gecachte) samenvatting."""
+    budget = budget or TUTOR_CONTEXT_TOKENS
+    history = history or []
+    system = {"role": "system", "content": system_msg}
+    question = {"role": "user", "content": user_question}
+    remaining = budget - _message_tokens(system) - _message_tokens(question)
+    context = {"role": "system", "content": grounding} if grounding else None
+    if context:
+        remaining -= _message_tokens(context)
+
+    # Van nieuw naar oud: beurten toevoegen zolang ze passen
+    cut = len(history)
+    used = 0
+    while cut > 0:
+        cost = _message_tokens(history[cut - 1])
+        # Als er beurten wegvallen moet de samenvatting ook nog passen
+        reserve = TUTOR_SUMMARY_TOKENS + 4 if cut > 1 else 0
+        if used + cost + reserve > remaining:
+            break
+        used += cost
+        cut -= 1
+
+    messages = [system]
+    if cut > 0:
+        summary = _summary_for(history[:cut], language)
+        if summary:
+            messages.append({"role": "system", "content": f"Samenvatting van het eerdere gesprek:\n{summary}"})
+    messages.extend(history[cut:])
+    if context:
+        messages.append(context)
+    messages.append(question)
+    return messages
+
+
+@metrics.instrument()
+def ask_tutor_stream(subject: str, level: str, user_question: str, history: List[dict] | None = None, language: str = "nl", focus_ids: List[int] | None = None) -> Iterator[str]:
+    """Stel een vraag aan een vakdocent-tutor en yield het antwoord in stukjes zodra
+    ze binnenkomen (streaming). History is lijst van {role, content} zónder de
+    huidige vraag; alleen het recente deel ervan gaat mee (zie build_tutor_messages).
+    De tutor krijgt de meest relevante opgaven uit de bank mee (``tutor_grounding``);
+    ``focus_ids`` laat die eerst uit bepaalde vragen kiezen."""
+    if not _llm_ready():
+        yield f"AI-chat niet beschikbaar ({_unavailable_reason()})."
+        return
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     system_msg = (
         "Je bent een behulpzame {}-docent op {} niveau. Antwoord zo helder mogelijk in {}."
     ).format(subject, level.upper(), language)
 
-    messages = [
-        {"role": "system", "content": system_msg},
-    ]
-    if history:
-        # Voeg vorige berichten toe aan context
-        messages.extend(history)
-    # Voeg huidige vraag toe
-    messages.append({"role": "user", "content": user_question})
+    # Systeemprompt + samenvatting + recente beurten + opgaven uit de bank + huidige vraag,
+    # binnen het tokenbudget
+    try:
+        grounding = tutor_grounding(subject, level, user_question, ids=focus_ids)
+    except Exception as e:  # retrieval is een verbetering, geen vereiste
+        print(f"Retrieval mislukt: {e}")
+        grounding = None
+    messages = build_tutor_messages(system_msg, history, user_question, language=language, grounding=grounding)
 
     try:
-        response = client.chat.completions.create(
+        stream = _chat_completion(
             model="gpt-3.5-turbo",
             messages=messages,
             max_tokens=300,
             temperature=0.7,
+            stream=True,
+            # Tokengebruik zit dan in de laatste chunk (vereist openai>=1.26)
+            **({"stream_options": {"include_usage": True}} if metrics.ENABLED else {}),
         )
-        return response.choices[0].message.content.strip()
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                metrics.record_tokens(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
     except Exception as e:
-        return f"(Fout bij tutorchat: {e})"
+        yield f"(Fout bij tutorchat: {e})"
+
+
+@metrics.instrument()
+def ask_tutor(subject: str, level: str, user_question: str, history: List[dict] | None = None, language: str = "nl", focus_ids: List[int] | None = None) -> str:
+    """Stel een vraag aan een vakdocent-tutor. History is lijst van {role, content}.
+
+    Niet-streamende variant van ``ask_tutor_stream``: wacht op het volledige antwoord."""
+    return "".join(ask_tutor_stream(subject, level, user_question, history, language, focus_ids)).strip()
@@ -0,0 +1,413 @@
+"""Verwisselbare LLM-backends met de chat-completions-interface van de OpenAI-SDK.
+
+Gekozen via ``LLM_BACKEND`` (zie llm.py):
+
+- ``openai``: de echte API (standaard);
+- ``fake``: lokale, in-process nep-provider met instelbare latency, token-
+  streaming en 429/500-injectie, voor load tests zonder API-quota;
+- ``record``: echte API, maar elk request + antwoord (met timing) wordt als
+  JSONL weggeschreven naar ``LLM_RECORD_PATH``;
+- ``replay``: speelt die opnames af (met de opgenomen timing), zonder netwerk.
+
+Alle clients bieden ``client.chat.completions.create(**kwargs)`` en geven
+objecten terug met dezelfde attributen als de SDK (``choices[0].message.content``,
+``choices[0].delta.content`` bij ``stream=True``, ``usage``), zodat llm.py
+(retries, circuit breaker, streaming) ongewijzigd blijft.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List
+
+# ---------------------------
+# Configuratie
+# ---------------------------
+
+# Tijd tot het eerste token, als verdeling (zie parse_latency)
+LLM_FAKE_LATENCY = os.getenv("LLM_FAKE_LATENCY", "lognormal:0.6,0.5")
+LLM_FAKE_TOKEN_DELAY = float(os.getenv("LLM_FAKE_TOKEN_DELAY", "0.01"))  # seconden per gegenereerd token
+LLM_FAKE_TOKENS = int(os.getenv("LLM_FAKE_TOKENS", "60"))  # lengte antwoord (begrensd door max_tokens)
+LLM_FAKE_429_RATE = float(os.getenv("LLM_FAKE_429_RATE", "0"))  # kans per request
+LLM_FAKE_500_RATE = float(os.getenv("LLM_FAKE_500_RATE", "0"))
+LLM_FAKE_RETRY_AFTER = os.getenv("LLM_FAKE_RETRY_AFTER", "")  # Retry-After bij 429 (leeg = geen header)
+LLM_FAKE_SEED = os.getenv("LLM_FAKE_SEED")
+
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "llm_recordings.jsonl")
+LLM_REPLAY_TIMING = os.getenv("LLM_REPLAY_TIMING", "1") != "0"  # 0 = antwoorden direct teruggeven
+
+BACKENDS = ("openai", "fake", "record", "replay")
+
+# Argumenten die niet bij de inhoud van een request horen
+_UNKEYED_ARGS = ("timeout", "stream", "stream_options")
+
+
+# ---------------------------
+# Response-objecten (zelfde vorm als de SDK)
+# ---------------------------
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+def _completion(content: str, model: str, usage: SimpleNamespace | None) -> SimpleNamespace:
+    return SimpleNamespace(
+        object="chat.completion",
+        model=model,
+        choices=[
+            SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=content),
+                finish_reason="stop",
+            )
+        ],
+        usage=usage,
+    )
+
+
+def _chunk(content: str | None, model: str, finish_reason: str | None = None, usage=None) -> SimpleNamespace:
+    choices = [] if usage is not None else [
+        SimpleNamespace(index=0, delta=SimpleNamespace(content=content), finish_reason=finish_reason)
+    ]
+    return SimpleNamespace(object="chat.completion.chunk", model=model, choices=choices, usage=usage)
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _prompt_tokens(messages: List[dict]) -> int:
+    return sum(_estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+def request_key(kwargs: Dict) -> str:
+    """Sleutel van een request voor record/replay: alles behalve timeout/streaming."""
+    payload = {k: v for k, v in kwargs.items() if k not in _UNKEYED_ARGS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class _Completions:
+    def __init__(self, create: Callable):
+        self.create = create
+
+
+class _Chat:
+    def __init__(self, create: Callable):
+        self.completions = _Completions(create)
+
+
+# ---------------------------
+# Fake
+# ---------------------------
+
+
+class FakeAPIError(Exception):
+    """HTTP-fout van de nep-provider; ``status_code`` en ``response.headers`` zoals bij de SDK."""
+
+    def __init__(self, status_code: int, message: str, retry_after: str | None = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latencyverdeling uit een specificatie, in seconden.
+
+    ``0``, ``fixed:0.4``, ``uniform:0.2,1.2``, ``normal:0.6,0.2`` (gem., sd) of
+    ``lognormal:0.6,0.5`` (mediaan, sigma; lange staart zoals echte API's)."""
+    kind, _, args = (spec or "0").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    try:
+        if kind in ("0", "none", ""):
+            return lambda rng: 0.0
+        if kind == "fixed":
+            (value,) = values
+            return lambda rng: value
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == "normal":
+            mean, sd = values
+            return lambda rng: max(0.0, rng.gauss(mean, sd))
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    except ValueError:
+        pass
+    raise ValueError(f"Onbekende latency-specificatie: {spec!r}")
+
+
+_FAKE_WORDS = (
+    "je antwoord is bijna goed let op het verschil tussen vraag en aanbod de prijs stijgt "
+    "omdat de kosten toenemen denk aan het extern effect en noem een voorbeeld uit de bron "
+    "probeer de redenering stap voor stap op te schrijven en gebruik de begrippen uit de vraag"
+).split()
+
+
+class FakeChatClient:
+    """In-process nep-provider voor load tests.
+
+    Antwoorden zijn deterministisch per request (dezelfde prompt geeft dezelfde
+    tekst); latency en fouten worden per request getrokken. Feedback met
+    ``response_format`` json_object krijgt geldige JSON met een oordeel
+    (``correct``), bij een batch met één entry per genummerd item, zodat ook
+    dat pad realistisch belast wordt."""
+
+    def __init__(self, latency: str = LLM_FAKE_LATENCY, token_delay: float = LLM_FAKE_TOKEN_DELAY,
+                 tokens: int = LLM_FAKE_TOKENS, rate_429: float = LLM_FAKE_429_RATE,
+                 rate_500: float = LLM_FAKE_500_RATE, retry_after: str | None = LLM_FAKE_RETRY_AFTER or None,
+                 seed: int | None = None, sleep: Callable[[float], None] = time.sleep):
+        self.latency = parse_latency(latency)
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.retry_after = retry_after
+        self.sleep = sleep
+        self.chat = _Chat(self.create)
+        self._rng = random.Random(seed if seed is not None else (int(LLM_FAKE_SEED) if LLM_FAKE_SEED else None))
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "streams": 0, "errors_429": 0, "errors_500": 0, "completion_tokens": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _draw(self) -> tuple:
+        with self._lock:
+            self._stats["requests"] += 1
+            roll = self._rng.random()
+            return roll, self.latency(self._rng)
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def _content(self, kwargs: Dict) -> str:
+        messages = kwargs.get("messages") or []
+        rng = random.Random(request_key(kwargs))
+        n_tokens = max(1, min(self.tokens, kwargs.get("max_tokens") or self.tokens))
+        if (kwargs.get("response_format") or {}).get("type") == "json_object":
+            prompt = messages[-1]["content"] if messages else ""
+            ids = [int(i) for i in re.findall(r"^\[(\d+)\]$", prompt, re.M)]
+            if not ids:
+                return json.dumps(
+                    {"correct": rng.random() < 0.5, "feedback": self._sentence(rng, n_tokens)}, ensure_ascii=False
+                )
+            per_item = max(3, n_tokens // len(ids))
+            return json.dumps(
+                {"feedback": [
+                    {"id": i, "correct": rng.random() < 0.5, "feedback": self._sentence(rng, per_item)} for i in ids
+                ]},
+                ensure_ascii=False,
+            )
+        return self._sentence(rng, n_tokens)
+
+    @staticmethod
+    def _sentence(rng: random.Random, n: int) -> str:
+        text = " ".join(rng.choice(_FAKE_WORDS) for _ in range(n))
+        return text[:1].upper() + text[1:] + "."
+
+    def create(self, **kwargs):
+        roll, ttft = self._draw()
+        model = kwargs.get("model", "fake")
+        if roll < self.rate_429:
+            self.sleep(min(ttft, 0.05))  # rate limit: snel geweigerd
+            self._count("errors_429")
+            raise FakeAPIError(429, "Rate limit reached (fake)", self.retry_after)
+        if roll < self.rate_429 + self.rate_500:
+            self.sleep(ttft)
+            self._count("errors_500")
+            raise FakeAPIError(500, "Internal server error (fake)")
+
+        content = self._content(kwargs)
+        words = content.split(" ")
+        usage = _usage(_prompt_tokens(kwargs.get("messages") or []), len(words))
+        self._count("completion_tokens", len(words))
+        if kwargs.get("stream"):
+            self._count("streams")
+            include_usage = bool((kwargs.get("stream_options") or {}).get("include_usage"))
+            return self._stream(words, model, ttft, usage if include_usage else None)
+        self.sleep(ttft + self.token_delay * len(words))
+        return _completion(content, model, usage)
+
+    def _stream(self, words: List[str], model: str, ttft: float, usage) -> Iterator[SimpleNamespace]:
+        self.sleep(ttft)
+        for i, word in enumerate(words):
+            if i:
+                self.sleep(self.token_delay)
+            yield _chunk(word if i == 0 else " " + word, model)
+        yield _chunk(None, model, finish_reason="stop")
+        if usage is not None:
+            yield _chunk(None, model, usage=usage)
+
+
+# ---------------------------
+# Record / replay
+# ---------------------------
+
+
+def _usage_dict(usage) -> Dict | None:
+    if usage is None:
+        return None
+    return {k: getattr(usage, k, None) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+class RecordingClient:
+    """Stuurt requests door naar een echte client en schrijft elk antwoord als JSONL weg.
+
+    Per regel: ``key``, ``request``, ``content``, ``chunks`` (bij streaming),
+    ``usage``, ``model``, ``ttft`` en ``latency`` (seconden)."""
+
+    def __init__(self, inner, path: str = LLM_RECORD_PATH):
+        self.inner = inner
+        self.path = path
+        self.chat = _Chat(self.create)
+        self._lock = threading.Lock()
+
+    def _write(self, kwargs: Dict, record: Dict):
+        record = {
+            "key": request_key(kwargs),
+            "request": {k: v for k, v in kwargs.items() if k != "timeout"},
+            **record,
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def create(self, **kwargs):
+        started = time.perf_counter()
+        response = self.inner.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(kwargs, response, started)
+        latency = time.perf_counter() - started
+        self._write(kwargs, {
+            "content": response.choices[0].message.content,
+            "chunks": None,
+            "usage": _usage_dict(getattr(response, "usage", None)),
+            "model": getattr(response, "model", kwargs.get("model")),
+            "ttft": latency,
+            "latency": latency,
+        })
+        return response
+
+    def _record_stream(self, kwargs: Dict, stream, started: float) -> Iterator:
+        chunks: List[str] = []
+        ttft = None
+        usage = None
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                chunks.append(chunk.choices[0].delta.content)
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            yield chunk
+        # Alleen complete streams opnemen (afgebroken streams zijn geen bruikbare opname)
+        latency = time.perf_counter() - started
+        self._write(kwargs, {
+            "content": "".join(chunks),
+            "chunks": chunks,
+            "usage": _usage_dict(usage),
+            "model": kwargs.get("model"),
+            "ttft": ttft if ttft is not None else latency,
+            "latency": latency,
+        })
+
+
+class ReplayMissError(LookupError):
+    """Geen opname voor dit request."""
+
+
+class ReplayClient:
+    """Speelt opnames van ``RecordingClient`` af.
+
+    Een request wordt op inhoud opgezocht (``request_key``); meerdere opnames
+    van hetzelfde request worden om de beurt teruggegeven. Met ``timing`` wordt
+    de opgenomen latency (tijd tot eerste token, daarna gelijk verdeeld over de
+    chunks) nagebootst. Streaming en niet-streaming requests kunnen dezelfde
+    opname gebruiken."""
+
+    def __init__(self, path: str = LLM_RECORD_PATH, timing: bool = LLM_REPLAY_TIMING,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.timing = timing
+        self.sleep = sleep
+        self.chat = _Chat(self.create)
+        self._lock = threading.Lock()
+        self._records: Dict[str, List[Dict]] = {}
+        self._next: Dict[str, int] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._records.setdefault(record["key"], []).append(record)
+
+    def __len__(self) -> int:
+        return sum(len(r) for r in self._records.values())
+
+    def _lookup(self, kwargs: Dict) -> Dict:
+        key = request_key(kwargs)
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                raise ReplayMissError(f"Geen opname voor request {key[:12]} in {self.path}")
+            i = self._next.get(key, 0)
+            self._next[key] = i + 1
+            return records[i % len(records)]
+
+    def create(self, **kwargs):
+        record = self._lookup(kwargs)
+        usage = _usage(**{k: record["usage"][k] for k in ("prompt_tokens", "completion_tokens")}) if record.get("usage") else None
+        model = record.get("model") or kwargs.get("model")
+        if kwargs.get("stream"):
+            include_usage = bool((kwargs.get("stream_options") or {}).get("include_usage"))
+            return self._stream(record, model, usage if include_usage else None)
+        if self.timing:
+            self.sleep(record.get("latency") or 0.0)
+        return _completion(record["content"], model, usage)
+
+    def _stream(self, record: Dict, model: str, usage) -> Iterator[SimpleNamespace]:
+        chunks = record.get("chunks") or [record["content"]]
+        ttft = record.get("ttft") or 0.0
+        gap = max(0.0, (record.get("latency") or ttft) - ttft) / max(1, len(chunks) - 1)
+        if self.timing:
+            self.sleep(ttft)
+        for i, text in enumerate(chunks):
+            if i and self.timing:
+                self.sleep(gap)
+            yield _chunk(text, model)
+        yield _chunk(None, model, finish_reason="stop")
+        if usage is not None:
+            yield _chunk(None, model, usage=usage)
+
+
+# ---------------------------
+# Factory
+# ---------------------------
+
+
+def create_client(backend: str, openai_factory: Callable):
+    """Client voor ``backend``; ``openai_factory()`` maakt de echte OpenAI-client."""
+    if backend == "openai":
+        return openai_factory()
+    if backend == "fake":
+        return FakeChatClient()
+    if backend == "record":
+        return RecordingClient(openai_factory())
+    if backend == "replay":
+        return ReplayClient()
+    raise ValueError(f"Onbekende LLM_BACKEND {backend!r}; kies uit {', '.join(BACKENDS)}")
@@ -1,3 +1,6 @@
+import json
+import os
+import random
 import streamlit as st
 from typing import List, Dict
 from datetime import datetime
@@ -5,20 +8,32 @@ import pandas as pd
 
 from db import (
     init_db,
-    fetch_questions,
+    assemble_exam,
     create_user,
     authenticate_user,
     start_session_db,
     save_answer_db,
+    finish_session_db,
     get_user_sessions_with_scores,
     get_user_progress,
+    get_question,
+    search_questions,
+    question_bank_stats,
 )
-from llm import get_feedback, generate_followup, ask_tutor
+from llm import iter_feedback, generate_followup, prefetch_followup, ask_tutor_stream, feedback_cache_stats
+from assets import image_bytes, image_cache_stats
+from grader import grade_answer, local_feedback
+from exam_record import ExamRecord
+import metrics
+
+# Gebruikersnamen (komma-gescheiden) die de adminpagina met metrics mogen zien
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
 
 # -----------------------------
 # Initialisatie
 # -----------------------------
 init_db()
+metrics.start_file_export()
 
 st.set_page_config(page_title="AI Examen Trainer", page_icon="🎓", layout="wide")
 
@@ -40,13 +55,16 @@ st.markdown(
 def reset_state():
     st.session_state.phase = "intro"
     st.session_state.subject = None
-    st.session_state.questions = []
+    st.session_state.question_ids = []  # alleen ID's; de vragen zelf via get_question
+    st.session_state.exam_seed = None
     st.session_state.current = 0
-    st.session_state.answers = []  # list of dicts: question_id, user_answer, correct
-    st.session_state.mistakes = []
+    st.session_state.record = ExamRecord()  # compact: ID's, antwoorden, correct-bits
+    st.session_state.followups = []
+    st.session_state.followups_key = None
     st.session_state.level = None
     st.session_state.session_id = None
     st.session_state.chat_history = []  # list of {role, content}
+    st.session_state.chat_focus = None  # {subject, level, ids} van de fouten uit het laatste examen
     # Zorg ervoor dat de fase naar intro gaat, tenzij we specifiek naar history gaan
     if st.session_state.get("phase") != "history":
         st.session_state.phase = "intro"
@@ -55,6 +73,43 @@ def reset_state():
 if "phase" not in st.session_state:
     reset_state()
 
+
+# Vervangt een vraag die sinds het examen uit de bank verdwenen is
+_MISSING_QUESTION = {"question": "(vraag niet meer beschikbaar)", "correct_answer": "", "options": None}
+
+
+def resolve_question(question_id: int) -> Dict:
+    """Vraag uit de gedeelde vragenbank (tekst wordt niet per sessie bewaard)."""
+    return get_question(question_id) or _MISSING_QUESTION
+
+
+def mistake_texts() -> List[str]:
+    return [resolve_question(qid)["question"] for qid in st.session_state.record.mistake_ids()]
+
+
+def show_answer_header(slot, i: int, q: Dict, user_answer: str):
+    """Vraag, antwoord en modelantwoord; ⏳ zolang het LLM nog moet oordelen."""
+    record: ExamRecord = st.session_state.record
+    if record.needs_feedback(i):
+        icon, cls = "⏳", ""
+    elif record.is_correct(i):
+        icon, cls = "✅", "correct"
+    else:
+        icon, cls = "❌", "incorrect"
+    with slot.container():
+        st.markdown(f"**{icon} Vraag {i + 1}:** {q['question']}")
+        st.markdown(f"Jouw antwoord: <span class='{cls}'>{user_answer}</span>", unsafe_allow_html=True)
+        st.markdown(f"Correct antwoord: **{q['correct_answer']}**")
+
+
+def show_image(name: str, variant: str = "display"):
+    """Toon een vraagafbeelding via de asset-cache (verkleinde variant)."""
+    data = image_bytes(name, variant)
+    if data is None:
+        st.caption(f"Afbeelding '{name}' niet gevonden.")
+    else:
+        st.image(data, use_container_width=True)
+
 # -----------------------------
 # Gebruikerbeheer helpers
 # -----------------------------
@@ -113,11 +168,13 @@ with st.sidebar:
         if st.button("🏠 Dashboard", use_container_width=True):
             st.session_state.phase = "intro"
             st.session_state.chat_history = []  # Reset chat geschiedenis
+            st.session_state.chat_focus = None
             st.rerun()
 
     if st.button("📝 Oefenexamen", use_container_width=True):
         st.session_state.phase = "intro"
         st.session_state.chat_history = []  # Reset chat geschiedenis
+        st.session_state.chat_focus = None
         st.rerun()
 
     if st.button("💬 Tutor Chat", use_container_width=True):
@@ -132,6 +189,15 @@ with st.sidebar:
         st.session_state.phase = "progress"
         st.rerun()
 
+    if st.button("🔎 Vragen zoeken", use_container_width=True):
+        st.session_state.phase = "search"
+        st.rerun()
+
+    if st.session_state.user["username"] in ADMIN_USERS:
+        if st.button("🛠️ Admin", use_container_width=True):
+            st.session_state.phase = "admin"
+            st.rerun()
+
     st.markdown("---")
     if st.button("🚪 Uitloggen", use_container_width=True):
         logout()
@@ -149,8 +215,10 @@ if st.session_state.phase == "intro":
     if st.button("Start examen"):
         st.session_state.subject = subject
         st.session_state.level = st.session_state.user["level"]
-        st.session_state.questions = fetch_questions(subject, st.session_state.level)
-        if not st.session_state.questions:
+        # Steekproef in SQL (gestratificeerd op onderwerp); de seed maakt het examen reproduceerbaar
+        st.session_state.exam_seed = random.randrange(2**31)
+        st.session_state.question_ids = assemble_exam(subject, st.session_state.level, seed=st.session_state.exam_seed)
+        if not st.session_state.question_ids:
             st.warning("Er zijn nog geen vragen voor deze combinatie beschikbaar.")
             st.stop()
         # Maak db-sessie
@@ -163,24 +231,31 @@ if st.session_state.phase == "intro":
 # Vragen scherm
 # -----------------------------
 elif st.session_state.phase == "exam":
-    questions: List[Dict] = st.session_state.questions
+    question_ids: List[int] = st.session_state.question_ids
     idx = st.session_state.current
 
-    if idx >= len(questions):
+    if idx >= len(question_ids):
+        # Sessie afronden: gebufferde antwoorden wegschrijven
+        if st.session_state.session_id:
+            finish_session_db(st.session_state.session_id)
         st.session_state.phase = "results"
         st.rerun()
 
-    q = questions[idx]
+    # Alleen de vraag die nu getoond wordt laden (uit de gedeelde vragenbank)
+    q = get_question(question_ids[idx])
+    if q is None:
+        # Vraag is sinds het starten uit de bank verwijderd: overslaan
+        st.session_state.current += 1
+        st.rerun()
     # Toon context indien aanwezig
     if q.get("context"):
         st.markdown(q["context"])
         st.markdown("---")  # Scheidingsteken
-    st.subheader(f"Vraag {idx+1} van {len(questions)}")
+    st.subheader(f"Vraag {idx+1} van {len(question_ids)}")
     st.write(q["question"])
     # Als er een afbeelding is gekoppeld, toon deze
     if q.get("image"):
-        image_path = f"data/{q['image']}"  # Voeg 'data/' toe aan het pad
-        st.image(image_path, use_container_width=True)  # Gebruik use_container_width
+        show_image(q["image"], "display")
 
     user_answer = None
     if q["options"]:
@@ -189,34 +264,34 @@ elif st.session_state.phase == "exam":
         user_answer = st.text_input("Jouw antwoord:", key=f"ans_{idx}")
 
     if st.button("Bevestig antwoord"):
-        correct = user_answer == q["correct_answer"]
-
-        # Sla antwoord op zonder feedback
-        st.session_state.answers.append(
-            {
-                "question": q["question"],
-                "question_id": q["id"],
-                "correct_answer": q["correct_answer"],
-                "user_answer": user_answer,
-                "is_correct": correct,
-                "feedback": None,  # Feedback wordt later toegevoegd
-                "image": q.get("image"),
-                "context": q.get("context"),
-            }
+        # Lokaal beoordelen; alleen twijfelgevallen beoordeelt het LLM op de resultatenpagina
+        grade = grade_answer(q, user_answer)
+        correct = grade["correct"]
+        feedback = None if grade["escalate"] else local_feedback(grade, q["correct_answer"])
+
+        # Alleen ID + antwoord + bits in de sessie; vraagtekst e.d. komen uit de bank
+        st.session_state.record.add(
+            q["id"],
+            user_answer,
+            correct,
+            score=None if q["options"] else grade["score"],
+            escalate=grade["escalate"],
         )
 
-        # Log naar DB zonder feedback
         if st.session_state.session_id:
             save_answer_db(
                 st.session_state.session_id,
                 q["id"],
                 user_answer,
                 correct,
-                None,  # Geen feedback tijdens het examen
+                feedback,
             )
 
-        if not correct:
-            st.session_state.mistakes.append(q["question"])
+        if not correct and not st.session_state.record.has_escalated():
+            # Vervolgvragen alvast op de achtergrond laten genereren (indien ingeschakeld).
+            # Alleen zolang alle oordelen definitief zijn: bij twijfelgevallen kan het LLM
+            # de set fouten nog wijzigen en zou de prefetch voor niets zijn.
+            prefetch_followup(st.session_state.subject, st.session_state.level, mistake_texts())
         st.session_state.current += 1
         st.rerun()
 
@@ -229,88 +304,116 @@ elif st.session_state.phase == "exam":
 # -----------------------------
 elif st.session_state.phase == "results":
     st.header("Resultaten")
-    total = len(st.session_state.answers)
-    correct_cnt = sum(1 for a in st.session_state.answers if a["is_correct"])
-    st.markdown(f"**Score:** {correct_cnt}/{total}")
-
-    # Genereer feedback voor alle antwoorden
-    with st.spinner("Feedback wordt gegenereerd..."):
-        for a in st.session_state.answers:
-            if a["feedback"] is None:  # Alleen feedback genereren als het nog niet bestaat
-                feedback_text = get_feedback(
-                    a["question"],
-                    a["correct_answer"],
-                    a["user_answer"],
-                    subject=st.session_state.subject,
-                    level=st.session_state.level,
-                )
-                a["feedback"] = feedback_text
-                # Update feedback in database
-                if st.session_state.session_id:
-                    save_answer_db(
-                        st.session_state.session_id,
-                        a["question_id"],
-                        a["user_answer"],
-                        a["is_correct"],
-                        feedback_text,
-                    )
+    record: ExamRecord = st.session_state.record
+    total = len(record)
+    # Twijfelgevallen: het LLM-oordeel komt hieronder binnen (score en blokken worden dan bijgewerkt)
+    pending = [i for i in range(total) if record.needs_feedback(i)]
+    score_slot = st.empty()
+
+    def show_score():
+        waiting = sum(record.needs_feedback(i) for i in pending)
+        text = f"**Score:** {record.correct_count()}/{total}"
+        if waiting:
+            text += f" (⏳ nog {waiting} antwoord(en) in beoordeling)"
+        score_slot.markdown(text)
 
     # Voeg samenvatting toe
     st.subheader("📊 Samenvatting")
-    correct_answers = [a for a in st.session_state.answers if a["is_correct"]]
-    incorrect_answers = [a for a in st.session_state.answers if not a["is_correct"]]
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("### ✅ Wat ging goed")
-        if correct_answers:
-            for a in correct_answers:
-                st.markdown(f"- {a['question']}")
-        else:
-            st.markdown("*Geen correcte antwoorden*")
-
-    with col2:
-        st.markdown("### ❌ Wat kan beter")
-        if incorrect_answers:
-            for a in incorrect_answers:
-                st.markdown(f"- {a['question']}")
-        else:
-            st.markdown("*Alles correct!*")
+    summary_slot = st.empty()
+
+    def show_summary():
+        correct_questions = [resolve_question(qid)["question"] for _, qid, _, ok in record.entries() if ok]
+        incorrect_questions = [resolve_question(qid)["question"] for _, qid, _, ok in record.entries() if not ok]
+        with summary_slot.container():
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("### ✅ Wat ging goed")
+                if correct_questions:
+                    for text in correct_questions:
+                        st.markdown(f"- {text}")
+                else:
+                    st.markdown("*Geen correcte antwoorden*")
+
+            with col2:
+                st.markdown("### ❌ Wat kan beter")
+                if incorrect_questions:
+                    for text in incorrect_questions:
+                        st.markdown(f"- {text}")
+                else:
+                    st.markdown("*Alles correct!*")
+
+    show_score()
+    show_summary()
 
     st.markdown("---")
-    for i, a in enumerate(st.session_state.answers, start=1):
-        icon = "✅" if a["is_correct"] else "❌"
-        cls = "correct" if a["is_correct"] else "incorrect"
+    header_slots = {}
+    feedback_slots = {}
+    for i, qid, user_answer, _ in record.entries():
+        q = resolve_question(qid)
         # Toon context indien aanwezig
-        if a.get("context"):
-            st.markdown(a["context"])
+        if q.get("context"):
+            st.markdown(q["context"])
             st.markdown("---")
-        st.markdown(f"**{icon} Vraag {i}:** {a['question']}")
-        st.markdown(f"Jouw antwoord: <span class='{cls}'>{a['user_answer']}</span>", unsafe_allow_html=True)
-        st.markdown(f"Correct antwoord: **{a['correct_answer']}**")
-        if a.get("image"):
-            st.image(a["image"], use_column_width=True)
-        # Haal feedback op uit de opgeslagen antwoorden (indien aanwezig en niet leeg)
-        feedback_to_display = a.get("feedback", "")
-        if feedback_to_display:
-            st.info(feedback_to_display)
-        else:  # Fallback als er om een of andere reden geen feedback is opgeslagen
-            fallback_feedback = get_feedback(
-                a["question"],
-                a["correct_answer"],
-                a["user_answer"],
-                subject=st.session_state.subject,
-                level=st.session_state.level,
-            )
-            st.info(fallback_feedback)
+        header_slots[i] = st.empty()
+        show_answer_header(header_slots[i], i, q, user_answer)
+        score = record.score(i)
+        if score is not None and 0 < score < 1:
+            st.caption(f"Overeenkomst met het modelantwoord: {round(score * 100)}%")
+        if q.get("image"):
+            show_image(q["image"], "thumb")
+        # AI-feedback (bewaard), lokale feedback (opnieuw berekend, microseconden)
+        # of een placeholder die hieronder gevuld wordt
+        if record.needs_feedback(i):
+            feedback_slots[i] = st.empty()
+            feedback_slots[i].caption("⏳ Feedback wordt gegenereerd...")
+        elif record.feedback(i):
+            st.info(record.feedback(i))
+        elif q is not _MISSING_QUESTION:
+            st.info(local_feedback(grade_answer(q, user_answer), q["correct_answer"]))
         st.markdown("---")
 
-    # Extra gegenereerde vragen
-    extra_questions = generate_followup(
-        st.session_state.subject,
-        st.session_state.level,
-        st.session_state.mistakes,
-    )
+    # Oordeel + feedback van het LLM parallel; elk blok verschijnt zodra het klaar is
+    pending_answers = []
+    for i in pending:
+        q = resolve_question(record.question_ids[i])
+        pending_answers.append(
+            {"question": q["question"], "correct_answer": q["correct_answer"], "user_answer": record.answers[i]}
+        )
+    for j, feedback_text, verdict in iter_feedback(
+        pending_answers,
+        subject=st.session_state.subject,
+        level=st.session_state.level,
+    ):
+        i = pending[j]
+        # Het LLM-oordeel vervangt het lokale (zonder oordeel blijft het lokale staan)
+        if verdict is not None:
+            record.set_correct(i, verdict)
+        # Eerst opslaan (upsert van dezelfde rij), pas daarna als gedaan markeren:
+        # bij een fout volgt bij de volgende rerun een nieuwe poging
+        if st.session_state.session_id:
+            save_answer_db(
+                st.session_state.session_id,
+                record.question_ids[i],
+                record.answers[i],
+                record.is_correct(i),
+                feedback_text,
+            )
+        record.set_feedback(i, feedback_text)
+        show_answer_header(header_slots[i], i, resolve_question(record.question_ids[i]), record.answers[i])
+        feedback_slots[i].info(feedback_text)
+        show_score()
+        show_summary()
+
+    # Extra gegenereerde vragen (één keer per sessie en set fouten, niet bij elke rerun)
+    followups_key = tuple(record.mistake_ids())
+    if st.session_state.get("followups_key") != followups_key:
+        st.session_state.followups = generate_followup(
+            st.session_state.subject,
+            st.session_state.level,
+            mistake_texts(),
+        )
+        st.session_state.followups_key = followups_key
+    extra_questions = st.session_state.followups
     if extra_questions:
         st.subheader("🔄 Gepersonaliseerde vervolgvragen")
         for q in extra_questions:
@@ -361,17 +464,27 @@ elif st.session_state.phase == "chat":
     subject = st.selectbox("Vak", ["Nederlands", "Engels", "Geschiedenis", "Economie"], key="chat_subject")
 
     # Voeg knop toe om door te gaan met oefenen op basis van laatste examen
-    if st.session_state.get("answers"):
+    if len(st.session_state.get("record") or ()):
         if st.button("📚 Ga verder met oefenen op basis van laatste examen"):
-            # Maak een samenvatting van de fouten
-            mistakes = [a["question"] for a in st.session_state.answers if not a["is_correct"]]
-            if mistakes:
-                # Voeg een systeem bericht toe met de context
+            mistake_ids = st.session_state.record.mistake_ids()
+            if mistake_ids:
+                # Geen ruwe vraagteksten in het gesprek: alleen de onderwerpen noemen en
+                # de tutor laten zoeken in deze vragen (en hun modelantwoorden)
+                topics = []
+                for qid in mistake_ids:
+                    q = get_question(qid)
+                    if q and q.get("topic") and q["topic"] not in topics:
+                        topics.append(q["topic"])
+                st.session_state.chat_focus = {
+                    "subject": st.session_state.subject,
+                    "level": st.session_state.level,
+                    "ids": mistake_ids,
+                }
                 context_message = (
-                    f"Je hebt net een {st.session_state.subject} examen gemaakt op {st.session_state.level} niveau. "
-                    f"Je had moeite met de volgende onderwerpen:\n" +
-                    "\n".join(f"- {m}" for m in mistakes) +
-                    "\n\nLaten we hier verder op oefenen. Stel gerust vragen over deze onderwerpen!"
+                    f"Je hebt net een {st.session_state.subject} examen gemaakt op {st.session_state.level} niveau "
+                    f"en had {len(mistake_ids)} vraag/vragen fout"
+                    + (f", vooral over: {', '.join(topics[:5])}." if topics else ".")
+                    + "\n\nLaten we hier verder op oefenen. Stel gerust vragen over deze opgaven!"
                 )
                 st.session_state.chat_history.append({"role": "assistant", "content": context_message})
                 st.rerun()
@@ -386,18 +499,25 @@ elif st.session_state.phase == "chat":
     user_input = st.chat_input("Stel je vraag:", key="chat_input")
 
     if user_input and user_input.strip():
-        # Voeg user message toe aan history
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-
-        # Vraag response aan LLM
-        response = ask_tutor(
+        # History zónder de huidige vraag meegeven (die voegt ask_tutor_stream zelf toe)
+        # Na "Ga verder met oefenen": eerst zoeken in de fouten van dat examen
+        focus = st.session_state.get("chat_focus")
+        tutor_stream = ask_tutor_stream(
             subject=subject,
             level=st.session_state.user["level"],
             user_question=user_input,
-            history=st.session_state.chat_history,
+            history=list(st.session_state.chat_history),
+            focus_ids=focus["ids"] if focus and focus["subject"] == subject else None,
         )
+        # Voeg user message toe aan history
+        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        with st.chat_message("user"):
+            st.markdown(user_input)
+
+        # Vraag response aan LLM en toon die token voor token
+        with st.chat_message("assistant"):
+            response = st.write_stream(tutor_stream)
         st.session_state.chat_history.append({"role": "assistant", "content": response})
-        st.rerun()
 
 # -----------------------------
 # Voortgang Dashboard scherm
@@ -451,3 +571,114 @@ elif st.session_state.phase == "progress":
                 st.write(f"- {topic['subject']}: {topic['topic']} ({topic['percentage']}%)")
         else:
             st.success("Geweldig! Je scoort goed op alle onderwerpen!")
+
+# -----------------------------
+# Zoeken scherm
+# -----------------------------
+elif st.session_state.phase == "search":
+    st.header("🔎 Vragen zoeken")
+
+    SEARCH_PAGE_SIZE = 10
+    query = st.text_input("Zoek in vragen, context en modelantwoorden", key="search_query")
+    col1, col2 = st.columns(2)
+    with col1:
+        search_subject = st.selectbox("Vak", ["Alle vakken", "Nederlands", "Engels", "Geschiedenis", "Economie"])
+    with col2:
+        search_level = st.selectbox("Niveau", ["Alle niveaus", "mavo", "havo", "vwo"])
+
+    # Nieuwe zoekopdracht: terug naar de eerste pagina
+    search_key = (query, search_subject, search_level)
+    if st.session_state.get("search_key") != search_key:
+        st.session_state.search_key = search_key
+        st.session_state.search_page = 0
+
+    if query.strip():
+        page = st.session_state.search_page
+        # Eén resultaat extra ophalen om te weten of er een volgende pagina is
+        results = search_questions(
+            query,
+            subject=None if search_subject == "Alle vakken" else search_subject,
+            level=None if search_level == "Alle niveaus" else search_level,
+            limit=SEARCH_PAGE_SIZE + 1,
+            offset=page * SEARCH_PAGE_SIZE,
+        )
+        has_next = len(results) > SEARCH_PAGE_SIZE
+        results = results[:SEARCH_PAGE_SIZE]
+
+        if not results:
+            st.info("Geen vragen gevonden.")
+        for r in results:
+            st.markdown(f"**{r['subject']} · {r['level']}**" + (f" · {r['topic']}" if r["topic"] else ""))
+            st.markdown(r["snippet"])
+            with st.expander("Toon vraag"):
+                q = get_question(r["id"])
+                if q:
+                    if q.get("context"):
+                        st.markdown(q["context"])
+                    st.write(q["question"])
+                    if q.get("image"):
+                        show_image(q["image"], "thumb")
+                    st.markdown(f"Correct antwoord: **{q['correct_answer']}**")
+            st.markdown("---")
+
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            if page > 0 and st.button("← Vorige"):
+                st.session_state.search_page -= 1
+                st.rerun()
+        with page_col:
+            st.caption(f"Pagina {page + 1}")
+        with next_col:
+            if has_next and st.button("Volgende →"):
+                st.session_state.search_page += 1
+                st.rerun()
+
+# -----------------------------
+# Adminpagina (metrics)
+# -----------------------------
+elif st.session_state.phase == "admin":
+    if st.session_state.user["username"] not in ADMIN_USERS:
+        st.error("Geen toegang.")
+        st.stop()
+
+    st.header("🛠️ Admin")
+    snap = metrics.snapshot()
+    if not snap["enabled"]:
+        st.info("Metrics staan uit. Start de app met `METRICS=1` om db- en llm-calls te meten.")
+
+    st.subheader("Latency per functie")
+    st.caption(f"Sinds {snap['since']}; percentielen zijn bovengrenzen van histogram-buckets.")
+    if snap["functions"]:
+        st.dataframe(
+            pd.DataFrame.from_dict(snap["functions"], orient="index"),
+            use_container_width=True,
+        )
+    else:
+        st.markdown("*Nog geen metingen.*")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Lock-wachttijden", snap["db"]["lock_waits"])
+    col2.metric("Totale wachttijd (ms)", f"{snap['db']['lock_wait_total_ms']:.0f}")
+    col3.metric("p95 wachttijd (ms)", snap["db"]["lock_wait_p95_ms"] if snap["db"]["lock_wait_p95_ms"] is not None else "-")
+    col4.metric("'database is locked'", snap["db"]["locked_errors"])
+
+    st.subheader("Caches")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown("**Vragenbank**")
+        st.json(question_bank_stats())
+    with col2:
+        st.markdown("**Feedback-cache**")
+        st.json(feedback_cache_stats())
+    with col3:
+        st.markdown("**Afbeeldingen**")
+        st.json(image_cache_stats())
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Prometheus-tekst", metrics.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("JSON-snapshot", json.dumps(snap, indent=2), file_name="metrics.json", mime="application/json")
+    if st.button("Metingen wissen"):
+        metrics.reset()
+        st.rerun()
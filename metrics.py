@@ -0,0 +1,352 @@
+"""Instrumentatie van de hot paths: latency, aantallen, fouten, lock-wachttijd en tokens.
+
+Aan met ``METRICS=1``. Uit (standaard) geeft ``instrument`` de functie
+ongewijzigd terug en zijn de overige hooks een enkele attribuutcheck, dus
+zonder meetbare overhead.
+
+Export als Prometheus-tekst (``prometheus_text``; met ``METRICS_EXPORT_PATH``
+ook periodiek naar een bestand voor de textfile-collector van node_exporter) of
+als JSON-snapshot (``snapshot``). main.py toont ze op de adminpagina.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# ---------------------------
+# Configuratie
+# ---------------------------
+
+ENABLED = os.getenv("METRICS", "0") == "1"
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH", "")  # leeg = niet naar bestand schrijven
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "15"))  # seconden
+
+PREFIX = "examtrainer"
+
+# Bucketgrenzen in seconden: van SQLite-lookups (sub-ms) tot LLM-calls (tientallen s)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    "call_duration_seconds": ("histogram", "Duur per aanroep van een db/llm-functie"),
+    "call_errors_total": ("counter", "Exceptions per functie en type"),
+    "db_lock_wait_seconds": ("histogram", "Wachttijd op de schrijf-lock (BEGIN IMMEDIATE)"),
+    "db_locked_total": ("counter", "'database is locked'-fouten"),
+    "llm_tokens_total": ("counter", "LLM-tokens per functie (prompt/completion)"),
+}
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, tuple], "Histogram"] = {}
+_counters: Dict[Tuple[str, tuple], float] = {}
+_started_at = time.time()
+
+# Naam van de geïnstrumenteerde functie die nu draait (voor tokens per functie)
+_current = contextvars.ContextVar("metrics_function", default=None)
+
+
+# ---------------------------
+# Registry
+# ---------------------------
+
+
+class Histogram:
+    """Cumulatieve histogram met vaste buckets (zoals Prometheus)."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # laatste = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Schatting: bovengrens van de bucket waarin het q-kwantiel valt."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def observe(metric: str, value: float, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+def inc(metric: str, value: float = 1, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def reset():
+    """Alle metingen wissen (bv. tussen benchmarkruns)."""
+    global _started_at
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _started_at = time.time()
+
+
+# ---------------------------
+# Instrumentatie
+# ---------------------------
+
+
+def _record(name: str, started: float, error: BaseException | None):
+    observe("call_duration_seconds", time.perf_counter() - started, function=name)
+    if error is not None:
+        inc("call_errors_total", function=name, type=type(error).__name__)
+        record_lock_error(error, name)
+
+
+def instrument(name: str | None = None, scope: bool = True):
+    """Decorator: meet duur, aantal en fouten van een functie.
+
+    Bij generatoren telt de tijd tot de laatste ``yield`` (bv. een gestreamd
+    antwoord). ``scope``: tokens van LLM-calls binnen deze functie op haar naam
+    boeken. Staat ``METRICS`` uit, dan wordt de functie ongewijzigd teruggegeven."""
+
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = None
+                it = func(*args, **kwargs)
+                try:
+                    while True:
+                        token = _current.set(label) if scope else None
+                        try:
+                            item = next(it)
+                        except StopIteration:
+                            return
+                        finally:
+                            if token is not None:
+                                _current.reset(token)
+                        yield item
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        error = e
+                    raise
+                finally:
+                    it.close()
+                    _record(label, started, error)
+
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            token = _current.set(label) if scope else None
+            error = None
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                if token is not None:
+                    _current.reset(token)
+                _record(label, started, error)
+
+        return wrapper
+
+    return decorate
+
+
+def is_lock_error(error: BaseException) -> bool:
+    message = str(error).lower()
+    return type(error).__name__ == "OperationalError" and ("locked" in message or "busy" in message)
+
+
+def record_lock_error(error: BaseException, function: str | None = None):
+    """Tel een 'database is locked'-fout één keer, op naam van de lopende functie."""
+    if not is_lock_error(error) or getattr(error, "_metrics_counted", False):
+        return
+    inc("db_locked_total", function=function or _current.get() or "onbekend")
+    try:
+        error._metrics_counted = True
+    except AttributeError:
+        pass
+
+
+def record_lock_wait(seconds: float):
+    observe("db_lock_wait_seconds", seconds)
+
+
+def record_tokens(usage, function: str | None = None):
+    """Tel ``usage`` (prompt_tokens/completion_tokens) van een LLM-response."""
+    if usage is None or not ENABLED:
+        return
+    function = function or _current.get() or "onbekend"
+    for kind in ("prompt", "completion"):
+        value = getattr(usage, f"{kind}_tokens", None)
+        if value:
+            inc("llm_tokens_total", value, function=function, kind=kind)
+
+
+# ---------------------------
+# Export
+# ---------------------------
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def prometheus_text() -> str:
+    """Alle metingen in het Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: (list(h.counts), h.count, h.sum) for k, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines: List[str] = []
+    for metric, (kind, help_text) in _HELP.items():
+        full = f"{PREFIX}_{metric}"
+        if kind == "histogram":
+            series = sorted((k, v) for k, v in histograms.items() if k[0] == metric)
+        else:
+            series = sorted((k, v) for k, v in counters.items() if k[0] == metric)
+        if not series:
+            continue
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for (_, labels), value in series:
+            if kind == "histogram":
+                counts, count, total = value
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full}_bucket{_labels_text(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{full}_sum{_labels_text(labels)} {total!r}")
+                lines.append(f"{full}_count{_labels_text(labels)} {count}")
+            else:
+                lines.append(f"{full}{_labels_text(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict:
+    """JSON-vriendelijk overzicht: per functie aantal, fouten, gemiddelde en p50/p95/p99 (ms)."""
+    with _lock:
+        histograms = {k: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99)) for k, h in _histograms.items()}
+        counters = dict(_counters)
+
+    def ms(value):
+        return None if value is None else (None if value == float("inf") else round(value * 1000, 3))
+
+    functions: Dict[str, Dict] = {}
+    for (metric, labels), (count, total, p50, p95, p99) in histograms.items():
+        if metric != "call_duration_seconds":
+            continue
+        functions[dict(labels)["function"]] = {
+            "calls": count,
+            "errors": 0,
+            "mean_ms": round(1000 * total / count, 3) if count else None,
+            "p50_ms": ms(p50),
+            "p95_ms": ms(p95),
+            "p99_ms": ms(p99),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+    locked = 0
+    for (metric, labels), value in counters.items():
+        labels = dict(labels)
+        entry = functions.get(labels.get("function"))
+        if metric == "db_locked_total":
+            locked += value
+        if entry is None:
+            continue
+        if metric == "call_errors_total":
+            entry["errors"] += int(value)
+        elif metric == "llm_tokens_total":
+            entry[f"{labels['kind']}_tokens"] += int(value)
+
+    lock_wait = histograms.get(("db_lock_wait_seconds", ()))
+    return {
+        "enabled": ENABLED,
+        "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_started_at)),
+        "functions": dict(sorted(functions.items())),
+        "db": {
+            "lock_waits": lock_wait[0] if lock_wait else 0,
+            "lock_wait_total_ms": round(lock_wait[1] * 1000, 3) if lock_wait else 0.0,
+            "lock_wait_p95_ms": ms(lock_wait[3]) if lock_wait else None,
+            "locked_errors": int(locked),
+        },
+    }
+
+
+def write_prometheus(path: str):
+    """Schrijf de Prometheus-tekst atomair naar ``path`` (textfile-collector)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def write_json(path: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp, path)
+
+
+_exporter: threading.Thread | None = None
+
+
+def start_file_export():
+    """Schrijf elke ``METRICS_EXPORT_INTERVAL`` seconden naar ``METRICS_EXPORT_PATH``.
+
+    Idempotent (Streamlit voert main.py bij elke rerun opnieuw uit); no-op als
+    metrics uit staan of er geen pad is ingesteld."""
+    global _exporter
+    if not ENABLED or not METRICS_EXPORT_PATH or _exporter is not None:
+        return
+    with _lock:
+        if _exporter is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(METRICS_EXPORT_INTERVAL)
+                try:
+                    write_prometheus(METRICS_EXPORT_PATH)
+                except OSError as e:
+                    print(f"Fout bij wegschrijven metrics: {e}")
+
+        _exporter = threading.Thread(target=run, name="metrics-export", daemon=True)
+        _exporter.start()
@@ -0,0 +1,125 @@
+import heapq
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+import db
+
+# ---------------------------
+# Configuratie
+# ---------------------------
+
+# Aantal (vak, niveau)-indexen dat in het geheugen blijft
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "16"))
+
+# BM25-parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    """
+    de het een en of in op van voor met door aan bij uit als dat die dit deze dan
+    is zijn was waren wordt worden werd kan kun kunnen moet moeten zal zou zullen
+    je jij ik we wij ze zij hij u er hier daar wat wie waarom hoe welke niet geen
+    ook nog al maar om te tot naar over onder na wel heel meer veel mijn jouw
+    the a an and or of to in on for with is are be what why how
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Kleine letters, zonder accenten, zonder stopwoorden en losse tekens."""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_RE.findall(text) if len(t) > 1 and t not in _STOPWORDS]
+
+
+def _document_text(q: Dict) -> str:
+    # Onderwerp en vraag tellen dubbel: die beschrijven waar het item over gaat
+    parts = [q.get("topic"), q.get("topic"), q.get("question"), q.get("question"), q.get("context"), q.get("correct_answer")]
+    return " ".join(p for p in parts if p)
+
+
+# ---------------------------
+# BM25-index
+# ---------------------------
+
+
+class BM25Index:
+    """Lexicale index (Okapi BM25) over een lijst vragen uit de vragenbank."""
+
+    def __init__(self, docs: List[Dict]):
+        self.docs = docs
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for i, doc in enumerate(docs):
+            terms = tokenize(_document_text(doc))
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((i, tf))
+        n = len(docs)
+        self.avgdl = (sum(self.lengths) / n) if n else 1.0
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 3, ids: Iterable[int] | None = None) -> List[Tuple[float, Dict]]:
+        """Top-``k`` (score, vraag), hoogste score eerst. Met ``ids`` alleen binnen die vragen."""
+        allowed = set(ids) if ids is not None else None
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for i, tf in postings:
+                if allowed is not None and self.docs[i]["id"] not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.avgdl)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(score, self.docs[i]) for i, score in top]
+
+
+# ---------------------------
+# Cache per (vak, niveau)
+# ---------------------------
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[tuple, Tuple[tuple, BM25Index]]" = OrderedDict()
+
+
+def get_index(subject: str, level: str) -> BM25Index:
+    """BM25-index voor één vak + niveau; herbouwd zodra de vragenbank wijzigt."""
+    key = (subject, level)
+    version = db.question_bank_version()
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(key)
+            return cached[1]
+    # Buiten de lock bouwen; bij een race bouwen twee threads dezelfde index
+    index = BM25Index(db.fetch_questions(subject, level))
+    with _lock:
+        _indexes[key] = (version, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > RETRIEVAL_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieve(subject: str, level: str, query: str, k: int = 3, ids: Iterable[int] | None = None) -> List[Dict]:
+    """De ``k`` meest relevante vragen (met modelantwoord) voor ``query``.
+
+    Met ``ids`` wordt eerst binnen die vragen gezocht (bv. de fouten uit het
+    laatste examen); levert dat niets op, dan in de hele bank van het vak."""
+    index = get_index(subject, level)
+    hits = index.search(query, k, ids) if ids else []
+    if not hits:
+        hits = index.search(query, k)
+    return [q for _, q in hits]
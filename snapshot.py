@@ -0,0 +1,156 @@
+"""Compileer ./data/*.json tot een read-only snapshot van de vragenbank.
+
+De snapshot is een compact SQLite-bestand (questions + import_manifest + meta)
+met dezelfde stabiele vraag-ID's als de gewone import. Staat het bestand naast
+db.py (of op $QUESTION_SNAPSHOT), dan slaat de app bij het opstarten de
+JSON-import over en leest de vragenbank rechtstreeks uit de snapshot.
+
+    python snapshot.py build      # na elke wijziging in ./data
+    python snapshot.py info
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict
+
+import db
+
+_SCHEMA = """
+CREATE TABLE questions (
+    id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    level TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT,
+    correct_answer TEXT NOT NULL,
+    image TEXT,
+    context TEXT,
+    topic TEXT,
+    rubric TEXT,
+    source TEXT,
+    content_hash TEXT
+);
+CREATE TABLE import_manifest (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_INSERT_SQL = """INSERT INTO questions(id, subject, level, year, question, options, correct_answer, image, context, topic, rubric, source, content_hash)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def build_snapshot(output: Path | None = None, progress=None) -> Dict[str, str]:
+    """Bouw de snapshot uit ./data en vervang het bestaande bestand atomair.
+
+    ``progress(source, items, bytes_read, total_bytes)`` zoals bij de import.
+    Return de metadata (format, version, questions, built_at)."""
+    output = Path(output or db.SNAPSHOT_PATH)
+    tmp = output.with_name(output.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        # Wordt in één keer geschreven en daarna alleen gelezen: geen journal nodig
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN")
+        version = hashlib.sha256(f"format={db.SNAPSHOT_FORMAT}\n".encode("utf-8"))
+        total = 0
+        for path, source, subject, level in db._data_files():
+            stat = path.stat()
+            digest = db._file_sha256(path)
+            version.update(f"{source}\x00{digest}\n".encode("utf-8"))
+            total += _load_file(conn, path, source, subject, level, progress)
+            conn.execute(
+                "INSERT INTO import_manifest(path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (source, stat.st_size, stat.st_mtime_ns, digest),
+            )
+        conn.execute("CREATE INDEX idx_questions_subject_level ON questions(subject, level)")
+        meta = {
+            "format": str(db.SNAPSHOT_FORMAT),
+            "version": version.hexdigest(),
+            "questions": str(total),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        conn.executemany("INSERT INTO meta(key, value) VALUES (?, ?)", meta.items())
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp, output)
+    return meta
+
+
+def _load_file(conn, path: Path, source: str, subject: str, level: str, progress=None) -> int:
+    seen = set()
+    batch = []
+    total_bytes = path.stat().st_size
+    read = {"bytes": 0, "items": 0}
+
+    def on_read(n: int):
+        read["bytes"] += n
+
+    def flush():
+        conn.executemany(_INSERT_SQL, batch)
+        batch.clear()
+        if progress:
+            progress(source, read["items"], read["bytes"], total_bytes)
+
+    with open(path, "rb") as f:
+        for row in db._question_rows(source, subject, level, db._iter_json_array(f, on_read)):
+            if row[0] in seen:
+                continue
+            seen.add(row[0])
+            read["items"] += 1
+            batch.append(row)
+            if len(batch) >= db.IMPORT_BATCH_SIZE:
+                flush()
+    flush()
+    return read["items"]
+
+
+def snapshot_info(path: Path | None = None) -> Dict[str, str] | None:
+    path = Path(path or db.SNAPSHOT_PATH)
+    if not path.is_file():
+        return None
+    conn = sqlite3.connect(db._snapshot_uri(path), uri=True)
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshot van de vragenbank.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", type=Path, default=None, help=f"standaard: {db.SNAPSHOT_PATH}")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        def report(source, items, done, total):
+            pct = 100 * done / total if total else 100
+            print(f"\r{source}: {items} items, {pct:5.1f}%", end="", flush=True)
+
+        started = time.perf_counter()
+        meta = build_snapshot(args.output, progress=report)
+        print(f"\nSnapshot gebouwd: {meta['questions']} vragen, versie {meta['version'][:12]} "
+              f"({time.perf_counter() - started:.1f}s).")
+    else:
+        meta = snapshot_info(args.output)
+        if meta is None:
+            raise SystemExit("Geen snapshot gevonden.")
+        for key, value in sorted(meta.items()):
+            print(f"{key}: {value}")